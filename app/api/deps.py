@@ -5,7 +5,6 @@ Inclui autenticação por API key, JWT e outras dependências.
 """
 
 from dataclasses import dataclass
-from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import Depends, HTTPException, Request, Security, status
@@ -14,14 +13,29 @@ from sqlalchemy.orm import Session
 
 from app.db.session import get_db
 from app.db.models import ApiKey, Organization, User
+from app.core.config import settings
 from app.core.security import decode_access_token
+from app.core.auth_cache import (
+    ApiKeySnapshot,
+    OrganizationSnapshot,
+    auth_cache,
+    current_generation,
+    load_auth,
+    store_auth,
+)
+from app.core.last_used import record_last_used
 
 
-@dataclass
+@dataclass(frozen=True)
 class ApiKeyAuth:
-    """Resultado da autenticação por API key."""
-    organization: Organization
-    api_key: ApiKey
+    """
+    Resultado da autenticação por API key.
+
+    Snapshots imutáveis (ver app.core.auth_cache), não objetos da sessão:
+    para alterar a key ou a organização, carregue o modelo pelo id.
+    """
+    organization: OrganizationSnapshot
+    api_key: ApiKeySnapshot
 
 
 # =============================================================================
@@ -86,7 +100,8 @@ def get_api_key_auth(
         db: Sessão do banco de dados
         
     Returns:
-        ApiKeyAuth com Organization e ApiKey associados
+        ApiKeyAuth com snapshots da Organization e da ApiKey (cacheados
+        por AUTH_CACHE_TTL_SECONDS; ver app.core.auth_cache)
         
     Raises:
         HTTPException 401: Se a API key não for fornecida, inválida ou inativa
@@ -98,67 +113,44 @@ def get_api_key_auth(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Buscar API key no banco
-    api_key_record = (
-        db.query(ApiKey)
-        .filter(ApiKey.key == api_key)
-        .first()
-    )
+    # Cache de autenticação: no hit, nenhuma ida ao banco
+    key_hash = ApiKey.hash_key(api_key)
+    auth: Optional[ApiKeyAuth] = auth_cache.get(key_hash) if settings.AUTH_CACHE_ENABLED else None
     
-    if not api_key_record:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid API key",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # Verificar se está ativa
-    if not api_key_record.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid API key",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # Carregar a organização
-    organization = (
-        db.query(Organization)
-        .filter(Organization.id == api_key_record.organization_id)
-        .first()
-    )
-    
-    if not organization:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid API key",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    if auth is None:
+        # Buscar API key + organização no banco (key inexistente, inativa ou sem organização → 401)
+        generation = current_generation()
+        loaded = load_auth(db, key_hash)
+        if loaded is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid API key",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        api_key_snapshot, organization_snapshot = loaded
+        auth = ApiKeyAuth(organization=organization_snapshot, api_key=api_key_snapshot)
+        if settings.AUTH_CACHE_ENABLED:
+            store_auth(key_hash, auth, generation)
     
     # Bloquear uso por plano basic
-    if organization.plan == "basic":
+    if auth.organization.plan == "basic":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Seu plano não permite uso de API key. Faça upgrade para Starter ou superior."
         )
     
-    # Atualizar last_used_at no máx. 1x por dia
-    now = datetime.utcnow()
-    should_update_last_used = (
-        api_key_record.last_used_at is None
-        or (now - api_key_record.last_used_at) >= timedelta(days=1)
-    )
-    if should_update_last_used:
-        api_key_record.last_used_at = now
+    # last_used_at vai para o buffer (gravado em lote fora da requisição)
+    record_last_used(auth.api_key.id)
     
     # Armazenar api_key_id no request.state para uso no logging
-    request.state.api_key_id = api_key_record.id
+    request.state.api_key_id = auth.api_key.id
     
-    return ApiKeyAuth(organization=organization, api_key=api_key_record)
+    return auth
 
 
 def get_current_organization_from_api_key(
     auth: ApiKeyAuth = Depends(get_api_key_auth),
-) -> Organization:
+) -> OrganizationSnapshot:
     """
     Dependência que valida a API key e retorna apenas a organização.
     
@@ -168,7 +160,7 @@ def get_current_organization_from_api_key(
         auth: Resultado da autenticação por API key
         
     Returns:
-        Organization associada à API key válida
+        Snapshot da organização associada à API key válida
     """
     return auth.organization
 
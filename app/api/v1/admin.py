@@ -12,10 +12,11 @@ from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 
 from app.api.deps import require_admin_user
+from app.core.auth_cache import invalidate_organization_auth
 from app.core.config import settings
 from app.core.security import create_access_token, get_password_hash
 from app.db.models import ALL_PLANS, AdminAuditLog, Organization, User
-from app.db.session import get_db
+from app.db.session import get_admin_db
 from app.schemas.admin import (
     AdminEnterpriseUpgradeLinkResponse,
     AdminOrganizationItem,
@@ -72,7 +73,7 @@ def list_users(
     q: Optional[str] = None,
     organization_id: Optional[int] = None,
     admin: User = Depends(require_admin_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_admin_db),
 ):
     page = max(page, 1)
     per_page = min(max(per_page, 1), 200)
@@ -119,7 +120,7 @@ def update_user(
     data: AdminUserUpdate,
     request: Request,
     admin: User = Depends(require_admin_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_admin_db),
 ):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -167,7 +168,7 @@ def impersonate_user(
     user_id: int,
     request: Request,
     admin: User = Depends(require_admin_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_admin_db),
 ):
     target = db.query(User).filter(User.id == user_id).first()
     if not target:
@@ -205,7 +206,7 @@ def list_organizations(
     per_page: int = 20,
     q: Optional[str] = None,
     admin: User = Depends(require_admin_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_admin_db),
 ):
     page = max(page, 1)
     per_page = min(max(per_page, 1), 200)
@@ -239,7 +240,7 @@ def list_organizations(
 def get_organization(
     org_id: int,
     admin: User = Depends(require_admin_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_admin_db),
 ):
     org = db.query(Organization).filter(Organization.id == org_id).first()
     if not org:
@@ -253,7 +254,7 @@ def update_organization(
     data: AdminOrganizationUpdate,
     request: Request,
     admin: User = Depends(require_admin_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_admin_db),
 ):
     org = db.query(Organization).filter(Organization.id == org_id).first()
     if not org:
@@ -302,6 +303,7 @@ def update_organization(
            target_org_id=org.id, payload={"before": before, "after": after},
            ip=ip, user_agent=ua)
     db.commit()
+    invalidate_organization_auth(org.id)
     db.refresh(org)
 
     return AdminOrganizationItem.model_validate(org)
@@ -324,7 +326,7 @@ def provision_enterprise(
     org_id: int,
     request: Request,
     admin: User = Depends(require_admin_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_admin_db),
 ):
     org = db.query(Organization).filter(Organization.id == org_id).first()
     if not org:
@@ -15,6 +15,8 @@ from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.db.models import ApiKey, Organization, User
 from app.api.deps import get_current_user, get_current_organization_from_user
+from app.core.auth_cache import invalidate_api_key_auth
+from app.core.last_used import merge_last_used, pending_last_used
 
 
 router = APIRouter(prefix="/v1/dashboard/api-keys", tags=["Dashboard - API Keys"])
@@ -73,15 +75,18 @@ class ApiKeyListResponse(BaseModel):
 # Helper Functions
 # =============================================================================
 
-def api_key_to_response(api_key: ApiKey) -> ApiKeyResponse:
-    """Converte um modelo ApiKey para o schema de resposta."""
+def api_key_to_response(api_key: ApiKey, pending: Optional[dict] = None) -> ApiKeyResponse:
+    """
+    Converte um modelo ApiKey para o schema de resposta.
+    `pending`: usos ainda no buffer (ver app.core.last_used.pending_last_used).
+    """
     return ApiKeyResponse(
         id=api_key.id,
         name=api_key.name,
         masked_key=api_key.get_masked_key(),
         status="active" if api_key.is_active else "revoked",
         created_at=api_key.created_at,
-        last_used_at=api_key.last_used_at,
+        last_used_at=merge_last_used(api_key.id, api_key.last_used_at, pending or {}),
     )
 
 
@@ -138,8 +143,10 @@ def list_api_keys(
     )
     active_limit = org.get_api_key_active_limit_by_plan()
     
+    pending = pending_last_used(key.id for key in api_keys)
+    
     return ApiKeyListResponse(
-        items=[api_key_to_response(key) for key in api_keys],
+        items=[api_key_to_response(key, pending) for key in api_keys],
         page=page,
         per_page=per_page,
         total=total,
@@ -256,6 +263,8 @@ def revoke_api_key(
     api_key.last_used_at = datetime.utcnow()  # Marca quando foi revogada
     
     db.commit()
+    # Derrubar a key do cache de autenticação de todos os workers
+    invalidate_api_key_auth(api_key.key)
     db.refresh(api_key)
     
     return api_key_to_response(api_key)
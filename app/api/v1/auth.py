@@ -392,22 +392,19 @@ def _apply_forgot_rate_limit(request: Request) -> None:
 
         ip = get_client_ip(request)
 
-        allowed, retry_after = redis_rate_limiter.check_cooldown(
-            key=f"rl:ip:{ip}:forgot:cooldown",
+        blocked, _limit, _remaining, retry_after = redis_rate_limiter.check_cooldown_and_daily_limit(
+            cooldown_key=f"rl:ip:{ip}:forgot:cooldown",
             cooldown_seconds=_FORGOT_COOLDOWN_SECONDS,
+            daily_key=f"rl:ip:{ip}:forgot:daily",
+            daily_limit=_FORGOT_DAILY_LIMIT,
         )
-        if not allowed:
+        if blocked == "cooldown":
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="Aguarde alguns segundos antes de tentar novamente.",
                 headers={"Retry-After": str(retry_after)},
             )
-
-        allowed, _remaining, retry_after = redis_rate_limiter.check_daily_limit_until_midnight(
-            key=f"rl:ip:{ip}:forgot:daily",
-            daily_limit=_FORGOT_DAILY_LIMIT,
-        )
-        if not allowed:
+        if blocked == "daily":
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="Limite diário de solicitações atingido. Tente novamente amanhã.",
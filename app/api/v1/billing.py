@@ -11,6 +11,7 @@ from datetime import datetime
 import os
 
 from app.api.deps import get_db, get_current_user
+from app.core.auth_cache import invalidate_organization_auth
 from app.core.config import settings
 from app.db.models import PRIVATE_PLANS, PUBLIC_PLANS, Organization, User
 from app.services.stripe_service import StripeService
@@ -381,12 +382,14 @@ def switch_plan(
                 org.plan = "basic"
                 org.subscription_status = "canceled"
                 db.commit()
+                invalidate_organization_auth(org.id)
                 return SwitchPlanResponse(message="Plano alterado para Basic. Subscription cancelada.")
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Erro ao cancelar subscription: {str(e)}")
         else:
             org.plan = "basic"
             db.commit()
+            invalidate_organization_auth(org.id)
             return SwitchPlanResponse(message="Plano alterado para Basic")
 
     # Upgrade/downgrade entre planos pagos → Portal confirm
@@ -477,6 +480,7 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
 
             _apply_subscription_to_org(org, subscription_data)
             db.commit()
+            invalidate_organization_auth(org.id)
             print(f"[WEBHOOK] Organização {org.id} atualizada: {org.plan}, status={org.subscription_status}")
     
     # Subscription deletada/cancelada
@@ -495,6 +499,7 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
             org.batch_limit_override = None
             org.monthly_limit_override = None
             db.commit()
+            invalidate_organization_auth(org.id)
             print(f"[WEBHOOK] Organização {org.id} voltou para plano Basic; overrides removidos")
     
     # Pagamento de invoice bem-sucedido
@@ -537,6 +542,7 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
                 subscription_data = StripeService.extract_subscription_data(subscription_obj)
                 _apply_subscription_to_org(org, subscription_data)
                 db.commit()
+                invalidate_organization_auth(org.id)
                 print(f"[WEBHOOK] (checkout.completed) Organização {org.id} atualizada para {org.plan}")
     
     # Customer atualizado (ex.: mudança de payment method padrão)
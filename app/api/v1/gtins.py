@@ -3,86 +3,129 @@ Endpoints de consulta de GTIN.
 ==============================
 Implementa GET /v1/gtins/{gtin} e POST /v1/gtins:batch
 Protegidos por autenticação via API key.
+
+As rotas de lookup (`async def`) usam AsyncSession e o cliente Redis
+asyncio; as demais são síncronas e rodam no threadpool.
 """
 
+from typing import Iterator
+
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.session import get_db
-from app.db.models import MAX_BATCH_SIZE, Organization
+from app.db.session import READ_BIND, ReadSessionLocal, get_async_db, get_db
+from app.db.models import MAX_BATCH_SIZE, MAX_STREAM_BATCH_SIZE
 from app.api.deps import get_api_key_auth, ApiKeyAuth
-from app.core.usage import (
-    record_api_usage,
-    get_organization_monthly_usage,
-    record_org_usage_monthly,
-)
+from app.core.auth_cache import OrganizationSnapshot
+from app.core.usage import UsageReservation, reserve_usage, reserve_usage_async
 from app.core.rate_limit import rate_limit_lookup, rate_limit_search
 from app.core.config import settings
 from app.core.meilisearch_client import MeiliError, get_meili_client
+from app.core.search_cursor import InvalidCursor, decode_cursor, encode_cursor, search_fingerprint
+from app.core.gtin import (
+    GTIN_ERROR_HEADER,
+    canonicalize_gtin,
+    canonicalize_gtins,
+    to_gtin14,
+)
+from app.core.products import (
+    fetch_product_by_gtin_async,
+    fetch_products_by_gtins,
+    fetch_products_by_gtins_async,
+)
+from app.core.product_json import batch_response, encode_batch_item, product_response
+from app.core.http_cache import (
+    batch_validators,
+    is_not_modified,
+    not_modified_response,
+    product_validators,
+)
 from app.schemas.product import (
     ProductResponse,
     BatchRequest,
     BatchResponse,
-    BatchResponseItem,
     SearchResponse,
+    StreamBatchRequest,
 )
 
 router = APIRouter(prefix="/v1/gtins", tags=["GTINs"])
 SEARCH_LIMIT = 10
+# GTINs por consulta no lote em streaming (uma query por chunk)
+STREAM_CHUNK_SIZE = 500
+
 
+def _check_batch_size(org: OrganizationSnapshot, total_requested: int, max_size: int) -> None:
+    """
+    Valida teto técnico e limite de batch do plano.
 
-def normalize_gtin(gtin: str) -> str:
-    """Remove caracteres não numéricos do GTIN."""
-    return "".join(c for c in gtin if c.isdigit())
+    Raises:
+        HTTPException 400/403 conforme o limite violado.
+    """
+    # Limite "hard" defensivo para abuso
+    if total_requested > max_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo de {max_size} GTINs por requisição."
+        )
+
+    # Limite por plano
+    batch_limit = min(org.batch_limit, max_size)
+    if batch_limit <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seu plano não permite consultas em batch. Atualize seu plano para habilitar."
+        )
+    if total_requested > batch_limit:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Limite do plano excedido: máximo de {batch_limit} GTINs por batch."
+        )
 
 
-def fetch_product_by_gtin(db: Session, gtin: str) -> dict | None:
+def check_batch_limits(
+    db: Session,
+    org: OrganizationSnapshot,
+    api_key_id: int,
+    total_requested: int,
+    max_size: int,
+) -> UsageReservation:
     """
-    Busca um produto pelo GTIN no banco de dados.
-    
+    Valida teto técnico e limite de batch do plano e reserva a cota mensal
+    (cada requisição batch conta como 1).
+
     Returns:
-        Dict com os dados do produto ou None se não encontrado.
+        Reserva de uma unidade, a liquidar pelo chamador.
+
+    Raises:
+        HTTPException 400/403/429 conforme o limite violado.
     """
-    query = text("""
-        SELECT 
-            gtin,
-            gtin_type,
-            brand,
-            product_name,
-            origin_country,
-            ncm,
-            cest,
-            gross_weight_value,
-            gross_weight_unit
-        FROM products
-        WHERE gtin = :gtin
-    """)
-    
-    result = db.execute(query, {"gtin": gtin}).fetchone()
-    
-    if result is None:
-        return None
-    
-    # Converter Row para dict
-    return {
-        "gtin": result.gtin,
-        "gtin_type": result.gtin_type,
-        "brand": result.brand,
-        "product_name": result.product_name,
-        "origin_country": result.origin_country,
-        "ncm": result.ncm,
-        "cest": result.cest,
-        "gross_weight_value": result.gross_weight_value,
-        "gross_weight_unit": result.gross_weight_unit,
-    }
+    _check_batch_size(org, total_requested, max_size)
+    return reserve_usage(db, org, api_key_id)
 
 
-def process_batch_gtins(
-    db: Session,
+async def check_batch_limits_async(
+    db: AsyncSession,
+    org: OrganizationSnapshot,
+    api_key_id: int,
+    total_requested: int,
+    max_size: int,
+) -> UsageReservation:
+    """`check_batch_limits` com AsyncSession."""
+    _check_batch_size(org, total_requested, max_size)
+    return await reserve_usage_async(db, org, api_key_id)
+
+
+async def process_batch_gtins(
+    db: AsyncSession,
     gtins: list[str],
     auth: ApiKeyAuth,
-) -> BatchResponse:
+    headers: dict | None = None,
+    request: Request | None = None,
+    response: Response | None = None,
+):
     """
     Processa uma lista de GTINs e retorna a resposta em lote.
     Função auxiliar compartilhada pelos endpoints POST e GET.
@@ -91,175 +134,56 @@ def process_batch_gtins(
         db: Sessão do banco de dados
         gtins: Lista de GTINs para consultar
         auth: Informações de autenticação
+        headers: Headers extras da resposta
+        request: Se informado, adiciona ETag/Last-Modified e responde 304
+            a requisições condicionais (GET)
+        response: Response injetado do endpoint (recebe os validadores no
+            modo Pydantic)
     
     Returns:
-        BatchResponse com os resultados
+        Resposta no formato BatchResponse (ver app.core.product_json)
     """
-    results: list[BatchResponseItem] = []
     total_found = 0
     total_requested = len(gtins)
 
-    # Limite "hard" defensivo para abuso
-    if total_requested > MAX_BATCH_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Máximo de {MAX_BATCH_SIZE} GTINs por requisição."
-        )
-
     org = auth.organization
+    reservation = await check_batch_limits_async(db, org, auth.api_key.id, total_requested, MAX_BATCH_SIZE)
 
-    # Limite por plano (cada requisição batch conta como 1)
-    batch_limit = min(org.batch_limit, MAX_BATCH_SIZE)
-    if batch_limit <= 0:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Seu plano não permite consultas em batch. Atualize seu plano para habilitar."
-        )
-    if total_requested > batch_limit:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Limite do plano excedido: máximo de {batch_limit} GTINs por batch."
-        )
-
-    monthly_limit = org.monthly_limit
-    used_month = get_organization_monthly_usage(db, org.id)
-    if monthly_limit > 0 and used_month + 1 > monthly_limit:
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Limite mensal excedido. Restam {max(monthly_limit - used_month, 0)} de {monthly_limit} chamadas para este mês.",
-        )
-
-    # Normalizar todos os GTINs e criar mapeamento
-    normalized_gtins_map = {}  # Mapeia GTIN original -> GTIN normalizado
-    valid_normalized_gtins = []  # Lista de GTINs normalizados válidos para query
+    # Validar e canonicalizar (GTIN-14) antes de qualquer consulta
+    checks = canonicalize_gtins(gtins)
     
-    for original_gtin in gtins:
-        normalized = normalize_gtin(original_gtin)
-        normalized_gtins_map[original_gtin] = normalized
-        if normalized:  # Apenas adicionar à query se não estiver vazio
-            valid_normalized_gtins.append(normalized)
+    # Buscar todos os produtos de uma vez (cache + uma única query)
+    try:
+        found_products = await fetch_products_by_gtins_async(db, [c.gtin14 for c in checks if c.valid])
+    except BaseException:
+        await reservation.release_async()
+        raise
     
-    # Buscar todos os produtos de uma vez (mais eficiente)
-    found_products = {}
-    if valid_normalized_gtins:
-        # Criar query com IN clause
-        placeholders = ", ".join([f":gtin_{i}" for i in range(len(valid_normalized_gtins))])
-        query = text(f"""
-            SELECT 
-                gtin,
-                gtin_type,
-                brand,
-                product_name,
-                origin_country,
-                ncm,
-                cest,
-                gross_weight_value,
-                gross_weight_unit
-            FROM products
-            WHERE gtin IN ({placeholders})
-        """)
-        
-        # Criar parâmetros
-        params = {f"gtin_{i}": g for i, g in enumerate(valid_normalized_gtins)}
-        
-        # Executar query
-        rows = db.execute(query, params).fetchall()
-        
-        # Criar mapa de resultados encontrados
-        for row in rows:
-            found_products[row.gtin] = {
-                "gtin": row.gtin,
-                "gtin_type": row.gtin_type,
-                "brand": row.brand,
-                "product_name": row.product_name,
-                "origin_country": row.origin_country,
-                "ncm": row.ncm,
-                "cest": row.cest,
-                "gross_weight_value": row.gross_weight_value,
-                "gross_weight_unit": row.gross_weight_unit,
-            }
-    
-    # Montar resposta mantendo a ordem dos GTINs solicitados
-    for original_gtin in gtins:
-        normalized_gtin = normalized_gtins_map[original_gtin]
-        
-        if not normalized_gtin:
-            # GTIN inválido (vazio após normalização)
-            results.append(BatchResponseItem(
-                gtin=original_gtin,
-                found=False,
-                product=None
-            ))
-        elif normalized_gtin in found_products:
-            # Produto encontrado
-            results.append(BatchResponseItem(
-                gtin=original_gtin,
-                found=True,
-                product=ProductResponse(**found_products[normalized_gtin])
-            ))
+    # Montar itens mantendo a ordem dos GTINs solicitados:
+    # (GTIN consultado, produto ou None, motivo da rejeição na validação)
+    items = []
+    for check in checks:
+        product = found_products.get(check.gtin14) if check.valid else None
+        if product is not None:
             total_found += 1
-        else:
-            # GTIN válido mas produto não encontrado
-            results.append(BatchResponseItem(
-                gtin=original_gtin,
-                found=False,
-                product=None
-            ))
+        items.append((check.raw, product, check.reason))
     
     # Registrar uso: cada requisição batch conta como 1 consulta (independente do número de GTINs)
     if total_requested > 0:
-        record_org_usage_monthly(db, org.id, 200)
-        # Mantemos também o registro por API key para métricas
-        record_api_usage(db, auth.api_key.id, 200)
-        db.commit()
+        await reservation.settle_async(db, 200)
+        await db.commit()
+    else:
+        await reservation.release_async()
+
+    if request is not None:
+        validators = batch_validators(items)
+        if is_not_modified(request, validators):
+            return not_modified_response(validators, headers)
+        headers = {**(headers or {}), **validators}
+        if response is not None:
+            response.headers.update(validators)
     
-    return BatchResponse(
-        total_requested=total_requested,
-        total_found=total_found,
-        results=results
-    )
-
-
-def fetch_products_by_gtins(db: Session, gtins: list[str]) -> dict[str, ProductResponse]:
-    """
-    Busca produtos por lista de GTINs em uma única query.
-    Retorna mapa gtin -> ProductResponse.
-    """
-    if not gtins:
-        return {}
-
-    placeholders = ", ".join([f":gtin_{i}" for i in range(len(gtins))])
-    query = text(f"""
-        SELECT
-            gtin,
-            gtin_type,
-            brand,
-            product_name,
-            origin_country,
-            ncm,
-            cest,
-            gross_weight_value,
-            gross_weight_unit
-        FROM products
-        WHERE gtin IN ({placeholders})
-    """)
-    params = {f"gtin_{i}": g for i, g in enumerate(gtins)}
-    rows = db.execute(query, params).fetchall()
-
-    result: dict[str, ProductResponse] = {}
-    for row in rows:
-        result[row.gtin] = ProductResponse(
-            gtin=row.gtin,
-            gtin_type=row.gtin_type,
-            brand=row.brand,
-            product_name=row.product_name,
-            origin_country=row.origin_country,
-            ncm=row.ncm,
-            cest=row.cest,
-            gross_weight_value=row.gross_weight_value,
-            gross_weight_unit=row.gross_weight_unit,
-        )
-    return result
+    return batch_response(items, total_requested, total_found, headers=headers)
 
 
 @router.post(
@@ -279,7 +203,7 @@ async def get_products_batch(
     batch_request: BatchRequest,
     request: Request,
     auth: ApiKeyAuth = Depends(rate_limit_lookup),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Consulta múltiplos produtos por GTIN via POST.
@@ -290,7 +214,7 @@ async def get_products_batch(
     
     Retorna todos os GTINs solicitados, indicando quais foram encontrados.
     """
-    return process_batch_gtins(db, batch_request.gtins, auth)
+    return await process_batch_gtins(db, batch_request.gtins, auth)
 
 
 @router.get(
@@ -300,6 +224,7 @@ async def get_products_batch(
     description="Consulta múltiplos produtos de uma vez via query parameters. Limites por plano: starter=2, pro=5, advanced=10 (basic não permite batch). Máximo absoluto de 100 GTINs por requisição. Ideal para cacheamento. Requer API key válida. Rate limit por plano (10-120 req/min).",
     responses={
         200: {"description": "Resultados da consulta em lote"},
+        304: {"description": "Nenhum produto do lote mudou (If-None-Match / If-Modified-Since)"},
         400: {"description": "Requisição inválida"},
         401: {"description": "API key inválida ou não fornecida"},
         403: {"description": "Plano não permite batch"},
@@ -316,7 +241,7 @@ async def get_products_batch_query(
     ),
     request: Request = None,
     auth: ApiKeyAuth = Depends(rate_limit_lookup),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Consulta múltiplos produtos por GTIN via GET.
@@ -328,6 +253,8 @@ async def get_products_batch_query(
     
     Este endpoint é cacheável e ideal para consultas repetidas.
     Use `Cache-Control` para configurar o cache conforme necessário.
+    Envia `ETag`/`Last-Modified`; requisições com `If-None-Match` ou
+    `If-Modified-Since` recebem 304 se nenhum produto mudou.
     
     Retorna todos os GTINs solicitados, indicando quais foram encontrados.
     """
@@ -344,16 +271,95 @@ async def get_products_batch_query(
             detail="Pelo menos um GTIN deve ser fornecido"
         )
     
-    # Processar batch
-    batch_response = process_batch_gtins(db, gtins, auth)
-    
-    # Adicionar headers de cache
+    # Headers de cache
     # Cache por 1 hora (3600 segundos) - ajuste conforme necessário
     # Varia por X-API-Key para separar cache por organização
-    response.headers["Cache-Control"] = "private, max-age=3600"
-    response.headers["Vary"] = "X-API-Key"
+    cache_headers = {
+        "Cache-Control": "private, max-age=3600",
+        "Vary": "X-API-Key",
+    }
+    response.headers.update(cache_headers)
     
-    return batch_response
+    # Processar batch
+    return await process_batch_gtins(
+        db, gtins, auth, headers=cache_headers, request=request, response=response
+    )
+
+
+def stream_batch_lines(gtins: list[str]) -> Iterator[bytes]:
+    """
+    Gera a resposta NDJSON do lote em streaming: uma linha por GTIN, na
+    ordem de entrada, consultando STREAM_CHUNK_SIZE GTINs por vez.
+
+    Usa sessão própria (a de `get_db` já foi fechada quando o corpo começa a
+    ser enviado) e devolve a conexão ao pool entre chunks, para um cliente
+    lento não segurar conexões do banco.
+
+    Não usa cursor no servidor (`stream_results`/`yield_per`, como em
+    app.core.gtin_filter): o cursor manteria uma conexão e uma transação
+    abertas até o cliente terminar de ler, e pularia os caches de produto.
+    Cada chunk é uma consulta de array limitada; a memória fica limitada ao
+    chunk e a ordem de entrada sai sem ORDER BY sobre o lote inteiro.
+    """
+    db = ReadSessionLocal()
+    try:
+        for start in range(0, len(gtins), STREAM_CHUNK_SIZE):
+            checks = canonicalize_gtins(gtins[start:start + STREAM_CHUNK_SIZE])
+            found_products = fetch_products_by_gtins(db, [c.gtin14 for c in checks if c.valid])
+            db.rollback()
+
+            lines = [
+                encode_batch_item(
+                    check.raw,
+                    found_products.get(check.gtin14) if check.valid else None,
+                    check.reason,
+                )
+                for check in checks
+            ]
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+    finally:
+        db.close()
+
+
+@router.post(
+    "/batch/stream",
+    response_class=StreamingResponse,
+    summary="Consultar produtos em lote com resposta em streaming (NDJSON)",
+    description=(
+        "Variante do lote para listas grandes: retorna `application/x-ndjson` com uma linha "
+        "por GTIN (mesmo formato dos itens de `/v1/gtins/batch`), na ordem de entrada, "
+        "enviadas à medida que cada bloco é consultado. O tamanho máximo é o limite de batch "
+        f"do plano (teto técnico de {MAX_STREAM_BATCH_SIZE} GTINs). Cada requisição conta como 1 "
+        "consulta. Requer API key válida."
+    ),
+    responses={
+        200: {"description": "Uma linha JSON por GTIN", "content": {"application/x-ndjson": {}}},
+        400: {"description": "Requisição inválida"},
+        401: {"description": "API key inválida ou não fornecida"},
+        403: {"description": "Plano não permite batch"},
+        429: {"description": "Limite de rate ou mensal excedido"},
+    }
+)
+def get_products_batch_stream(
+    batch_request: StreamBatchRequest,
+    auth: ApiKeyAuth = Depends(rate_limit_lookup),
+    db: Session = Depends(get_db),
+):
+    """
+    Consulta múltiplos produtos por GTIN com resposta incremental.
+
+    Limites e cota são validados antes do primeiro byte; depois disso o
+    status já foi enviado, então erros só podem interromper o stream.
+    """
+    gtins = batch_request.gtins
+    org = auth.organization
+    reservation = check_batch_limits(db, org, auth.api_key.id, len(gtins), MAX_STREAM_BATCH_SIZE)
+
+    # Registrar uso antes de iniciar o stream (cada requisição batch conta como 1)
+    reservation.settle(db, 200)
+    db.commit()
+
+    return StreamingResponse(stream_batch_lines(gtins), media_type="application/x-ndjson")
 
 
 def _search_pgfts(
@@ -363,10 +369,14 @@ def _search_pgfts(
     product_name_filter: str | None,
     ncm_filter: str | None,
     offset: int,
+    after: str | None = None,
 ) -> tuple[list[ProductResponse], bool]:
     """
     Busca usando PostgreSQL Full-Text Search com índices GIN funcionais
     por coluna. Cada filtro atua **apenas** na sua coluna correspondente.
+
+    Ordenada por gtin; `after` (keyset) retoma depois do último gtin da
+    página anterior.
     """
     where_clauses: list[str] = []
     params: dict[str, str | int] = {}
@@ -387,6 +397,10 @@ def _search_pgfts(
         where_clauses.append("ncm = :ncm")
         params["ncm"] = ncm_filter
 
+    if after:
+        where_clauses.append("gtin > :after")
+        params["after"] = after
+
     where_sql = " AND ".join(where_clauses) if where_clauses else "TRUE"
 
     select_query = text(f"""
@@ -402,12 +416,13 @@ def _search_pgfts(
             gross_weight_unit
         FROM products
         WHERE {where_sql}
+        ORDER BY gtin
         LIMIT :limit OFFSET :offset
     """)
     params["limit"] = SEARCH_LIMIT + 1
     params["offset"] = offset
 
-    rows = db.execute(select_query, params).fetchall()
+    rows = db.execute(select_query, params, bind_arguments=READ_BIND).fetchall()
     has_more = len(rows) > SEARCH_LIMIT
     rows = rows[:SEARCH_LIMIT]
 
@@ -428,14 +443,146 @@ def _search_pgfts(
     return items, has_more
 
 
+def _escape_like(value: str) -> str:
+    """Escapa curingas do LIKE: o termo do usuário é sempre literal."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_trgm_search_query(
+    *,
+    brand_filter: str | None,
+    product_name_filter: str | None,
+    ncm_filter: str | None,
+    offset: int,
+    after: dict | None = None,
+):
+    """
+    Monta a consulta do backend trgm (substring com índices pg_trgm).
+
+    Os filtros ficam na forma `coluna ILIKE '%termo%'`, que o planner
+    resolve com os índices GIN gin_trgm_ops (scripts/create_trgm_indexes.py)
+    em vez de varrer a tabela. Ordena por similaridade (word_similarity do
+    termo na coluna) e gtin; `after` ({"r": rank, "g": gtin}) é o keyset
+    da página anterior.
+
+    O rank é calculado por linha e nenhum índice o serve: qualquer página
+    (inclusive as seguintes, via keyset) ranqueia e ordena todas as linhas
+    que casam com o filtro. Os índices GIN evitam a varredura da tabela, mas
+    o custo de cada página cresce com o número de resultados; termos muito
+    genéricos ficam caros (ver scripts/bench_trgm_search.py).
+
+    Returns:
+        (TextClause, params)
+    """
+    where_clauses: list[str] = []
+    rank_terms: list[str] = []
+    params: dict[str, str | int | float] = {}
+
+    if brand_filter:
+        where_clauses.append("brand ILIKE :brand ESCAPE '\\'")
+        rank_terms.append("word_similarity(:brand_q, brand)")
+        params["brand"] = f"%{_escape_like(brand_filter)}%"
+        params["brand_q"] = brand_filter
+
+    if product_name_filter:
+        where_clauses.append("product_name ILIKE :product_name ESCAPE '\\'")
+        rank_terms.append("word_similarity(:name_q, product_name)")
+        params["product_name"] = f"%{_escape_like(product_name_filter)}%"
+        params["name_q"] = product_name_filter
+
+    if ncm_filter:
+        where_clauses.append("ncm = :ncm")
+        params["ncm"] = ncm_filter
+
+    where_sql = " AND ".join(where_clauses) if where_clauses else "TRUE"
+    rank_sql = " + ".join(rank_terms) if rank_terms else "0"
+
+    keyset_sql = ""
+    if after:
+        keyset_sql = (
+            "WHERE rank < CAST(:after_rank AS real) "
+            "OR (rank = CAST(:after_rank AS real) AND gtin > :after)"
+        )
+        params["after_rank"] = after["r"]
+        params["after"] = after["g"]
+
+    select_query = text(f"""
+        SELECT *
+        FROM (
+            SELECT
+                gtin,
+                gtin_type,
+                brand,
+                product_name,
+                origin_country,
+                ncm,
+                cest,
+                gross_weight_value,
+                gross_weight_unit,
+                CAST({rank_sql} AS real) AS rank
+            FROM products
+            WHERE {where_sql}
+        ) AS matches
+        {keyset_sql}
+        ORDER BY rank DESC, gtin
+        LIMIT :limit OFFSET :offset
+    """)
+    params["limit"] = SEARCH_LIMIT + 1
+    params["offset"] = offset
+    return select_query, params
+
+
+def _search_trgm(
+    db: Session,
+    *,
+    brand_filter: str | None,
+    product_name_filter: str | None,
+    ncm_filter: str | None,
+    offset: int,
+    after: dict | None = None,
+) -> tuple[list[ProductResponse], bool, dict | None]:
+    """
+    Busca por substring com índices trigram, ranqueada por similaridade.
+    Retorna também a posição (keyset) da última linha quando há mais páginas.
+    """
+    select_query, params = build_trgm_search_query(
+        brand_filter=brand_filter,
+        product_name_filter=product_name_filter,
+        ncm_filter=ncm_filter,
+        offset=offset,
+        after=after,
+    )
+    rows = db.execute(select_query, params, bind_arguments=READ_BIND).fetchall()
+    has_more = len(rows) > SEARCH_LIMIT
+    rows = rows[:SEARCH_LIMIT]
+
+    items = [
+        ProductResponse(
+            gtin=row.gtin,
+            gtin_type=row.gtin_type,
+            brand=row.brand,
+            product_name=row.product_name,
+            origin_country=row.origin_country,
+            ncm=row.ncm,
+            cest=row.cest,
+            gross_weight_value=row.gross_weight_value,
+            gross_weight_unit=row.gross_weight_unit,
+        )
+        for row in rows
+    ]
+    next_position = {"r": float(rows[-1].rank), "g": rows[-1].gtin} if has_more else None
+    return items, has_more, next_position
+
+
 @router.get(
     "/search",
     response_model=SearchResponse,
     summary="Buscar produtos por filtros",
     description=(
         "Busca produtos por brand, product_name e/ou ncm. "
-        "Backend configurável via SEARCH_BACKEND (pgfts, meili, postgres). "
-        "Retorna paginação por offset com limite fixo de 10 itens. "
+        "Backend configurável via SEARCH_BACKEND (pgfts, trgm, meili, postgres). "
+        "Limite fixo de 10 itens por página; pagine com `cursor` (valor de "
+        "`next_cursor` da página anterior). `offset` só vale para páginas rasas. "
         "Rate limit: 1 pesquisa a cada 2-12 segundos dependendo do plano."
     ),
     responses={
@@ -446,28 +593,26 @@ def _search_pgfts(
         429: {"description": "Limite de rate ou mensal excedido"},
     }
 )
-async def search_products(
+def search_products(
     request: Request,
     brand: str | None = Query(None, description="Marca (busca textual)"),
     product_name: str | None = Query(None, description="Nome do produto (busca textual)"),
     ncm: str | None = Query(None, description="Código NCM (match exato)"),
-    offset: int = Query(0, ge=0, description="Offset para paginação (múltiplos de 10)"),
+    offset: int = Query(0, ge=0, description="Offset para paginação (múltiplos de 10; só páginas rasas)"),
+    cursor: str | None = Query(None, description="Cursor da próxima página (next_cursor da resposta anterior)"),
     auth: ApiKeyAuth = Depends(rate_limit_search),
     db: Session = Depends(get_db),
 ):
     """
     Busca produtos aplicando filtros opcionais e retorna resultados paginados.
     Limite fixo de 10 itens por página.
+
+    Paginação por keyset: `next_cursor` leva à próxima página com o mesmo
+    custo em qualquer profundidade. `offset` é limitado a SEARCH_MAX_OFFSET.
     """
     org = auth.organization
 
-    monthly_limit = org.monthly_limit
-    used_month = get_organization_monthly_usage(db, org.id)
-    if monthly_limit > 0 and used_month + 1 > monthly_limit:
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Limite mensal excedido. Restam {max(monthly_limit - used_month, 0)} de {monthly_limit} chamadas para este mês.",
-        )
+    reservation = reserve_usage(db, org, auth.api_key.id)
 
     # Normalizar filtros: remover espaços extras e ignorar strings vazias
     brand_filter = brand.strip() if brand else None
@@ -475,8 +620,7 @@ async def search_products(
     ncm_filter = ncm.strip() if ncm else None
 
     if brand_filter and len(brand_filter) < 3:
-        record_org_usage_monthly(db, org.id, 400)
-        record_api_usage(db, auth.api_key.id, 400)
+        reservation.settle(db, 400)
         db.commit()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -484,8 +628,7 @@ async def search_products(
         )
 
     if product_name_filter and len(product_name_filter) < 3:
-        record_org_usage_monthly(db, org.id, 400)
-        record_api_usage(db, auth.api_key.id, 400)
+        reservation.settle(db, 400)
         db.commit()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -493,112 +636,164 @@ async def search_products(
         )
 
     if not any([brand_filter, product_name_filter, ncm_filter]):
-        record_org_usage_monthly(db, org.id, 400)
-        record_api_usage(db, auth.api_key.id, 400)
+        reservation.settle(db, 400)
         db.commit()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Informe pelo menos um filtro: brand, product_name ou ncm."
         )
 
-    items: list[ProductResponse] = []
-    has_more = False
-    total: int | None = None
-
-    if settings.SEARCH_BACKEND == "pgfts":
-        items, has_more = _search_pgfts(
-            db,
-            brand_filter=brand_filter,
-            product_name_filter=product_name_filter,
-            ncm_filter=ncm_filter,
-            offset=offset,
+    if offset > settings.SEARCH_MAX_OFFSET or (cursor and offset):
+        reservation.settle(db, 400)
+        db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f"offset é aceito apenas até {settings.SEARCH_MAX_OFFSET} e sem cursor; "
+                "para páginas seguintes use next_cursor."
+            ),
         )
-    elif settings.SEARCH_BACKEND == "meili":
-        query_terms = [t for t in [brand_filter, product_name_filter] if t]
-        meili_query = " ".join(query_terms).strip()
 
+    fingerprint = search_fingerprint(
+        settings.SEARCH_BACKEND, brand_filter, product_name_filter, ncm_filter
+    )
+    position: dict = {}
+    if cursor:
         try:
-            meili = get_meili_client()
-            meili_result = meili.search_products(
-                query=meili_query,
+            position = decode_cursor(cursor, fingerprint)
+        except InvalidCursor as exc:
+            reservation.settle(db, 400)
+            db.commit()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    items: list[ProductResponse] = []
+    has_more = False
+    total: int | None = None
+    next_position: dict | None = None
+
+    # Consulta falhou (erro de banco, timeout, cancelamento): nada é contabilizado
+    try:
+        if settings.SEARCH_BACKEND == "pgfts":
+            items, has_more = _search_pgfts(
+                db,
+                brand_filter=brand_filter,
+                product_name_filter=product_name_filter,
                 ncm_filter=ncm_filter,
                 offset=offset,
-                limit=SEARCH_LIMIT,
+                after=position.get("g"),
             )
-        except MeiliError as exc:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Busca temporariamente indisponível (Meilisearch): {exc}",
+            if has_more:
+                next_position = {"g": items[-1].gtin}
+        elif settings.SEARCH_BACKEND == "trgm":
+            items, has_more, next_position = _search_trgm(
+                db,
+                brand_filter=brand_filter,
+                product_name_filter=product_name_filter,
+                ncm_filter=ncm_filter,
+                offset=offset,
+                after=position or None,
             )
-
-        products_by_gtin = fetch_products_by_gtins(db, meili_result.gtins)
-        for gtin in meili_result.gtins:
-            product = products_by_gtin.get(gtin)
-            if product:
-                items.append(product)
-
-        has_more = meili_result.has_more
-        total = meili_result.estimated_total_hits
-    else:
-        where_clauses = []
-        params: dict[str, str | int] = {}
-
-        if brand_filter:
-            where_clauses.append("brand ILIKE :brand")
-            params["brand"] = f"%{brand_filter}%"
-
-        if product_name_filter:
-            where_clauses.append("product_name ILIKE :product_name")
-            params["product_name"] = f"%{product_name_filter}%"
-
-        if ncm_filter:
-            where_clauses.append("ncm = :ncm")
-            params["ncm"] = ncm_filter
-
-        where_sql = " AND ".join(where_clauses)
-        base_select = """
-            SELECT
-                gtin,
-                gtin_type,
-                brand,
-                product_name,
-                origin_country,
-                ncm,
-                cest,
-                gross_weight_value,
-                gross_weight_unit
-            FROM products
-        """
-
-        select_query = text(
-            base_select
-            + " WHERE "
-            + where_sql
-            + " LIMIT :limit OFFSET :offset"
-        )
-        params_with_pagination = {**params, "limit": SEARCH_LIMIT + 1, "offset": offset}
-        rows = db.execute(select_query, params_with_pagination).fetchall()
-        has_more = len(rows) > SEARCH_LIMIT
-        rows = rows[:SEARCH_LIMIT]
-
-        for row in rows:
-            items.append(ProductResponse(
-                gtin=row.gtin,
-                gtin_type=row.gtin_type,
-                brand=row.brand,
-                product_name=row.product_name,
-                origin_country=row.origin_country,
-                ncm=row.ncm,
-                cest=row.cest,
-                gross_weight_value=row.gross_weight_value,
-                gross_weight_unit=row.gross_weight_unit,
-            ))
+        elif settings.SEARCH_BACKEND == "meili":
+            query_terms = [t for t in [brand_filter, product_name_filter] if t]
+            meili_query = " ".join(query_terms).strip()
+            # Meilisearch ordena por relevância (sem keyset): o cursor guarda o
+            # offset, e a profundidade já é limitada pelo maxTotalHits do índice
+            meili_offset = position.get("o", offset)
+
+            try:
+                meili = get_meili_client()
+                meili_result = meili.search_products(
+                    query=meili_query,
+                    ncm_filter=ncm_filter,
+                    offset=meili_offset,
+                    limit=SEARCH_LIMIT,
+                )
+            except MeiliError as exc:
+                reservation.release()
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=f"Busca temporariamente indisponível (Meilisearch): {exc}",
+                )
+
+            hit_keys = [to_gtin14(gtin) for gtin in meili_result.gtins]
+            products_by_gtin = fetch_products_by_gtins(db, [k for k in hit_keys if k])
+            for key in hit_keys:
+                product = products_by_gtin.get(key) if key else None
+                if product:
+                    items.append(ProductResponse(**product))
+
+            has_more = meili_result.has_more
+            total = meili_result.estimated_total_hits
+            if has_more:
+                next_position = {"o": meili_offset + SEARCH_LIMIT}
+        else:
+            where_clauses = []
+            params: dict[str, str | int] = {}
+
+            if brand_filter:
+                where_clauses.append("brand ILIKE :brand ESCAPE '\\'")
+                params["brand"] = f"%{_escape_like(brand_filter)}%"
+
+            if product_name_filter:
+                where_clauses.append("product_name ILIKE :product_name ESCAPE '\\'")
+                params["product_name"] = f"%{_escape_like(product_name_filter)}%"
+
+            if ncm_filter:
+                where_clauses.append("ncm = :ncm")
+                params["ncm"] = ncm_filter
+
+            if position.get("g"):
+                where_clauses.append("gtin > :after")
+                params["after"] = position["g"]
+
+            where_sql = " AND ".join(where_clauses)
+            base_select = """
+                SELECT
+                    gtin,
+                    gtin_type,
+                    brand,
+                    product_name,
+                    origin_country,
+                    ncm,
+                    cest,
+                    gross_weight_value,
+                    gross_weight_unit
+                FROM products
+            """
+
+            select_query = text(
+                base_select
+                + " WHERE "
+                + where_sql
+                + " ORDER BY gtin LIMIT :limit OFFSET :offset"
+            )
+            params_with_pagination = {**params, "limit": SEARCH_LIMIT + 1, "offset": offset}
+            rows = db.execute(select_query, params_with_pagination, bind_arguments=READ_BIND).fetchall()
+            has_more = len(rows) > SEARCH_LIMIT
+            rows = rows[:SEARCH_LIMIT]
+
+            for row in rows:
+                items.append(ProductResponse(
+                    gtin=row.gtin,
+                    gtin_type=row.gtin_type,
+                    brand=row.brand,
+                    product_name=row.product_name,
+                    origin_country=row.origin_country,
+                    ncm=row.ncm,
+                    cest=row.cest,
+                    gross_weight_value=row.gross_weight_value,
+                    gross_weight_unit=row.gross_weight_unit,
+                ))
+            if has_more:
+                next_position = {"g": rows[-1].gtin}
+    except BaseException:
+        reservation.release()
+        raise
 
     returned = len(items)
 
     # Registrar sucesso
-    record_org_usage_monthly(db, org.id, 200)
-    record_api_usage(db, auth.api_key.id, 200)
+    reservation.settle(db, 200)
     db.commit()
 
     return SearchResponse(
@@ -607,6 +802,7 @@ async def search_products(
         limit=SEARCH_LIMIT,
         returned=returned,
         has_more=has_more,
+        next_cursor=encode_cursor(fingerprint, next_position) if next_position else None,
         items=items,
     )
 
@@ -618,6 +814,8 @@ async def search_products(
     description="Retorna os dados de um produto a partir do seu código GTIN (código de barras). Requer API key válida. Rate limit por plano (10-120 req/min).",
     responses={
         200: {"description": "Produto encontrado"},
+        304: {"description": "Produto não modificado (If-None-Match / If-Modified-Since)"},
+        400: {"description": "GTIN inválido (motivo no header X-GTIN-Error)"},
         401: {"description": "API key inválida ou não fornecida"},
         404: {"description": "Produto não encontrado"},
         429: {"description": "Limite de rate ou mensal excedido"},
@@ -626,52 +824,57 @@ async def search_products(
 async def get_product_by_gtin(
     gtin: str,
     request: Request,
+    response: Response,
     auth: ApiKeyAuth = Depends(rate_limit_lookup),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Consulta um produto pelo GTIN.
     
     - **gtin**: Código de barras do produto (8, 12, 13 ou 14 dígitos)
+
+    Envia `ETag`/`Last-Modified`; requisições condicionais com o produto
+    inalterado recebem 304 sem corpo (contam como consulta).
     """
-    # Normalizar GTIN (remover caracteres não numéricos)
-    normalized_gtin = normalize_gtin(gtin)
+    # Validar e canonicalizar (GTIN-14) antes de qualquer consulta de produto
+    check = canonicalize_gtin(gtin)
     
     org = auth.organization
 
-    monthly_limit = org.monthly_limit
-    used_month = get_organization_monthly_usage(db, org.id)
-    if monthly_limit > 0 and used_month + 1 > monthly_limit:
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Limite mensal excedido. Restam {max(monthly_limit - used_month, 0)} de {monthly_limit} chamadas para este mês.",
-        )
+    reservation = await reserve_usage_async(db, org, auth.api_key.id)
     
-    if not normalized_gtin:
-        # Registrar erro e lançar exceção
-        record_org_usage_monthly(db, org.id, 400)
-        record_api_usage(db, auth.api_key.id, 400)
-        db.commit()
+    if not check.valid:
+        # Registrar erro e lançar exceção (motivo estruturado no header)
+        await reservation.settle_async(db, 400)
+        await db.commit()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="GTIN inválido: deve conter apenas números"
+            detail=check.message,
+            headers={GTIN_ERROR_HEADER: check.reason},
         )
     
-    product = fetch_product_by_gtin(db, normalized_gtin)
+    try:
+        product = await fetch_product_by_gtin_async(db, check.gtin14)
+    except BaseException:
+        await reservation.release_async()
+        raise
     
     if product is None:
         # Registrar erro 404
-        record_org_usage_monthly(db, org.id, 404)
-        record_api_usage(db, auth.api_key.id, 404)
-        db.commit()
+        await reservation.settle_async(db, 404)
+        await db.commit()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Produto com GTIN '{normalized_gtin}' não encontrado"
+            detail=f"Produto com GTIN '{check.digits}' não encontrado"
         )
     
     # Registrar sucesso
-    record_org_usage_monthly(db, org.id, 200)
-    record_api_usage(db, auth.api_key.id, 200)
-    db.commit()
-    return product
+    await reservation.settle_async(db, 200)
+    await db.commit()
+
+    validators = product_validators(product)
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    response.headers.update(validators)
+    return product_response(product, headers=validators)
 
@@ -0,0 +1,288 @@
+"""
+Endpoints de jobs de consulta em lote assíncronos.
+==================================================
+Para arquivos grandes (milhões de GTINs), fora do limite do POST /v1/gtins/batch:
+
+- POST /v1/jobs: envia o arquivo (corpo bruto, um GTIN por linha; aceita
+  Content-Encoding: gzip) e recebe o id do job
+- GET /v1/jobs/{id}: status e progresso
+- GET /v1/jobs/{id}/result: download do resultado (NDJSON ou CSV, gzip)
+- POST /v1/jobs/{id}/cancel: cancela o job
+
+Protegidos por autenticação via API key. O processamento acontece nos
+workers de app.services.bulk_jobs.
+"""
+
+import uuid
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from app.db.session import get_db
+from app.db.models import BULK_JOB_ACTIVE_STATUSES, BulkJob
+from app.api.deps import get_api_key_auth, ApiKeyAuth
+from app.core.config import settings
+from app.core.usage import reserve_usage
+from app.schemas.bulk_job import BulkJobListResponse, BulkJobResponse
+from app.services.bulk_jobs import (
+    BulkJobInputError,
+    discard_job_files,
+    result_path,
+    store_upload,
+)
+
+
+router = APIRouter(prefix="/v1/jobs", tags=["Jobs"])
+
+LIST_LIMIT = 50
+
+
+def job_to_response(job: BulkJob) -> BulkJobResponse:
+    return BulkJobResponse(
+        id=job.id,
+        status=job.status,
+        format=job.output_format,
+        total_gtins=job.total_gtins,
+        processed_gtins=job.processed_gtins,
+        found_gtins=job.found_gtins,
+        invalid_gtins=job.invalid_gtins,
+        progress=round(job.processed_gtins / job.total_gtins, 4) if job.total_gtins else 0.0,
+        cancel_requested=job.cancel_requested,
+        error=job.error,
+        result_url=f"/v1/jobs/{job.id}/result" if job.status == "completed" else None,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+def get_org_job(db: Session, job_id: str, organization_id: int) -> BulkJob:
+    job = (
+        db.query(BulkJob)
+        .filter(BulkJob.id == job_id, BulkJob.organization_id == organization_id)
+        .first()
+    )
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job '{job_id}' não encontrado.",
+        )
+    return job
+
+
+def check_job_limits(db: Session, org, api_key_id: int) -> None:
+    """
+    Limite de jobs simultâneos e saldo da cota mensal. A cota é verificada
+    pela mesma reserva atômica das consultas online (uma unidade, devolvida
+    em seguida); o worker reserva cada chunk no mesmo contador.
+
+    Raises:
+        HTTPException 429 se algum dos limites foi atingido.
+    """
+    job_limit = org.bulk_job_limit
+    active_jobs = (
+        db.query(BulkJob)
+        .filter(BulkJob.organization_id == org.id, BulkJob.status.in_(BULK_JOB_ACTIVE_STATUSES))
+        .count()
+    )
+    if active_jobs >= job_limit:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Limite de {job_limit} job(s) simultâneo(s) atingido. Aguarde a conclusão ou cancele um job.",
+        )
+
+    reserve_usage(db, org, api_key_id).release()
+
+
+def insert_job(
+    db: Session, job_id: str, organization_id: int, api_key_id: int, output_format: str, total: int
+) -> BulkJob:
+    """Grava o job na fila; em caso de erro, remove o arquivo já enviado."""
+    job = BulkJob(
+        id=job_id,
+        organization_id=organization_id,
+        api_key_id=api_key_id,
+        status="queued",
+        output_format=output_format,
+        total_gtins=total,
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        discard_job_files(job_id)
+        raise
+    db.refresh(job)
+    return job
+
+
+@router.post(
+    "",
+    response_model=BulkJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Criar job de consulta em lote",
+    description=(
+        "Envia um arquivo com um GTIN por linha (texto ou CSV, primeira coluna) no corpo da "
+        "requisição. Aceita `Content-Encoding: gzip`. O resultado fica disponível em "
+        "`/v1/jobs/{id}/result` como NDJSON ou CSV compactado. Apenas GTINs encontrados "
+        "consomem cota mensal. Disponível nos planos advanced e enterprise."
+    ),
+    responses={
+        202: {"description": "Job criado e na fila"},
+        400: {"description": "Arquivo inválido ou acima do limite"},
+        401: {"description": "API key inválida ou não fornecida"},
+        403: {"description": "Plano não permite jobs em lote"},
+        429: {"description": "Limite de jobs simultâneos ou mensal excedido"},
+    }
+)
+async def create_bulk_job(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Formato do resultado"),
+    auth: ApiKeyAuth = Depends(get_api_key_auth),
+    db: Session = Depends(get_db),
+):
+    """
+    Cria um job assíncrono a partir do corpo da requisição (streaming).
+    """
+    org = auth.organization
+
+    job_limit = org.bulk_job_limit
+    if job_limit <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seu plano não permite jobs de consulta em lote. Atualize seu plano para habilitar.",
+        )
+
+    # Consultas síncronas ao banco/Redis rodam no threadpool (rota async)
+    await run_in_threadpool(check_job_limits, db, org, auth.api_key.id)
+
+    job_id = uuid.uuid4().hex
+    gzip_encoded = request.headers.get("content-encoding", "").lower() == "gzip"
+    try:
+        total = await store_upload(job_id, request.stream(), gzip_encoded=gzip_encoded)
+    except BulkJobInputError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    job = await run_in_threadpool(insert_job, db, job_id, org.id, auth.api_key.id, format, total)
+    return job_to_response(job)
+
+
+@router.get(
+    "",
+    response_model=BulkJobListResponse,
+    summary="Listar jobs de consulta em lote",
+)
+def list_bulk_jobs(
+    auth: ApiKeyAuth = Depends(get_api_key_auth),
+    db: Session = Depends(get_db),
+):
+    """Retorna os jobs mais recentes da organização."""
+    jobs = (
+        db.query(BulkJob)
+        .filter(BulkJob.organization_id == auth.organization.id)
+        .order_by(BulkJob.created_at.desc())
+        .limit(LIST_LIMIT)
+        .all()
+    )
+    return BulkJobListResponse(jobs=[job_to_response(job) for job in jobs])
+
+
+@router.get(
+    "/{job_id}",
+    response_model=BulkJobResponse,
+    summary="Consultar status de um job",
+    responses={404: {"description": "Job não encontrado"}},
+)
+def get_bulk_job(
+    job_id: str,
+    auth: ApiKeyAuth = Depends(get_api_key_auth),
+    db: Session = Depends(get_db),
+):
+    """Status e progresso do job."""
+    return job_to_response(get_org_job(db, job_id, auth.organization.id))
+
+
+@router.get(
+    "/{job_id}/result",
+    summary="Baixar resultado de um job",
+    response_class=FileResponse,
+    responses={
+        200: {"description": "Arquivo gzip (NDJSON ou CSV)"},
+        404: {"description": "Job não encontrado"},
+        409: {"description": "Job ainda não concluído"},
+        410: {"description": "Resultado expirado"},
+    },
+)
+def download_bulk_job_result(
+    job_id: str,
+    auth: ApiKeyAuth = Depends(get_api_key_auth),
+    db: Session = Depends(get_db),
+):
+    """Download do resultado de um job concluído."""
+    job = get_org_job(db, job_id, auth.organization.id)
+    if job.status != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job ainda não concluído (status: {job.status}).",
+        )
+
+    path = result_path(job)
+    if not path.exists():
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail=f"Resultado expirado (mantido por {settings.BULK_JOBS_RETENTION_DAYS} dias).",
+        )
+
+    return FileResponse(
+        path,
+        media_type="application/gzip",
+        filename=f"gtins-{job.id}.{job.output_format}.gz",
+    )
+
+
+@router.post(
+    "/{job_id}/cancel",
+    response_model=BulkJobResponse,
+    summary="Cancelar um job",
+    responses={
+        404: {"description": "Job não encontrado"},
+        409: {"description": "Job já finalizado"},
+    },
+)
+def cancel_bulk_job(
+    job_id: str,
+    auth: ApiKeyAuth = Depends(get_api_key_auth),
+    db: Session = Depends(get_db),
+):
+    """
+    Cancela o job. Jobs na fila são cancelados imediatamente; jobs em
+    execução param ao fim do chunk atual (o uso já processado é mantido).
+    """
+    job = (
+        db.query(BulkJob)
+        .filter(BulkJob.id == job_id, BulkJob.organization_id == auth.organization.id)
+        .with_for_update()
+        .first()
+    )
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job '{job_id}' não encontrado.",
+        )
+    if job.status not in BULK_JOB_ACTIVE_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job já finalizado (status: {job.status}).",
+        )
+
+    job.cancel_requested = True
+    if job.status == "queued":
+        job.status = "canceled"
+        job.finished_at = datetime.utcnow()
+    db.commit()
+    db.refresh(job)
+    return job_to_response(job)
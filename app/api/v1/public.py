@@ -5,64 +5,21 @@ Permite consultas gratuitas de GTIN sem API key.
 Inclui rate limit por IP para proteção.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy import text
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 
 from app.db.session import get_db
 from app.schemas.product import ProductResponse
 from app.core.rate_limit import check_public_rate_limit
+from app.core.gtin import GTIN_ERROR_HEADER, canonicalize_gtin
+from app.core.products import fetch_product_by_gtin
+from app.core.product_json import product_response
+from app.core.http_cache import is_not_modified, not_modified_response, product_validators
 
 
 router = APIRouter(prefix="/v1/public", tags=["Public"])
 
 
-def normalize_gtin(gtin: str) -> str:
-    """Remove caracteres não numéricos do GTIN."""
-    return "".join(c for c in gtin if c.isdigit())
-
-
-def fetch_product_by_gtin(db: Session, gtin: str) -> dict | None:
-    """
-    Busca um produto pelo GTIN no banco de dados.
-    
-    Returns:
-        Dict com os dados do produto ou None se não encontrado.
-    """
-    query = text("""
-        SELECT 
-            gtin,
-            gtin_type,
-            brand,
-            product_name,
-            origin_country,
-            ncm,
-            cest,
-            gross_weight_value,
-            gross_weight_unit
-        FROM products
-        WHERE gtin = :gtin
-    """)
-    
-    result = db.execute(query, {"gtin": gtin}).fetchone()
-    
-    if result is None:
-        return None
-    
-    # Converter Row para dict
-    return {
-        "gtin": result.gtin,
-        "gtin_type": result.gtin_type,
-        "brand": result.brand,
-        "product_name": result.product_name,
-        "origin_country": result.origin_country,
-        "ncm": result.ncm,
-        "cest": result.cest,
-        "gross_weight_value": result.gross_weight_value,
-        "gross_weight_unit": result.gross_weight_unit,
-    }
-
-
 @router.get(
     "/gtins/{gtin}",
     response_model=ProductResponse,
@@ -72,7 +29,8 @@ def fetch_product_by_gtin(db: Session, gtin: str) -> dict | None:
                 "Rate limit: 20 requisições por dia por IP + cooldown entre chamadas.",
     responses={
         200: {"description": "Produto encontrado"},
-        400: {"description": "GTIN inválido"},
+        304: {"description": "Produto não modificado (If-None-Match / If-Modified-Since)"},
+        400: {"description": "GTIN inválido (motivo no header X-GTIN-Error)"},
         404: {"description": "Produto não encontrado"},
         429: {"description": "Rate limit excedido"},
     }
@@ -80,6 +38,7 @@ def fetch_product_by_gtin(db: Session, gtin: str) -> dict | None:
 def get_product_by_gtin_public(
     gtin: str,
     request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     client_ip: str = Depends(check_public_rate_limit),
 ):
@@ -95,26 +54,34 @@ def get_product_by_gtin_public(
     - 20 requisições por dia por IP (reset 00:00 America/Sao_Paulo)
     - Cooldown: 1 requisição a cada 5 segundos por IP
     - Não registra métricas de uso
+
+    Envia `ETag`/`Last-Modified`; requisições condicionais com o produto
+    inalterado recebem 304 sem corpo.
     """
-    # Normalizar GTIN (remover caracteres não numéricos)
-    normalized_gtin = normalize_gtin(gtin)
+    # Validar e canonicalizar (GTIN-14) antes de qualquer consulta
+    check = canonicalize_gtin(gtin)
     
-    if not normalized_gtin:
+    if not check.valid:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="GTIN inválido: deve conter apenas números"
+            detail=check.message,
+            headers={GTIN_ERROR_HEADER: check.reason},
         )
     
     # Buscar produto
-    product = fetch_product_by_gtin(db, normalized_gtin)
+    product = fetch_product_by_gtin(db, check.gtin14)
     
     if product is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Produto com GTIN '{normalized_gtin}' não encontrado"
+            detail=f"Produto com GTIN '{check.digits}' não encontrado"
         )
     
     # Retornar produto sem registrar uso
-    return product
+    validators = product_validators(product)
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    response.headers.update(validators)
+    return product_response(product, headers=validators)
 
 
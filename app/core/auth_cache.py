@@ -0,0 +1,216 @@
+"""
+Cache de autenticação por API key.
+==================================
+Evita as duas queries (api_keys + organizations) por requisição autenticada.
+
+- LRU por worker com TTL curto e limite de entradas, chaveado pelo SHA-256
+  da API key (api_keys.key_hash; a key em texto simples não fica em
+  memória como chave).
+- No miss, uma única query indexada (api_keys JOIN organizations por
+  key_hash), lendo só as colunas do snapshot.
+- Guarda snapshots imutáveis da key e da organização (plano, overrides,
+  flag de ativa); limites derivados usam as mesmas regras do modelo.
+- Só keys válidas e ativas são cacheadas: key inexistente ou revogada
+  sempre vai ao banco.
+- Invalidação imediata entre workers via Redis pub/sub
+  (`auth:invalidate`): revogação de key, mudança de plano/overrides por
+  admin ou billing. Sem Redis, os outros workers dependem do TTL.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import redis
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.product_cache import ProductCache
+from app.db.models import ApiKey, Organization
+
+logger = logging.getLogger(__name__)
+
+AUTH_INVALIDATION_CHANNEL = "auth:invalidate"
+
+
+@dataclass(frozen=True)
+class OrganizationSnapshot:
+    """Campos de Organization usados na autenticação, limites e rate limit."""
+
+    id: int
+    name: str
+    plan: str
+    batch_limit_override: Optional[int]
+    monthly_limit_override: Optional[int]
+
+    # Mesmas regras de limite do modelo
+    get_batch_limit_by_plan = Organization.get_batch_limit_by_plan
+    batch_limit = Organization.batch_limit
+    get_monthly_limit_by_plan = Organization.get_monthly_limit_by_plan
+    monthly_limit = Organization.monthly_limit
+    get_api_key_active_limit_by_plan = Organization.get_api_key_active_limit_by_plan
+    api_key_active_limit = Organization.api_key_active_limit
+    get_bulk_job_limit_by_plan = Organization.get_bulk_job_limit_by_plan
+    bulk_job_limit = Organization.bulk_job_limit
+
+
+
+@dataclass(frozen=True)
+class ApiKeySnapshot:
+    """Campos de ApiKey usados após a autenticação."""
+
+    id: int
+    organization_id: int
+    name: Optional[str]
+    is_active: bool
+
+
+# Singleton por worker
+auth_cache = ProductCache(
+    max_entries=settings.AUTH_CACHE_MAX_ENTRIES,
+    max_bytes=settings.AUTH_CACHE_MAX_ENTRIES * 1024,
+    ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS,
+)
+
+# Incrementada a cada invalidação: um snapshot lido do banco antes de uma
+# invalidação não é gravado depois dela
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def current_generation() -> int:
+    return _generation
+
+
+def load_auth(db: Session, key_hash: str) -> Optional[tuple[ApiKeySnapshot, OrganizationSnapshot]]:
+    """
+    Carrega key + organização pelo digest da key (ApiKey.hash_key) em uma
+    única query. Retorna None se a key não existir, estiver inativa ou sem
+    organização.
+    """
+    row = (
+        db.query(
+            ApiKey.id,
+            ApiKey.organization_id,
+            ApiKey.name,
+            ApiKey.is_active,
+            Organization.name.label("organization_name"),
+            Organization.plan,
+            Organization.batch_limit_override,
+            Organization.monthly_limit_override,
+        )
+        .join(Organization, Organization.id == ApiKey.organization_id)
+        .filter(ApiKey.key_hash == key_hash)
+        .first()
+    )
+    if row is None or not row.is_active:
+        return None
+    api_key = ApiKeySnapshot(
+        id=row.id,
+        organization_id=row.organization_id,
+        name=row.name,
+        is_active=row.is_active,
+    )
+    organization = OrganizationSnapshot(
+        id=row.organization_id,
+        name=row.organization_name,
+        plan=row.plan,
+        batch_limit_override=row.batch_limit_override,
+        monthly_limit_override=row.monthly_limit_override,
+    )
+    return api_key, organization
+
+
+def store_auth(key_hash: str, auth: Any, generation: int) -> None:
+    """Grava o snapshot se nenhuma invalidação ocorreu desde `generation`."""
+    with _generation_lock:
+        if generation == _generation:
+            auth_cache.set(key_hash, auth)
+
+
+def _invalidate_local(message: str) -> None:
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        if message.startswith("key:"):
+            auth_cache.invalidate(message[4:])
+        else:
+            # Mudança de organização: as keys dela não são indexadas, então
+            # descarta tudo (evento raro; cada key volta ao banco uma vez)
+            auth_cache.clear()
+
+
+def _publish(message: str) -> None:
+    _invalidate_local(message)
+
+    from app.core.rate_limit import get_redis_client
+
+    client = get_redis_client()
+    if client is None:
+        logger.warning("Redis indisponível: invalidação do cache de autenticação apenas local")
+        return
+    try:
+        client.publish(AUTH_INVALIDATION_CHANNEL, message)
+    except redis.RedisError as e:
+        logger.warning("Redis error ao publicar invalidação de autenticação: %s", e)
+
+
+def invalidate_api_key_auth(api_key: str) -> None:
+    """Remove uma key do cache de todos os workers (ex.: revogação)."""
+    _publish(f"key:{ApiKey.hash_key(api_key)}")
+
+
+def invalidate_organization_auth(organization_id: int) -> None:
+    """Descarta snapshots após mudança de plano/overrides de uma organização."""
+    _publish(f"org:{organization_id}")
+
+
+# =============================================================================
+# Listener de invalidações (uma thread por processo)
+# =============================================================================
+
+_stop_event = threading.Event()
+_listener: Optional[threading.Thread] = None
+
+
+def _listen() -> None:
+    from app.core.rate_limit import get_redis_client
+
+    while not _stop_event.is_set():
+        client = get_redis_client()
+        if client is None:
+            _stop_event.wait(5)
+            continue
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(AUTH_INVALIDATION_CHANNEL)
+            # Mensagens publicadas enquanto desconectado se perderam
+            _invalidate_local("org:*")
+            while not _stop_event.is_set():
+                message = pubsub.get_message(timeout=1.0)
+                if message and message.get("type") == "message":
+                    _invalidate_local(message["data"])
+        except redis.RedisError as e:
+            logger.warning("Redis error no listener de invalidação de autenticação: %s", e)
+            _stop_event.wait(5)
+        finally:
+            pubsub.close()
+
+
+def start_auth_invalidation_listener() -> None:
+    """Inicia a thread que aplica invalidações publicadas por outros workers."""
+    global _listener
+    if not settings.AUTH_CACHE_ENABLED or not settings.REDIS_ENABLED or _listener is not None:
+        return
+    _stop_event.clear()
+    _listener = threading.Thread(target=_listen, name="auth-cache-invalidation", daemon=True)
+    _listener.start()
+
+
+def stop_auth_invalidation_listener(timeout: float = 5.0) -> None:
+    global _listener
+    _stop_event.set()
+    if _listener is not None:
+        _listener.join(timeout=timeout)
+        _listener = None
@@ -24,6 +24,19 @@ class Settings:
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+    # Pools por papel (por processo; os engines asyncio usam os mesmos tamanhos).
+    # Máximo de conexões por processo = 2 * (write + read) + admin, cada papel
+    # contando POOL_SIZE + MAX_OVERFLOW: 2 * (3 + 3) + 1 = 13 com os padrões
+    # (antes da separação: um pool de 5 + 5). Multiplique pelos workers de
+    # todos os containers para dimensionar max_connections do Postgres.
+    DB_WRITE_POOL_SIZE: int = int(os.getenv("DB_WRITE_POOL_SIZE", "2"))
+    DB_WRITE_MAX_OVERFLOW: int = int(os.getenv("DB_WRITE_MAX_OVERFLOW", "1"))
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", "2"))
+    DB_READ_MAX_OVERFLOW: int = int(os.getenv("DB_READ_MAX_OVERFLOW", "1"))
+    DB_ADMIN_POOL_SIZE: int = int(os.getenv("DB_ADMIN_POOL_SIZE", "1"))
+    DB_ADMIN_MAX_OVERFLOW: int = int(os.getenv("DB_ADMIN_MAX_OVERFLOW", "0"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
     
     # Stripe Settings
     STRIPE_SECRET_KEY: str = os.getenv("STRIPE_SECRET_KEY", "")
@@ -43,6 +56,82 @@ class Settings:
     # Redis Settings (para rate limiting)
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     REDIS_ENABLED: bool = os.getenv("REDIS_ENABLED", "true").lower() in ("true", "1", "yes")
+    # Pool de conexões por processo (um para o cliente sync, um para o asyncio)
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+    REDIS_SOCKET_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+    REDIS_HEALTH_CHECK_SECONDS: int = int(os.getenv("REDIS_HEALTH_CHECK_SECONDS", "15"))
+    # Circuit breaker: falhas seguidas até abrir e tempo aberto (fail-open) antes de testar de novo
+    REDIS_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("REDIS_BREAKER_FAILURE_THRESHOLD", "3"))
+    REDIS_BREAKER_RESET_SECONDS: float = float(os.getenv("REDIS_BREAKER_RESET_SECONDS", "10"))
+    # Planos com rate limit de lookup via GCRA (lista separada por vírgula; "*" = todos).
+    # Padrão vazio: todos seguem na janela deslizante até cada plano ser habilitado
+    RATE_LIMIT_GCRA_PLANS: str = os.getenv("RATE_LIMIT_GCRA_PLANS", "")
+    # Leases locais de tokens do GCRA (só planos também em RATE_LIMIT_GCRA_PLANS)
+    RATE_LIMIT_LEASE_PLANS: str = os.getenv("RATE_LIMIT_LEASE_PLANS", "enterprise")
+    RATE_LIMIT_LEASE_FRACTION: float = float(os.getenv("RATE_LIMIT_LEASE_FRACTION", "0.1"))  # fração do limite/min por lease
+    RATE_LIMIT_LEASE_SECONDS: float = float(os.getenv("RATE_LIMIT_LEASE_SECONDS", "2"))
+
+    # Cache de produtos em memória (LRU + TTL, por worker)
+    PRODUCT_CACHE_ENABLED: bool = os.getenv("PRODUCT_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+    PRODUCT_CACHE_MAX_ENTRIES: int = int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", "50000"))
+    PRODUCT_CACHE_MAX_BYTES: int = int(os.getenv("PRODUCT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    PRODUCT_CACHE_TTL_SECONDS: int = int(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "3600"))
+    PRODUCT_CACHE_GENERATION_CHECK_SECONDS: float = float(os.getenv("PRODUCT_CACHE_GENERATION_CHECK_SECONDS", "5"))
+
+    # Cache de produtos compartilhado no Redis (segundo nível, opcional)
+    PRODUCT_REDIS_CACHE_ENABLED: bool = os.getenv("PRODUCT_REDIS_CACHE_ENABLED", "false").lower() in ("true", "1", "yes")
+    PRODUCT_REDIS_CACHE_TTL_SECONDS: int = int(os.getenv("PRODUCT_REDIS_CACHE_TTL_SECONDS", "86400"))
+    PRODUCT_REDIS_CACHE_TTL_JITTER: float = float(os.getenv("PRODUCT_REDIS_CACHE_TTL_JITTER", "0.1"))
+
+    # Coalescência de misses simultâneos do mesmo GTIN (single-flight por worker)
+    PRODUCT_SINGLE_FLIGHT_ENABLED: bool = os.getenv("PRODUCT_SINGLE_FLIGHT_ENABLED", "true").lower() in ("true", "1", "yes")
+    PRODUCT_SINGLE_FLIGHT_WAIT_SECONDS: float = float(os.getenv("PRODUCT_SINGLE_FLIGHT_WAIT_SECONDS", "5"))
+    # Lock de preenchimento entre workers (ms; 0 = desligado; requer PRODUCT_REDIS_CACHE_ENABLED)
+    PRODUCT_FILL_LOCK_MS: int = int(os.getenv("PRODUCT_FILL_LOCK_MS", "0"))
+
+    # Filtro de Bloom de GTINs existentes + cache negativo para falsos positivos
+    GTIN_FILTER_ENABLED: bool = os.getenv("GTIN_FILTER_ENABLED", "true").lower() in ("true", "1", "yes")
+    GTIN_FILTER_FP_RATE: float = float(os.getenv("GTIN_FILTER_FP_RATE", "0.01"))
+    # Idade máxima do filtro (s; 0 = sem limite): reconstrói mesmo sem nova
+    # geração no Redis (ETL com Redis indisponível). Padrão = TTL do cache local.
+    GTIN_FILTER_MAX_AGE_SECONDS: int = int(
+        os.getenv("GTIN_FILTER_MAX_AGE_SECONDS", os.getenv("PRODUCT_CACHE_TTL_SECONDS", "3600"))
+    )
+    NEGATIVE_CACHE_MAX_ENTRIES: int = int(os.getenv("NEGATIVE_CACHE_MAX_ENTRIES", "100000"))
+    NEGATIVE_CACHE_TTL_SECONDS: int = int(os.getenv("NEGATIVE_CACHE_TTL_SECONDS", "60"))
+
+    # Cache de autenticação por API key (snapshot de key + organização, por worker)
+    AUTH_CACHE_ENABLED: bool = os.getenv("AUTH_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+    AUTH_CACHE_MAX_ENTRIES: int = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+    AUTH_CACHE_TTL_SECONDS: int = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+
+    # Intervalo de gravação em lote do last_used_at das API keys
+    API_KEY_LAST_USED_FLUSH_SECONDS: float = float(os.getenv("API_KEY_LAST_USED_FLUSH_SECONDS", "30"))
+
+    # Contadores de uso write-behind (buffer + upsert em lote periódico)
+    USAGE_WRITE_BEHIND_ENABLED: bool = os.getenv("USAGE_WRITE_BEHIND_ENABLED", "true").lower() in ("true", "1", "yes")
+    USAGE_BUFFER_BACKEND: str = os.getenv("USAGE_BUFFER_BACKEND", "redis").lower()  # redis (journal) ou memory
+    USAGE_FLUSH_SECONDS: float = float(os.getenv("USAGE_FLUSH_SECONDS", "5"))  # janela máxima de perda no backend memory
+    USAGE_FLUSH_MAX_PENDING: int = int(os.getenv("USAGE_FLUSH_MAX_PENDING", "5000"))
+
+    # Cota mensal no Redis (script Lua verifica e incrementa; Postgres é a fonte da verdade)
+    QUOTA_REDIS_ENABLED: bool = os.getenv("QUOTA_REDIS_ENABLED", "true").lower() in ("true", "1", "yes")
+    QUOTA_RECONCILE_SECONDS: int = int(os.getenv("QUOTA_RECONCILE_SECONDS", "300"))  # TTL do contador; expira e é semeado do banco
+
+    # Serialização direta dict -> JSON nos endpoints de consulta (sem Pydantic por produto)
+    FAST_JSON_RESPONSES: bool = os.getenv("FAST_JSON_RESPONSES", "true").lower() in ("true", "1", "yes")
+    # Lê products.payload_json (JSON pré-computado pelo ETL) nos lookups
+    PRODUCT_PAYLOAD_JSON_ENABLED: bool = os.getenv("PRODUCT_PAYLOAD_JSON_ENABLED", "false").lower() in ("true", "1", "yes")
+
+    # Jobs de consulta em lote assíncronos. BULK_JOBS_DIR deve ser um volume
+    # compartilhado por todos os containers da API/workers (a fila é global)
+    BULK_JOBS_DIR: str = os.getenv("BULK_JOBS_DIR", "./data/bulk_jobs")
+    BULK_JOBS_WORKERS: int = int(os.getenv("BULK_JOBS_WORKERS", "2"))  # threads por processo (0 = não processa)
+    BULK_JOBS_CHUNK_SIZE: int = int(os.getenv("BULK_JOBS_CHUNK_SIZE", "1000"))
+    BULK_JOBS_MAX_GTINS: int = int(os.getenv("BULK_JOBS_MAX_GTINS", "5000000"))
+    BULK_JOBS_POLL_SECONDS: float = float(os.getenv("BULK_JOBS_POLL_SECONDS", "2"))
+    BULK_JOBS_STALE_SECONDS: int = int(os.getenv("BULK_JOBS_STALE_SECONDS", "120"))
+    BULK_JOBS_RETENTION_DAYS: int = int(os.getenv("BULK_JOBS_RETENTION_DAYS", "7"))
 
     # Password Reset
     FRONTEND_BASE_URL: str = os.getenv("FRONTEND_BASE_URL", "http://localhost:3000")
@@ -57,8 +146,12 @@ class Settings:
     SMTP_USE_TLS: bool = os.getenv("SMTP_USE_TLS", "true").lower() in ("true", "1", "yes")
     SMTP_USE_SSL: bool = os.getenv("SMTP_USE_SSL", "false").lower() in ("true", "1", "yes")
 
-    # Search backend
+    # Search backend: postgres (ILIKE), trgm (ILIKE + índices pg_trgm), pgfts, meili
     SEARCH_BACKEND: str = os.getenv("SEARCH_BACKEND", "postgres").lower()
+    # Paginação: offset só para páginas rasas; além disso, next_cursor (keyset)
+    SEARCH_MAX_OFFSET: int = int(os.getenv("SEARCH_MAX_OFFSET", "500"))
+    # Chave HMAC dos cursores (vazio = JWT_SECRET_KEY)
+    SEARCH_CURSOR_SECRET: str = os.getenv("SEARCH_CURSOR_SECRET", "")
 
     # Meilisearch Settings
     MEILI_URL: str = os.getenv("MEILI_URL", "").rstrip("/")
@@ -0,0 +1,100 @@
+"""
+Validação e canonicalização de GTIN (GS1).
+==========================================
+Todo GTIN recebido pela API, ETL e busca passa por aqui antes de qualquer I/O.
+
+- Aceita apenas 8, 12, 13 ou 14 dígitos (GTIN-8, UPC-A, EAN-13, GTIN-14).
+- Confere o dígito verificador (módulo 10, pesos 3/1 da direita para a esquerda).
+- Chave canônica: GTIN-14 (zero à esquerda), então UPC-A `789...` e o
+  EAN-13 `0789...` do mesmo item resolvem na mesma chave (coluna gtin14).
+
+Com o zero-padding para 14 posições, o cálculo do dígito verificador usa
+os mesmos pesos para todos os tamanhos.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+
+VALID_LENGTHS = (8, 12, 13, 14)
+CANONICAL_LENGTH = 14
+
+# Apenas dígitos ASCII: str.isdigit() aceita '²', '٠', '５' etc.
+_NON_DIGITS = re.compile(r"[^0-9]")
+
+# Pesos GS1 para as 13 primeiras posições de um GTIN-14 (o último é o verificador)
+_WEIGHTS = (3, 1) * 6 + (3,)
+
+# Motivos estruturados de rejeição
+REASON_EMPTY = "empty"
+REASON_INVALID_LENGTH = "invalid_length"
+REASON_INVALID_CHECK_DIGIT = "invalid_check_digit"
+
+# Header HTTP com o motivo da rejeição (o `detail` continua sendo texto)
+GTIN_ERROR_HEADER = "X-GTIN-Error"
+
+REASON_MESSAGES = {
+    REASON_EMPTY: "GTIN inválido: deve conter apenas números",
+    REASON_INVALID_LENGTH: "GTIN inválido: deve ter 8, 12, 13 ou 14 dígitos",
+    REASON_INVALID_CHECK_DIGIT: "GTIN inválido: dígito verificador incorreto",
+}
+
+
+@dataclass(frozen=True)
+class GtinCheck:
+    """Resultado da validação de um GTIN."""
+
+    raw: str
+    digits: str
+    gtin14: Optional[str]
+    reason: Optional[str] = None
+
+    @property
+    def valid(self) -> bool:
+        return self.gtin14 is not None
+
+    @property
+    def message(self) -> Optional[str]:
+        return REASON_MESSAGES.get(self.reason) if self.reason else None
+
+
+def normalize_gtin(gtin: str) -> str:
+    """Remove caracteres que não são dígitos ASCII (0-9) do GTIN."""
+    return _NON_DIGITS.sub("", gtin)
+
+
+def compute_check_digit(body: str) -> int:
+    """
+    Calcula o dígito verificador GS1 para o corpo do GTIN (sem o verificador).
+    Aceita corpos de 7, 11, 12 ou 13 dígitos.
+    """
+    padded = body.rjust(CANONICAL_LENGTH - 1, "0")
+    total = sum((ord(c) - 48) * w for c, w in zip(padded, _WEIGHTS))
+    return (10 - total % 10) % 10
+
+
+def canonicalize_gtin(raw: str) -> GtinCheck:
+    """Valida um GTIN e retorna sua chave canônica GTIN-14 (ou o motivo da rejeição)."""
+    digits = normalize_gtin(raw or "")
+    if not digits:
+        return GtinCheck(raw=raw, digits=digits, gtin14=None, reason=REASON_EMPTY)
+    if len(digits) not in VALID_LENGTHS:
+        return GtinCheck(raw=raw, digits=digits, gtin14=None, reason=REASON_INVALID_LENGTH)
+
+    gtin14 = digits.rjust(CANONICAL_LENGTH, "0")
+    total = sum((ord(c) - 48) * w for c, w in zip(gtin14, _WEIGHTS))
+    if (10 - total % 10) % 10 != ord(gtin14[-1]) - 48:
+        return GtinCheck(raw=raw, digits=digits, gtin14=None, reason=REASON_INVALID_CHECK_DIGIT)
+
+    return GtinCheck(raw=raw, digits=digits, gtin14=gtin14)
+
+
+def canonicalize_gtins(raws: Iterable[str]) -> list[GtinCheck]:
+    """Valida uma lista de GTINs (um a um), preservando a ordem de entrada."""
+    return [canonicalize_gtin(raw) for raw in raws]
+
+
+def to_gtin14(raw: str) -> Optional[str]:
+    """Atalho: chave GTIN-14 canônica ou None se inválido."""
+    return canonicalize_gtin(raw).gtin14
@@ -0,0 +1,226 @@
+"""
+Filtro de Bloom de GTINs existentes.
+====================================
+Indexado pela chave canônica GTIN-14 (coluna products.gtin14).
+Responde "definitivamente não existe" sem tocar no banco para GTINs que não
+estão em `products` (códigos internos de varejistas, erros de digitação).
+
+- Construído a partir da tabela products no startup e após cada recarga do
+  ETL (nova geração do cache), em thread de background.
+- Reconstruído também quando passa de GTIN_FILTER_MAX_AGE_SECONDS: sem
+  Redis, a nova geração não chega aos workers, e um filtro antigo responderia
+  404 para GTINs carregados depois dele.
+- Enquanto não estiver pronto, o filtro responde "talvez" (fail-open).
+- Falsos positivos (filtro diz "talvez", banco não encontra) alimentam o
+  cache negativo de TTL curto em app.core.products.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Filtro de Bloom simples sobre bytearray com double hashing (blake2b)."""
+
+    def __init__(self, capacity: int, fp_rate: float):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        # m = -n·ln(p) / (ln 2)²  e  k = (m/n)·ln 2
+        self.num_bits = max(int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))), 8)
+        self.num_hashes = max(int(round(self.num_bits / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("ascii", "ignore"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.num_bits
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % m
+
+    def add(self, key: str) -> None:
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def estimated_fp_rate(self) -> float:
+        """Taxa teórica de falso positivo para a quantidade atual de itens."""
+        if self.count == 0:
+            return 0.0
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class GtinFilter:
+    """
+    Gerencia o filtro de Bloom do worker: construção, troca atômica e métricas.
+    """
+
+    def __init__(self, fp_rate: float, max_age_seconds: float = 0):
+        self.fp_rate = fp_rate
+        self.max_age_seconds = max_age_seconds
+        self._expires_at: Optional[float] = None
+        self._filter: Optional[BloomFilter] = None
+        self._lock = threading.Lock()
+        self._building = False
+        self._build_requested = False
+
+        self.built_at: Optional[float] = None
+        self.build_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+        self.checks = 0
+        self.definitely_absent = 0
+        self.false_positives = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def might_contain(self, gtin: str) -> bool:
+        """
+        False apenas quando o GTIN certamente não existe em products.
+        Sem filtro pronto, sempre True.
+        """
+        bloom = self._filter
+        if bloom is None:
+            return True
+        if self._expires_at is not None and time.monotonic() >= self._expires_at:
+            logger.info("Filtro de GTINs com mais de %ss: reconstruindo", self.max_age_seconds)
+            self.rebuild_in_background(expired=bloom)
+            return True
+        self.checks += 1
+        if gtin in bloom:
+            return True
+        self.definitely_absent += 1
+        return False
+
+    def record_false_positive(self) -> None:
+        """O filtro disse "talvez", mas o banco não encontrou o GTIN."""
+        if self._filter is not None:
+            self.false_positives += 1
+
+    def _build(self) -> None:
+        # Varredura completa de products: pool de leitura, não o primário
+        from app.db.session import ReadSessionLocal
+
+        t0 = time.monotonic()
+        db = ReadSessionLocal()
+        try:
+            # Estimativa barata do tamanho da tabela (evita COUNT(*) em milhões de linhas)
+            estimate = db.execute(text(
+                "SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE relname = 'products'"
+            )).scalar() or 0
+            bloom = BloomFilter(capacity=int(estimate * 1.1) + 1000, fp_rate=self.fp_rate)
+
+            result = db.execute(
+                text("SELECT gtin14 FROM products WHERE gtin14 IS NOT NULL"),
+                execution_options={"stream_results": True, "yield_per": 50000},
+            )
+            for (gtin14,) in result:
+                bloom.add(gtin14)
+        finally:
+            db.close()
+
+        with self._lock:
+            self._filter = bloom
+            # Idade contada do início da leitura (linhas carregadas depois podem faltar)
+            self._expires_at = t0 + self.max_age_seconds if self.max_age_seconds > 0 else None
+            self.built_at = time.time()
+            self.build_seconds = round(time.monotonic() - t0, 2)
+            self.last_error = None
+            self.checks = 0
+            self.definitely_absent = 0
+            self.false_positives = 0
+        logger.info(
+            "Filtro de GTINs construído: %s itens, %s bytes, %.1fs",
+            bloom.count, len(bloom.bits), self.build_seconds,
+        )
+
+    def _build_loop(self) -> None:
+        while True:
+            try:
+                self._build()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("Falha ao construir filtro de GTINs: %s", e)
+            with self._lock:
+                if not self._build_requested:
+                    self._building = False
+                    return
+                self._build_requested = False
+
+    def rebuild_in_background(self, expired: Optional[BloomFilter] = None) -> None:
+        """
+        Descarta o filtro atual (evita falsos negativos para GTINs recém
+        carregados) e agenda uma nova construção em background.
+
+        Com `expired`, só age se esse ainda for o filtro atual (várias
+        requisições notam a expiração ao mesmo tempo).
+        """
+        if not settings.GTIN_FILTER_ENABLED:
+            return
+        with self._lock:
+            if expired is not None and self._filter is not expired:
+                return
+            self._filter = None
+            self._expires_at = None
+            if self._building:
+                self._build_requested = True
+                return
+            self._building = True
+        threading.Thread(target=self._build_loop, name="gtin-filter-build", daemon=True).start()
+
+    def stats(self) -> dict:
+        bloom = self._filter
+        info: dict = {
+            "enabled": settings.GTIN_FILTER_ENABLED,
+            "ready": bloom is not None,
+            "max_age_seconds": self.max_age_seconds,
+            "building": self._building,
+            "built_at": self.built_at,
+            "build_seconds": self.build_seconds,
+            "last_error": self.last_error,
+            "checks": self.checks,
+            "definitely_absent": self.definitely_absent,
+            "false_positives": self.false_positives,
+        }
+        if bloom is not None:
+            maybe = self.checks - self.definitely_absent
+            info.update({
+                "items": bloom.count,
+                "bits": bloom.num_bits,
+                "bytes": len(bloom.bits),
+                "hashes": bloom.num_hashes,
+                "target_fp_rate": bloom.fp_rate,
+                "estimated_fp_rate": round(bloom.estimated_fp_rate(), 6),
+                # Fração dos "talvez" que não existiam no banco
+                "observed_fp_ratio": round(self.false_positives / maybe, 6) if maybe else None,
+            })
+        return info
+
+
+# Singleton por worker
+gtin_filter = GtinFilter(
+    fp_rate=settings.GTIN_FILTER_FP_RATE,
+    max_age_seconds=settings.GTIN_FILTER_MAX_AGE_SECONDS,
+)
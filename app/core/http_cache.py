@@ -0,0 +1,106 @@
+"""
+Validadores HTTP (ETag / Last-Modified) das consultas de produto.
+=================================================================
+- ETag forte a partir de products.content_hash (md5 do conteúdo da
+  resposta, gravado pelo ETL): nada é hasheado ou serializado por requisição.
+- Last-Modified a partir de products.content_updated_at.
+- Lotes: ETag derivado dos GTINs consultados, motivos de rejeição e hashes
+  dos produtos, na ordem da resposta; Last-Modified é o mais recente.
+
+Requisições condicionais seguem a RFC 9110: If-None-Match (comparação
+fraca) tem precedência e, na ausência dele, vale If-Modified-Since. Um 304
+não serializa o corpo.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+def product_validators(product: dict) -> dict[str, str]:
+    """Headers ETag/Last-Modified de um produto (vazio se a linha não tiver hash)."""
+    content_hash = getattr(product, "content_hash", None)
+    if not content_hash:
+        return {}
+    headers = {"ETag": f'"{content_hash}"'}
+    updated_at = getattr(product, "content_updated_at", None)
+    if updated_at is not None:
+        headers["Last-Modified"] = _http_date(updated_at)
+    return headers
+
+
+def batch_validators(items: Iterable[tuple[str, Optional[dict], Optional[str]]]) -> dict[str, str]:
+    """
+    Headers ETag/Last-Modified de uma resposta de lote a partir das tuplas
+    (gtin consultado, produto ou None, motivo de erro). Vazio se algum
+    produto encontrado não tiver hash.
+    """
+    digest = hashlib.md5(usedforsecurity=False)
+    latest: Optional[datetime] = None
+    for gtin, product, error in items:
+        if product is None:
+            content_hash = "-"
+        else:
+            content_hash = getattr(product, "content_hash", None)
+            if not content_hash:
+                return {}
+            updated_at = getattr(product, "content_updated_at", None)
+            if updated_at is not None and (latest is None or updated_at > latest):
+                latest = updated_at
+        digest.update(f"{gtin}\t{error or ''}\t{content_hash}\n".encode("utf-8"))
+
+    headers = {"ETag": f'"{digest.hexdigest()}"'}
+    if latest is not None:
+        headers["Last-Modified"] = _http_date(latest)
+    return headers
+
+
+def is_not_modified(request: Request, validators: dict[str, str]) -> bool:
+    """True se a requisição condicional casa com os validadores atuais."""
+    if not validators:
+        return False
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = validators.get("ETag")
+        if etag is None:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        return any(
+            _opaque_tag(candidate) == etag
+            for candidate in if_none_match.split(",")
+        )
+
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = validators.get("Last-Modified")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return parsedate_to_datetime(last_modified) <= since
+    return False
+
+
+def not_modified_response(validators: dict[str, str], headers: Optional[dict] = None) -> Response:
+    """304 sem corpo, repetindo validadores e headers de cache."""
+    return Response(status_code=304, headers={**(headers or {}), **validators})
+
+
+def _opaque_tag(candidate: str) -> str:
+    """Remove o prefixo de ETag fraco (W/) para a comparação fraca."""
+    candidate = candidate.strip()
+    return candidate[2:] if candidate.startswith("W/") else candidate
+
+
+def _http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
@@ -0,0 +1,141 @@
+"""
+Registro de último uso das API keys (write-behind).
+===================================================
+A autenticação não escreve em api_keys: o horário de uso fica em um
+buffer em memória (por worker, último valor por key) e uma thread grava
+tudo a cada API_KEY_LAST_USED_FLUSH_SECONDS com um único
+`UPDATE ... FROM (VALUES ...)`.
+
+- Sem UPDATE por requisição: nada de lock de linha em keys muito usadas
+  nem WAL extra no caminho da consulta.
+- O UPDATE só avança o valor (nunca volta no tempo), então workers e
+  processos diferentes podem gravar a mesma key em qualquer ordem.
+- Leituras (listagem de keys) passam por `pending_last_used`; valores
+  pendentes em outros workers aparecem em até um intervalo de flush.
+- Em caso de erro no banco, os valores voltam para o buffer e são
+  regravados no próximo ciclo; no shutdown há um flush final.
+"""
+
+import logging
+import threading
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending: dict[int, datetime] = {}
+
+
+def record_last_used(api_key_id: int, when: Optional[datetime] = None) -> None:
+    """Registra o uso de uma key no buffer (sem I/O)."""
+    when = when or datetime.utcnow()
+    with _lock:
+        current = _pending.get(api_key_id)
+        if current is None or when > current:
+            _pending[api_key_id] = when
+
+
+def pending_last_used(api_key_ids: Iterable[int]) -> dict[int, datetime]:
+    """Valores ainda não gravados deste worker para as keys informadas."""
+    with _lock:
+        return {key_id: _pending[key_id] for key_id in api_key_ids if key_id in _pending}
+
+
+def merge_last_used(api_key_id: int, stored: Optional[datetime], pending: dict[int, datetime]) -> Optional[datetime]:
+    """Mais recente entre o valor do banco e o pendente no buffer."""
+    buffered = pending.get(api_key_id)
+    if buffered is None:
+        return stored
+    if stored is None or buffered > stored:
+        return buffered
+    return stored
+
+
+def flush_last_used() -> int:
+    """
+    Grava o buffer no banco com um único UPDATE.
+
+    Returns:
+        Quantidade de keys enviadas.
+    """
+    global _pending
+    with _lock:
+        if not _pending:
+            return 0
+        batch, _pending = _pending, {}
+
+    values = ", ".join(
+        f"(CAST(:id_{i} AS INTEGER), CAST(:ts_{i} AS TIMESTAMP))" for i in range(len(batch))
+    )
+    params: dict = {}
+    for i, (key_id, when) in enumerate(batch.items()):
+        params[f"id_{i}"] = key_id
+        params[f"ts_{i}"] = when
+
+    db = SessionLocal()
+    try:
+        db.execute(
+            text(f"""
+                UPDATE api_keys AS k
+                SET last_used_at = v.last_used_at
+                FROM (VALUES {values}) AS v(id, last_used_at)
+                WHERE k.id = v.id
+                  AND (k.last_used_at IS NULL OR k.last_used_at < v.last_used_at)
+            """),
+            params,
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        # Devolver ao buffer sem sobrescrever usos mais recentes
+        for key_id, when in batch.items():
+            record_last_used(key_id, when)
+        raise
+    finally:
+        db.close()
+    return len(batch)
+
+
+# =============================================================================
+# Thread de flush (uma por processo)
+# =============================================================================
+
+_stop_event = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+def _flush_loop() -> None:
+    while not _stop_event.wait(settings.API_KEY_LAST_USED_FLUSH_SECONDS):
+        try:
+            flush_last_used()
+        except Exception as e:
+            logger.warning("Erro ao gravar last_used_at das API keys: %s", e)
+
+
+def start_last_used_flusher() -> None:
+    """Inicia a thread que grava o buffer periodicamente."""
+    global _thread
+    if _thread is not None:
+        return
+    _stop_event.clear()
+    _thread = threading.Thread(target=_flush_loop, name="api-key-last-used", daemon=True)
+    _thread.start()
+
+
+def stop_last_used_flusher(timeout: float = 5.0) -> None:
+    """Para a thread e faz o flush final do buffer."""
+    global _thread
+    _stop_event.set()
+    if _thread is not None:
+        _thread.join(timeout=timeout)
+        _thread = None
+    try:
+        flush_last_used()
+    except Exception as e:
+        logger.warning("Erro no flush final de last_used_at das API keys: %s", e)
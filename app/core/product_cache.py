@@ -0,0 +1,616 @@
+"""
+Cache de produtos em dois níveis.
+=================================
+1) LRU em memória (por worker) com TTL e limite de bytes.
+2) Opcional: cache compartilhado no Redis (entre workers e containers),
+   com payloads pré-serializados por GTIN-14 canônico.
+
+- Contadores de hit/miss/eviction expostos em /health/cache.
+- Invalidação explícita após recarga do ETL via contador de geração
+  no Redis (`products:cache_generation`), verificado periodicamente.
+  A geração também compõe as chaves do nível Redis, então entradas
+  antigas simplesmente deixam de ser lidas e expiram pelo TTL.
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+import redis
+
+from app.core.config import settings
+from app.core.product_json import ProductRecord
+
+logger = logging.getLogger(__name__)
+
+# Chave Redis incrementada pelo ETL a cada recarga da tabela products
+PRODUCT_CACHE_GENERATION_KEY = "products:cache_generation"
+
+
+def _estimate_size(value: Any) -> int:
+    """
+    Estima o tamanho em bytes de um produto (dict) para contabilidade do cache.
+    Não é exato, mas é estável e barato.
+    """
+    size = sys.getsizeof(value)
+    payload = getattr(value, "payload", None)
+    if payload:
+        size += sys.getsizeof(payload)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += sys.getsizeof(k) + _estimate_size(v)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += _estimate_size(item)
+    return size
+
+
+@dataclass
+class _CacheEntry:
+    value: Any
+    size: int
+    expires_at: float
+
+
+class ProductCache:
+    """
+    Cache LRU thread-safe com TTL e limite de bytes.
+
+    Endpoints síncronos rodam no threadpool do Starlette, então todas as
+    operações são protegidas por lock.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _get_locked(self, key: str, now: float) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= now:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def _set_locked(self, key: str, value: Any, now: float) -> None:
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = _CacheEntry(value=value, size=size, expires_at=now + self.ttl_seconds)
+        self._bytes += size
+
+        # Evict LRU até respeitar os limites de entradas e bytes
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        """Retorna o valor cacheado ou None (ausente/expirado)."""
+        with self._lock:
+            return self._get_locked(key, time.monotonic())
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """Retorna apenas as chaves presentes e válidas no cache."""
+        found: dict[str, Any] = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                value = self._get_locked(key, now)
+                if value is not None:
+                    found[key] = value
+        return found
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._set_locked(key, value, time.monotonic())
+
+    def set_many(self, items: dict[str, Any]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key, value in items.items():
+                self._set_locked(key, value, now)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Snapshot dos contadores para métricas."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+# Singleton por worker
+product_cache = ProductCache(
+    max_entries=settings.PRODUCT_CACHE_MAX_ENTRIES,
+    max_bytes=settings.PRODUCT_CACHE_MAX_BYTES,
+    ttl_seconds=settings.PRODUCT_CACHE_TTL_SECONDS,
+)
+
+# Cache negativo (GTINs consultados e não encontrados), TTL curto.
+# Cobre os falsos positivos do filtro de Bloom e o período sem filtro pronto.
+negative_cache = ProductCache(
+    max_entries=settings.NEGATIVE_CACHE_MAX_ENTRIES,
+    max_bytes=settings.NEGATIVE_CACHE_MAX_ENTRIES * 256,
+    ttl_seconds=settings.NEGATIVE_CACHE_TTL_SECONDS,
+)
+
+
+def _reset_local_caches() -> None:
+    """Descarta caches e filtro deste worker após uma recarga de produtos."""
+    from app.core.gtin_filter import gtin_filter
+
+    product_cache.clear()
+    negative_cache.clear()
+    gtin_filter.rebuild_in_background()
+
+
+# =============================================================================
+# Nível 2: cache compartilhado no Redis
+# =============================================================================
+
+# Campos numeric que precisam voltar como Decimal após o JSON
+_DECIMAL_FIELDS = ("gross_weight_value",)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def serialize_product(product: dict) -> str:
+    """
+    Serializa um produto para armazenamento no Redis (mesmo formato da
+    resposta da API; reaproveita o payload_json quando disponível).
+
+    Formato: "<content_hash>\n<content_updated_at ISO>\n<json>". O JSON
+    compacto nunca contém quebra de linha literal.
+    """
+    payload = getattr(product, "payload", None)
+    if not payload:
+        payload = json.dumps(product, default=_json_default, separators=(",", ":"), ensure_ascii=False)
+    content_hash = getattr(product, "content_hash", None) or ""
+    updated_at = getattr(product, "content_updated_at", None)
+    return f"{content_hash}\n{updated_at.isoformat() if updated_at else ''}\n{payload}"
+
+
+def deserialize_product(value: str) -> dict:
+    """
+    Reconstrói o produto (Decimal preservado) a partir do Redis, mantendo o
+    texto original para ser devolvido sem nova serialização.
+    """
+    content_hash, updated_at, payload = value.split("\n", 2)
+    product = ProductRecord(
+        json.loads(payload),
+        payload=payload,
+        content_hash=content_hash or None,
+        content_updated_at=datetime.fromisoformat(updated_at) if updated_at else None,
+    )
+    for field in _DECIMAL_FIELDS:
+        if product.get(field) is not None:
+            product[field] = Decimal(product[field])
+    return product
+
+
+class RedisProductCache:
+    """
+    Cache read-through compartilhado no Redis.
+
+    - Leituras em lote via MGET (uma ida ao Redis por batch).
+    - TTL com jitter para evitar expiração simultânea (stampede).
+    - Qualquer erro do Redis é tratado como miss: o chamador cai no Postgres.
+    - Locks de preenchimento (`products:fill:*`, SET NX PX) coordenam os
+      workers em um miss simultâneo: só o dono do lock consulta o banco; os
+      demais aguardam o valor aparecer no Redis (ver app.core.products).
+    """
+
+    KEY_PREFIX = "products:cache:v2"
+    FILL_LOCK_PREFIX = "products:fill"
+
+    def __init__(self, ttl_seconds: int, ttl_jitter: float):
+        self.ttl_seconds = ttl_seconds
+        self.ttl_jitter = ttl_jitter
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.fill_locks_acquired = 0
+        self.fill_lock_waits = 0
+        self.fill_lock_hits = 0
+
+    def _key(self, gtin: str) -> str:
+        return f"{self.KEY_PREFIX}:{_known_generation or '0'}:{gtin}"
+
+    def _fill_key(self, gtin: str) -> str:
+        return f"{self.FILL_LOCK_PREFIX}:{_known_generation or '0'}:{gtin}"
+
+    def count_fill(self, acquired: int = 0, waits: int = 0, hits: int = 0) -> None:
+        with self._lock:
+            self.fill_locks_acquired += acquired
+            self.fill_lock_waits += waits
+            self.fill_lock_hits += hits
+
+    def _ttl(self) -> int:
+        jitter = int(self.ttl_seconds * self.ttl_jitter)
+        return max(self.ttl_seconds + random.randint(-jitter, jitter), 1)
+
+    def _count(self, hits: int = 0, misses: int = 0, errors: int = 0) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.errors += errors
+
+    def get_many(self, gtins: list[str], count: bool = True) -> dict[str, dict]:
+        """
+        Busca vários GTINs com um único MGET. Retorna apenas os encontrados.
+        `count=False` não soma hits/misses (releituras durante a espera por
+        um lock de preenchimento).
+        """
+        if not gtins:
+            return {}
+
+        from app.core.rate_limit import get_redis_client
+
+        client = get_redis_client()
+        if client is None:
+            return {}
+        try:
+            payloads = client.mget([self._key(g) for g in gtins])
+        except redis.RedisError as e:
+            logger.warning("Redis error ao ler cache de produtos: %s", e)
+            self._count(errors=1)
+            return {}
+        return self._decode_many(gtins, payloads, count)
+
+    async def get_many_async(self, gtins: list[str], count: bool = True) -> dict[str, dict]:
+        """`get_many` pelo cliente Redis asyncio."""
+        if not gtins:
+            return {}
+
+        from app.core.redis_client import get_async_redis_client
+
+        client = get_async_redis_client()
+        if client is None:
+            return {}
+        try:
+            payloads = await client.mget([self._key(g) for g in gtins])
+        except redis.RedisError as e:
+            logger.warning("Redis error ao ler cache de produtos: %s", e)
+            self._count(errors=1)
+            return {}
+        return self._decode_many(gtins, payloads, count)
+
+    def _decode_many(self, gtins: list[str], payloads: list, count: bool = True) -> dict[str, dict]:
+        found: dict[str, dict] = {}
+        for gtin, payload in zip(gtins, payloads):
+            if payload is None:
+                continue
+            try:
+                found[gtin] = deserialize_product(payload)
+            except (ValueError, TypeError, ArithmeticError):
+                logger.warning("Payload inválido no cache Redis para GTIN %s", gtin)
+        if count:
+            self._count(hits=len(found), misses=len(gtins) - len(found))
+        return found
+
+    def set_many(self, products: dict[str, dict]) -> None:
+        """Grava vários produtos com SET EX em um único pipeline."""
+        if not products:
+            return
+
+        from app.core.rate_limit import get_redis_client
+
+        client = get_redis_client()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for gtin, product in products.items():
+                pipe.set(self._key(gtin), serialize_product(product), ex=self._ttl())
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Redis error ao gravar cache de produtos: %s", e)
+            self._count(errors=1)
+
+    async def set_many_async(self, products: dict[str, dict]) -> None:
+        """`set_many` pelo cliente Redis asyncio."""
+        if not products:
+            return
+
+        from app.core.redis_client import get_async_redis_client
+
+        client = get_async_redis_client()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for gtin, product in products.items():
+                pipe.set(self._key(gtin), serialize_product(product), ex=self._ttl())
+            await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Redis error ao gravar cache de produtos: %s", e)
+            self._count(errors=1)
+
+    # -------------------------------------------------------------------------
+    # Locks de preenchimento (coalescência entre workers)
+    # -------------------------------------------------------------------------
+
+    def acquire_fill_locks(self, gtins: list[str], ttl_ms: int) -> list[str]:
+        """
+        Tenta o lock de preenchimento de cada GTIN. Retorna os adquiridos;
+        com o Redis indisponível, todos (cada worker consulta o banco).
+        """
+        from app.core.rate_limit import get_redis_client
+
+        client = get_redis_client()
+        if client is None:
+            return list(gtins)
+        try:
+            pipe = client.pipeline(transaction=False)
+            for gtin in gtins:
+                pipe.set(self._fill_key(gtin), "1", nx=True, px=ttl_ms)
+            results = pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Redis error ao adquirir locks de preenchimento: %s", e)
+            return list(gtins)
+        acquired = [gtin for gtin, ok in zip(gtins, results) if ok]
+        self.count_fill(acquired=len(acquired))
+        return acquired
+
+    async def acquire_fill_locks_async(self, gtins: list[str], ttl_ms: int) -> list[str]:
+        """`acquire_fill_locks` pelo cliente Redis asyncio."""
+        from app.core.redis_client import get_async_redis_client
+
+        client = get_async_redis_client()
+        if client is None:
+            return list(gtins)
+        try:
+            pipe = client.pipeline(transaction=False)
+            for gtin in gtins:
+                pipe.set(self._fill_key(gtin), "1", nx=True, px=ttl_ms)
+            results = await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Redis error ao adquirir locks de preenchimento: %s", e)
+            return list(gtins)
+        acquired = [gtin for gtin, ok in zip(gtins, results) if ok]
+        self.count_fill(acquired=len(acquired))
+        return acquired
+
+    def held_fill_locks(self, gtins: list[str]) -> set[str]:
+        """GTINs cujo lock ainda existe (outro worker ainda consultando)."""
+        from app.core.rate_limit import get_redis_client
+
+        client = get_redis_client()
+        if client is None or not gtins:
+            return set()
+        try:
+            pipe = client.pipeline(transaction=False)
+            for gtin in gtins:
+                pipe.exists(self._fill_key(gtin))
+            results = pipe.execute()
+        except redis.RedisError:
+            return set()
+        return {gtin for gtin, held in zip(gtins, results) if held}
+
+    async def held_fill_locks_async(self, gtins: list[str]) -> set[str]:
+        """`held_fill_locks` pelo cliente Redis asyncio."""
+        from app.core.redis_client import get_async_redis_client
+
+        client = get_async_redis_client()
+        if client is None or not gtins:
+            return set()
+        try:
+            pipe = client.pipeline(transaction=False)
+            for gtin in gtins:
+                pipe.exists(self._fill_key(gtin))
+            results = await pipe.execute()
+        except redis.RedisError:
+            return set()
+        return {gtin for gtin, held in zip(gtins, results) if held}
+
+    def release_fill_locks(self, gtins: list[str]) -> None:
+        """
+        Libera os locks (DEL simples: se o lock já expirou e foi retomado,
+        o pior caso é uma consulta extra ao banco).
+        """
+        if not gtins:
+            return
+        from app.core.rate_limit import get_redis_client
+
+        client = get_redis_client()
+        if client is None:
+            return
+        try:
+            client.delete(*[self._fill_key(g) for g in gtins])
+        except redis.RedisError as e:
+            logger.warning("Redis error ao liberar locks de preenchimento: %s", e)
+
+    async def release_fill_locks_async(self, gtins: list[str]) -> None:
+        """`release_fill_locks` pelo cliente Redis asyncio."""
+        if not gtins:
+            return
+        from app.core.redis_client import get_async_redis_client
+
+        client = get_async_redis_client()
+        if client is None:
+            return
+        try:
+            await client.delete(*[self._fill_key(g) for g in gtins])
+        except redis.RedisError as e:
+            logger.warning("Redis error ao liberar locks de preenchimento: %s", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "ttl_seconds": self.ttl_seconds,
+                "ttl_jitter": self.ttl_jitter,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "errors": self.errors,
+                "generation": _known_generation,
+                "fill_locks_acquired": self.fill_locks_acquired,
+                "fill_lock_waits": self.fill_lock_waits,
+                "fill_lock_hits": self.fill_lock_hits,
+            }
+
+
+redis_product_cache = RedisProductCache(
+    ttl_seconds=settings.PRODUCT_REDIS_CACHE_TTL_SECONDS,
+    ttl_jitter=settings.PRODUCT_REDIS_CACHE_TTL_JITTER,
+)
+
+
+# =============================================================================
+# Invalidação por geração (ETL → workers)
+# =============================================================================
+
+_generation_lock = threading.Lock()
+_known_generation: Optional[str] = None
+# None também é "chave ausente no Redis"; a primeira leitura é só registrada,
+# mas ausente → "1" (primeira carga do ETL) conta como mudança
+_generation_read = False
+_next_generation_check = 0.0
+
+
+def _generation_check_due() -> bool:
+    """True para no máximo uma chamada a cada PRODUCT_CACHE_GENERATION_CHECK_SECONDS."""
+    global _next_generation_check
+
+    now = time.monotonic()
+    if now < _next_generation_check:
+        return False
+    with _generation_lock:
+        if now < _next_generation_check:
+            return False
+        _next_generation_check = now + settings.PRODUCT_CACHE_GENERATION_CHECK_SECONDS
+        return True
+
+
+def _apply_generation(generation: Optional[str]) -> None:
+    global _known_generation, _generation_read
+
+    with _generation_lock:
+        if _generation_read and generation == _known_generation:
+            return
+        first_read = not _generation_read
+        _known_generation, _generation_read = generation, True
+    if not first_read:
+        logger.info("Nova geração de produtos (%s): limpando cache local", generation)
+        _reset_local_caches()
+
+
+def sync_cache_generation() -> None:
+    """
+    Limpa o cache local se o ETL publicou uma nova geração no Redis.
+    Consulta o Redis no máximo a cada PRODUCT_CACHE_GENERATION_CHECK_SECONDS.
+    """
+    if not _generation_check_due():
+        return
+
+    from app.core.rate_limit import get_redis_client
+
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        generation = client.get(PRODUCT_CACHE_GENERATION_KEY)
+    except redis.RedisError as e:
+        logger.warning("Redis error ao verificar geração do cache de produtos: %s", e)
+        return
+    _apply_generation(generation)
+
+
+async def sync_cache_generation_async() -> None:
+    """`sync_cache_generation` pelo cliente Redis asyncio (não bloqueia o event loop)."""
+    if not _generation_check_due():
+        return
+
+    from app.core.redis_client import get_async_redis_client
+
+    client = get_async_redis_client()
+    if client is None:
+        return
+    try:
+        generation = await client.get(PRODUCT_CACHE_GENERATION_KEY)
+    except redis.RedisError as e:
+        logger.warning("Redis error ao verificar geração do cache de produtos: %s", e)
+        return
+    _apply_generation(generation)
+
+
+def invalidate_product_cache() -> None:
+    """
+    Invalida o cache de produtos de todos os workers.
+
+    Limpa o cache deste processo e incrementa a geração no Redis; os
+    workers limpam o próprio cache (e reconstroem o filtro de GTINs) na
+    próxima verificação. Sem Redis, os outros workers dependem do TTL do
+    cache local e da idade máxima do filtro (GTIN_FILTER_MAX_AGE_SECONDS).
+    """
+    product_cache.clear()
+    negative_cache.clear()
+
+    from app.core.rate_limit import get_redis_client
+
+    client = get_redis_client()
+    if client is None:
+        logger.warning("Redis indisponível: invalidação do cache de produtos apenas local")
+        return
+    try:
+        client.incr(PRODUCT_CACHE_GENERATION_KEY)
+    except redis.RedisError as e:
+        logger.warning("Redis error ao invalidar cache de produtos: %s", e)
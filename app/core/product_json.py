@@ -0,0 +1,131 @@
+"""
+Serialização rápida de produtos para JSON.
+==========================================
+Caminho quente dos endpoints de consulta: o dict do repositório
+(app.core.products) vai direto para bytes JSON, sem construir
+ProductResponse/BatchResponseItem nem revalidar contra o response_model.
+
+- Encoder pré-configurado (instância única, C accelerator do json).
+- Decimal sai como string, igual ao Pydantic v2 ("1130.000"); `cest` já
+  vem do banco como lista.
+- A saída tem as mesmas chaves e a mesma ordem dos schemas em
+  app.schemas.product, então o contrato da API (e o OpenAPI, que continua
+  vindo do response_model) não muda.
+
+Com PRODUCT_PAYLOAD_JSON_ENABLED, o repositório entrega ProductRecord com
+o JSON pré-computado pelo ETL (products.payload_json) e o encoder apenas
+repassa esse texto; lotes são a concatenação dos fragmentos armazenados.
+
+Com FAST_JSON_RESPONSES=false os helpers devolvem os modelos Pydantic e o
+FastAPI serializa como antes.
+"""
+
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterable, Optional, Union
+
+from fastapi.responses import Response
+
+from app.core.config import settings
+from app.schemas.product import BatchResponse, BatchResponseItem, ProductResponse
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default)
+_encode = _encoder.encode
+
+
+class ProductRecord(dict):
+    """
+    Dict do produto acompanhado do JSON já serializado (payload_json do
+    banco ou payload do cache Redis), quando disponível, e dos validadores
+    HTTP da linha (products.content_hash / content_updated_at).
+    """
+
+    __slots__ = ("payload", "content_hash", "content_updated_at")
+
+    def __init__(
+        self,
+        *args,
+        payload: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        content_updated_at: Optional[datetime] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.payload = payload
+        self.content_hash = content_hash
+        self.content_updated_at = content_updated_at
+
+
+class ProductJSONResponse(Response):
+    """Resposta com corpo JSON já serializado."""
+
+    media_type = "application/json"
+
+
+def encode_product(product: dict) -> str:
+    """Serializa o dict de um produto (formato de ProductResponse)."""
+    payload = getattr(product, "payload", None)
+    if payload:
+        return payload
+    return _encode(product)
+
+
+def encode_batch_item(gtin: str, product: Optional[dict], error: Optional[str] = None) -> str:
+    """Serializa um item de lote (formato de BatchResponseItem)."""
+    return (
+        '{"gtin":' + _encode(gtin)
+        + ',"found":' + ("true" if product is not None else "false")
+        + ',"product":' + (encode_product(product) if product is not None else "null")
+        + ',"error":' + (_encode(error) if error is not None else "null")
+        + "}"
+    )
+
+
+def product_response(product: dict, headers: Optional[dict] = None) -> Union[Response, dict]:
+    """
+    Resposta de um produto encontrado. No modo Pydantic os `headers` devem
+    ser aplicados também no `response` injetado do endpoint.
+    """
+    if not settings.FAST_JSON_RESPONSES:
+        return product
+    return ProductJSONResponse(content=encode_product(product).encode("utf-8"), headers=headers)
+
+
+def batch_response(
+    items: Iterable[tuple[str, Optional[dict], Optional[str]]],
+    total_requested: int,
+    total_found: int,
+    headers: Optional[dict] = None,
+) -> Union[Response, BatchResponse]:
+    """
+    Resposta de lote a partir de tuplas (gtin consultado, produto ou None, motivo de erro).
+    """
+    if not settings.FAST_JSON_RESPONSES:
+        return BatchResponse(
+            total_requested=total_requested,
+            total_found=total_found,
+            results=[
+                BatchResponseItem(
+                    gtin=gtin,
+                    found=product is not None,
+                    product=ProductResponse(**product) if product is not None else None,
+                    error=error,
+                )
+                for gtin, product, error in items
+            ],
+        )
+
+    body = (
+        '{"total_requested":' + str(total_requested)
+        + ',"total_found":' + str(total_found)
+        + ',"results":[' + ",".join(encode_batch_item(*item) for item in items) + "]}"
+    )
+    return ProductJSONResponse(content=body.encode("utf-8"), headers=headers)
@@ -0,0 +1,368 @@
+"""
+Repositório de produtos.
+========================
+Ponto único de acesso à tabela `products` para os endpoints de consulta
+(API, dashboard e público).
+
+Todas as chaves são GTIN-14 canônicos (ver app.core.gtin); a tabela é
+consultada pela coluna indexada `gtin14`.
+
+As consultas rodam no pool de leitura (réplica, se configurada; ver
+app.db.session), qualquer que seja a sessão recebida.
+
+Ordem de leitura: cache em memória → filtro de Bloom / cache negativo
+(respondem "não existe" sem I/O) → cache Redis (opcional) → Postgres.
+
+Misses simultâneos do mesmo GTIN no worker são coalescidos (single-flight,
+app.core.single_flight): uma consulta, os demais aguardam. Entre workers,
+opcionalmente, um lock curto no Redis (PRODUCT_FILL_LOCK_MS).
+
+As variantes `_async` (AsyncSession e cliente Redis asyncio) seguem a mesma
+ordem e compartilham os caches; são usadas pelas rotas `async def`.
+"""
+
+import asyncio
+import time
+
+from sqlalchemy import String, bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.gtin_filter import gtin_filter
+from app.core.product_json import ProductRecord
+from app.core.single_flight import SingleFlight
+from app.db.session import ASYNC_READ_BIND, READ_BIND
+from app.core.product_cache import (
+    negative_cache,
+    product_cache,
+    redis_product_cache,
+    sync_cache_generation,
+    sync_cache_generation_async,
+)
+
+
+PRODUCT_COLUMNS = """
+    gtin,
+    gtin_type,
+    brand,
+    product_name,
+    origin_country,
+    ncm,
+    cest,
+    gross_weight_value,
+    gross_weight_unit
+"""
+
+
+# JSON do produto no formato de ProductResponse (mesma ordem de chaves),
+# montado pelo próprio Postgres. Decimal vira texto, como no Pydantic.
+# Usado pelo ETL e por scripts/check_payload_json.py.
+PAYLOAD_JSON_SQL = """
+    json_build_object(
+        'gtin', gtin,
+        'gtin_type', gtin_type,
+        'brand', brand,
+        'product_name', product_name,
+        'origin_country', origin_country,
+        'ncm', ncm,
+        'cest', cest,
+        'gross_weight_value', gross_weight_value::text,
+        'gross_weight_unit', gross_weight_unit
+    )::text
+"""
+
+# Hash do conteúdo da resposta: base do ETag (products.content_hash),
+# gravado pelo ETL junto com content_updated_at (Last-Modified).
+CONTENT_HASH_SQL = f"md5({PAYLOAD_JSON_SQL})"
+
+# Validadores HTTP lidos junto com o produto (colunas pequenas, sem custo
+# de hash ou serialização por requisição)
+VALIDATOR_COLUMNS = "content_hash, content_updated_at"
+
+
+def row_to_product(row) -> dict:
+    """
+    Converte uma Row de `products` para ProductRecord, com o JSON
+    armazenado (`payload_json`) e os validadores HTTP se a Row os trouxer.
+    """
+    product = ProductRecord(
+        payload=getattr(row, "payload_json", None),
+        content_hash=getattr(row, "content_hash", None),
+        content_updated_at=getattr(row, "content_updated_at", None),
+    )
+    product.update({
+        "gtin": row.gtin,
+        "gtin_type": row.gtin_type,
+        "brand": row.brand,
+        "product_name": row.product_name,
+        "origin_country": row.origin_country,
+        "ncm": row.ncm,
+        "cest": row.cest,
+        "gross_weight_value": row.gross_weight_value,
+        "gross_weight_unit": row.gross_weight_unit,
+    })
+    return product
+
+
+# Statement único para qualquer tamanho de lote: a lista vai em um só
+# parâmetro array, então o SQL (e o cache de compilação do SQLAlchemy) não
+# muda com a quantidade de GTINs. O CAST para char(14)[] mantém a comparação
+# no tipo da coluna e o uso de idx_products_gtin14.
+# Variantes do mesmo item (ex.: UPC-A e EAN-13) compartilham o gtin14.
+_PAYLOAD_COLUMN = ", payload_json" if settings.PRODUCT_PAYLOAD_JSON_ENABLED else ""
+_BULK_FETCH_QUERY = text(f"""
+    SELECT DISTINCT ON (gtin14) gtin14, {PRODUCT_COLUMNS}, {VALIDATOR_COLUMNS}{_PAYLOAD_COLUMN}
+    FROM products
+    WHERE gtin14 = ANY(CAST(:gtin14s AS CHAR(14)[]))
+    ORDER BY gtin14, gtin
+""").bindparams(bindparam("gtin14s", type_=ARRAY(String)))
+
+
+def query_products_by_gtin14(db: Session, gtin14s: list[str]) -> dict[str, dict]:
+    """
+    Busca no Postgres (sem cache) os produtos de uma lista de GTIN-14.
+
+    Returns:
+        Mapa gtin14 -> dict do produto (somente encontrados).
+    """
+    if not gtin14s:
+        return {}
+    rows = db.execute(_BULK_FETCH_QUERY, {"gtin14s": list(gtin14s)}, bind_arguments=READ_BIND).fetchall()
+    return {row.gtin14: row_to_product(row) for row in rows}
+
+
+async def query_products_by_gtin14_async(db: AsyncSession, gtin14s: list[str]) -> dict[str, dict]:
+    """`query_products_by_gtin14` com AsyncSession."""
+    if not gtin14s:
+        return {}
+    result = await db.execute(_BULK_FETCH_QUERY, {"gtin14s": list(gtin14s)}, bind_arguments=ASYNC_READ_BIND)
+    return {row.gtin14: row_to_product(row) for row in result.fetchall()}
+
+
+def _load_missing(db: Session, gtins: list[str]) -> dict[str, dict]:
+    """
+    Resolve GTINs ausentes do cache local: Redis (se habilitado) e depois
+    Postgres. Os encontrados no banco são gravados de volta no Redis.
+
+    Com PRODUCT_FILL_LOCK_MS, só o worker que obtém o lock de preenchimento
+    de um GTIN consulta o banco; os demais aguardam o valor no Redis.
+    """
+    found: dict[str, dict] = {}
+    missing = gtins
+    locked: list[str] = []
+
+    if settings.PRODUCT_REDIS_CACHE_ENABLED:
+        found = redis_product_cache.get_many(missing)
+        missing = [g for g in missing if g not in found]
+
+        if missing and settings.PRODUCT_FILL_LOCK_MS > 0:
+            locked = redis_product_cache.acquire_fill_locks(missing, settings.PRODUCT_FILL_LOCK_MS)
+            others = [g for g in missing if g not in set(locked)]
+            if others:
+                found.update(_wait_for_fill(others))
+            missing = [g for g in missing if g not in found]
+
+    if missing:
+        try:
+            fetched = query_products_by_gtin14(db, missing)
+            if settings.PRODUCT_REDIS_CACHE_ENABLED:
+                redis_product_cache.set_many(fetched)
+        finally:
+            redis_product_cache.release_fill_locks(locked)
+        found.update(fetched)
+
+    return found
+
+
+def _wait_for_fill(gtins: list[str]) -> dict[str, dict]:
+    """
+    Aguarda (até PRODUCT_FILL_LOCK_MS) outro worker gravar os GTINs no
+    Redis. Para de esperar por um GTIN quando o lock dele some; o que não
+    aparecer é consultado no banco pelo chamador.
+    """
+    redis_product_cache.count_fill(waits=len(gtins))
+    found: dict[str, dict] = {}
+    pending = list(gtins)
+    deadline = time.monotonic() + settings.PRODUCT_FILL_LOCK_MS / 1000
+    interval = max(settings.PRODUCT_FILL_LOCK_MS / 5000, 0.005)
+    while pending and time.monotonic() < deadline:
+        time.sleep(interval)
+        found.update(redis_product_cache.get_many(pending, count=False))
+        held = redis_product_cache.held_fill_locks([g for g in pending if g not in found])
+        pending = [g for g in pending if g in held]
+    redis_product_cache.count_fill(hits=len(found))
+    return found
+
+
+async def _load_missing_async(db: AsyncSession, gtins: list[str]) -> dict[str, dict]:
+    """`_load_missing` com AsyncSession e cliente Redis asyncio."""
+    found: dict[str, dict] = {}
+    missing = gtins
+    locked: list[str] = []
+
+    if settings.PRODUCT_REDIS_CACHE_ENABLED:
+        found = await redis_product_cache.get_many_async(missing)
+        missing = [g for g in missing if g not in found]
+
+        if missing and settings.PRODUCT_FILL_LOCK_MS > 0:
+            locked = await redis_product_cache.acquire_fill_locks_async(missing, settings.PRODUCT_FILL_LOCK_MS)
+            others = [g for g in missing if g not in set(locked)]
+            if others:
+                found.update(await _wait_for_fill_async(others))
+            missing = [g for g in missing if g not in found]
+
+    if missing:
+        try:
+            fetched = await query_products_by_gtin14_async(db, missing)
+            if settings.PRODUCT_REDIS_CACHE_ENABLED:
+                await redis_product_cache.set_many_async(fetched)
+        finally:
+            await redis_product_cache.release_fill_locks_async(locked)
+        found.update(fetched)
+
+    return found
+
+
+async def _wait_for_fill_async(gtins: list[str]) -> dict[str, dict]:
+    """`_wait_for_fill` pelo cliente Redis asyncio."""
+    redis_product_cache.count_fill(waits=len(gtins))
+    found: dict[str, dict] = {}
+    pending = list(gtins)
+    deadline = time.monotonic() + settings.PRODUCT_FILL_LOCK_MS / 1000
+    interval = max(settings.PRODUCT_FILL_LOCK_MS / 5000, 0.005)
+    while pending and time.monotonic() < deadline:
+        await asyncio.sleep(interval)
+        found.update(await redis_product_cache.get_many_async(pending, count=False))
+        held = await redis_product_cache.held_fill_locks_async([g for g in pending if g not in found])
+        pending = [g for g in pending if g in held]
+    redis_product_cache.count_fill(hits=len(found))
+    return found
+
+
+# Coalescência por worker dos misses (threads e event loop)
+product_flight = SingleFlight(wait_timeout=settings.PRODUCT_SINGLE_FLIGHT_WAIT_SECONDS)
+
+
+def _load_coalesced(db: Session, gtins: list[str]) -> dict[str, dict]:
+    if not settings.PRODUCT_SINGLE_FLIGHT_ENABLED:
+        return _load_missing(db, gtins)
+    return product_flight.load_many(gtins, lambda keys: _load_missing(db, keys))
+
+
+async def _load_coalesced_async(db: AsyncSession, gtins: list[str]) -> dict[str, dict]:
+    if not settings.PRODUCT_SINGLE_FLIGHT_ENABLED:
+        return await _load_missing_async(db, gtins)
+    return await product_flight.load_many_async(gtins, lambda keys: _load_missing_async(db, keys))
+
+
+def _is_known_absent(gtin: str) -> bool:
+    """True se o filtro de Bloom ou o cache negativo garantem que o GTIN não existe."""
+    return not gtin_filter.might_contain(gtin) or negative_cache.get(gtin) is not None
+
+
+def _remember_absent(gtins: list[str]) -> None:
+    """Registra GTINs não encontrados no banco (falsos positivos do filtro)."""
+    if not gtins:
+        return
+    negative_cache.set_many({g: True for g in gtins})
+    for _ in gtins:
+        gtin_filter.record_false_positive()
+
+
+def fetch_product_by_gtin(db: Session, gtin: str) -> dict | None:
+    """
+    Busca um produto pelo GTIN-14 canônico (ver app.core.gtin.canonicalize_gtin).
+
+    Returns:
+        Dict com os dados do produto ou None se não encontrado.
+        O dict pode vir do cache compartilhado: trate-o como somente leitura.
+    """
+    sync_cache_generation()
+
+    if settings.PRODUCT_CACHE_ENABLED:
+        product = product_cache.get(gtin)
+        if product is not None:
+            return product
+
+    if _is_known_absent(gtin):
+        return None
+
+    product = _load_coalesced(db, [gtin]).get(gtin)
+    if product is None:
+        _remember_absent([gtin])
+    elif settings.PRODUCT_CACHE_ENABLED:
+        product_cache.set(gtin, product)
+    return product
+
+
+def fetch_products_by_gtins(db: Session, gtins: list[str]) -> dict[str, dict]:
+    """
+    Busca produtos por lista de GTIN-14 canônicos.
+    Apenas os GTINs ausentes dos caches (e não descartados pelo filtro)
+    vão ao banco, em uma única query.
+
+    Returns:
+        Mapa gtin14 -> dict do produto (somente encontrados).
+    """
+    unique_gtins = list(dict.fromkeys(g for g in gtins if g))
+    if not unique_gtins:
+        return {}
+
+    sync_cache_generation()
+
+    found: dict[str, dict] = {}
+    if settings.PRODUCT_CACHE_ENABLED:
+        found = product_cache.get_many(unique_gtins)
+
+    missing = [g for g in unique_gtins if g not in found and not _is_known_absent(g)]
+    if missing:
+        loaded = _load_coalesced(db, missing)
+        _remember_absent([g for g in missing if g not in loaded])
+        if settings.PRODUCT_CACHE_ENABLED:
+            product_cache.set_many(loaded)
+        found.update(loaded)
+    return found
+
+
+async def fetch_product_by_gtin_async(db: AsyncSession, gtin: str) -> dict | None:
+    """`fetch_product_by_gtin` com AsyncSession (mesmo contrato)."""
+    await sync_cache_generation_async()
+
+    if settings.PRODUCT_CACHE_ENABLED:
+        product = product_cache.get(gtin)
+        if product is not None:
+            return product
+
+    if _is_known_absent(gtin):
+        return None
+
+    product = (await _load_coalesced_async(db, [gtin])).get(gtin)
+    if product is None:
+        _remember_absent([gtin])
+    elif settings.PRODUCT_CACHE_ENABLED:
+        product_cache.set(gtin, product)
+    return product
+
+
+async def fetch_products_by_gtins_async(db: AsyncSession, gtins: list[str]) -> dict[str, dict]:
+    """`fetch_products_by_gtins` com AsyncSession (mesmo contrato)."""
+    unique_gtins = list(dict.fromkeys(g for g in gtins if g))
+    if not unique_gtins:
+        return {}
+
+    await sync_cache_generation_async()
+
+    found: dict[str, dict] = {}
+    if settings.PRODUCT_CACHE_ENABLED:
+        found = product_cache.get_many(unique_gtins)
+
+    missing = [g for g in unique_gtins if g not in found and not _is_known_absent(g)]
+    if missing:
+        loaded = await _load_coalesced_async(db, missing)
+        _remember_absent([g for g in missing if g not in loaded])
+        if settings.PRODUCT_CACHE_ENABLED:
+            product_cache.set_many(loaded)
+        found.update(loaded)
+    return found
@@ -0,0 +1,253 @@
+"""
+Cota mensal por organização no Redis.
+=====================================
+Substitui o SELECT em organization_usage_monthly por consulta: um contador
+`quota:monthly:<org_id>:<YYYY-MM>` guarda as chamadas com sucesso do mês e
+um script Lua verifica o limite e incrementa em uma única ida ao Redis.
+
+- Com o write-behind no backend redis (app.core.usage_buffer), o mesmo
+  script registra o sucesso no journal `usage:pending`: verificação de cota
+  e registro de uso custam uma chamada de rede.
+- No miss (chave ausente ou expirada), o contador é semeado a partir do
+  Postgres (mais os pendentes do write-behind) com SET NX.
+- O Postgres continua sendo a fonte da verdade: a chave expira a cada
+  QUOTA_RECONCILE_SECONDS e é semeada de novo, corrigindo qualquer desvio
+  (perda do Redis, uso gravado direto no banco por jobs em lote).
+
+As reservas usadas pelos endpoints (`reserve_usage`) ficam em
+app.core.usage; este módulo só opera o contador. As variantes `_async` usam
+o cliente Redis asyncio.
+"""
+
+import logging
+from datetime import date
+from typing import Awaitable, Callable, Optional
+
+import redis
+
+from app.core import usage_buffer
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+QUOTA_KEY_PREFIX = "quota:monthly:"
+
+# Verifica e consome a cota; opcionalmente registra o sucesso no journal.
+# KEYS[1]=contador da cota, KEYS[2]=journal de uso
+# ARGV: limite (0 = ilimitado), unidades, TTL, semente ('' = não semear),
+#       campos do journal a incrementar (org, key)
+# Retorna {1, usado} (consumido), {0, usado} (limite excedido) ou
+# {-1, 0} (contador ausente: semear e chamar de novo)
+CONSUME_SCRIPT = """
+local used = redis.call('GET', KEYS[1])
+if not used then
+    if ARGV[4] == '' then
+        return {-1, 0}
+    end
+    redis.call('SET', KEYS[1], ARGV[4], 'EX', ARGV[3], 'NX')
+    used = redis.call('GET', KEYS[1])
+end
+used = tonumber(used)
+local limit = tonumber(ARGV[1])
+local units = tonumber(ARGV[2])
+if limit > 0 and used + units > limit then
+    return {0, used}
+end
+redis.call('INCRBY', KEYS[1], units)
+for i = 5, #ARGV do
+    redis.call('HINCRBY', KEYS[2], ARGV[i], units)
+end
+return {1, used + units}
+"""
+
+# Ajusta o contador (só se existir: uma chave expirada é semeada do banco)
+# e aplica deltas no journal.
+# KEYS[1]=contador da cota, KEYS[2]=journal de uso
+# ARGV: delta do contador, pares campo/delta do journal
+ADJUST_SCRIPT = """
+local delta = tonumber(ARGV[1])
+if delta ~= 0 and redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('INCRBY', KEYS[1], delta)
+end
+for i = 2, #ARGV, 2 do
+    redis.call('HINCRBY', KEYS[2], ARGV[i], tonumber(ARGV[i + 1]))
+end
+return 1
+"""
+
+_scripts: dict[str, object] = {}
+_async_scripts: dict[str, object] = {}
+
+
+def quota_key(organization_id: int, usage_month: date) -> str:
+    return f"{QUOTA_KEY_PREFIX}{organization_id}:{usage_month.strftime('%Y-%m')}"
+
+
+def quota_client() -> Optional[redis.Redis]:
+    """Cliente Redis da cota, ou None se desativada/indisponível."""
+    if not settings.QUOTA_REDIS_ENABLED:
+        return None
+    from app.core.rate_limit import get_redis_client
+
+    return get_redis_client()
+
+
+def quota_async_client():
+    """Cliente Redis asyncio da cota, ou None se desativada/indisponível."""
+    if not settings.QUOTA_REDIS_ENABLED:
+        return None
+    from app.core.redis_client import get_async_redis_client
+
+    return get_async_redis_client()
+
+
+def _script(client: redis.Redis, source: str):
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = client.register_script(source)
+    return script
+
+
+def _async_script(client, source: str):
+    # O cliente asyncio muda com o event loop: passe `client=` na chamada
+    script = _async_scripts.get(source)
+    if script is None:
+        script = _async_scripts[source] = client.register_script(source)
+    return script
+
+
+def _consume_args(monthly_limit: int, units: int) -> list:
+    return [monthly_limit, units, settings.QUOTA_RECONCILE_SECONDS]
+
+
+def _adjust_args(counter_delta: int, journal: Optional[list[tuple[str, int]]]) -> list:
+    args: list = [counter_delta]
+    for field, delta in journal or []:
+        args.extend((field, delta))
+    return args
+
+
+def consume(
+    client: redis.Redis,
+    organization_id: int,
+    usage_month: date,
+    monthly_limit: int,
+    units: int,
+    journal_fields: list[str],
+    seed: Callable[[], int],
+) -> tuple[bool, int]:
+    """
+    Consome `units` da cota se couberem no limite, registrando-as nos
+    campos do journal informados.
+
+    Args:
+        seed: Uso atual do mês segundo o banco (chamado só no miss)
+
+    Returns:
+        (consumido, uso do mês após a operação ou atual se negado)
+
+    Raises:
+        redis.RedisError: o chamador decide o fallback.
+    """
+    script = _script(client, CONSUME_SCRIPT)
+    keys = [quota_key(organization_id, usage_month), usage_buffer.USAGE_PENDING_KEY]
+    args = _consume_args(monthly_limit, units)
+    allowed, used = script(keys=keys, args=[*args, "", *journal_fields])
+    if allowed == -1:
+        allowed, used = script(keys=keys, args=[*args, seed(), *journal_fields])
+    return allowed == 1, int(used)
+
+
+async def consume_async(
+    client,
+    organization_id: int,
+    usage_month: date,
+    monthly_limit: int,
+    units: int,
+    journal_fields: list[str],
+    seed: Callable[[], Awaitable[int]],
+) -> tuple[bool, int]:
+    """`consume` pelo cliente Redis asyncio (`seed` é uma corrotina)."""
+    script = _async_script(client, CONSUME_SCRIPT)
+    keys = [quota_key(organization_id, usage_month), usage_buffer.USAGE_PENDING_KEY]
+    args = _consume_args(monthly_limit, units)
+    allowed, used = await script(keys=keys, args=[*args, "", *journal_fields], client=client)
+    if allowed == -1:
+        allowed, used = await script(keys=keys, args=[*args, await seed(), *journal_fields], client=client)
+    return allowed == 1, int(used)
+
+
+def adjust(
+    organization_id: int,
+    usage_month: date,
+    counter_delta: int,
+    journal: Optional[list[tuple[str, int]]] = None,
+) -> None:
+    """
+    Aplica um delta ao contador (só se existir) e ao journal. Falhas do
+    Redis são registradas e ignoradas: o desvio é corrigido na próxima
+    semeadura do contador.
+    """
+    if not counter_delta and not journal:
+        return
+    client = quota_client()
+    if client is None:
+        logger.warning("Redis indisponível: ajuste de cota da organização %s não aplicado", organization_id)
+        return
+    try:
+        _script(client, ADJUST_SCRIPT)(
+            keys=[quota_key(organization_id, usage_month), usage_buffer.USAGE_PENDING_KEY],
+            args=_adjust_args(counter_delta, journal),
+        )
+    except redis.RedisError as e:
+        logger.warning("Redis error ao ajustar cota: %s", e)
+
+
+async def adjust_async(
+    organization_id: int,
+    usage_month: date,
+    counter_delta: int,
+    journal: Optional[list[tuple[str, int]]] = None,
+) -> None:
+    """`adjust` pelo cliente Redis asyncio."""
+    if not counter_delta and not journal:
+        return
+    client = quota_async_client()
+    if client is None:
+        logger.warning("Redis indisponível: ajuste de cota da organização %s não aplicado", organization_id)
+        return
+    try:
+        await _async_script(client, ADJUST_SCRIPT)(
+            keys=[quota_key(organization_id, usage_month), usage_buffer.USAGE_PENDING_KEY],
+            args=_adjust_args(counter_delta, journal),
+            client=client,
+        )
+    except redis.RedisError as e:
+        logger.warning("Redis error ao ajustar cota: %s", e)
+
+
+def hold(
+    client: redis.Redis,
+    organization_id: int,
+    usage_month: date,
+    monthly_limit: int,
+    units: int,
+    seed: Callable[[], int],
+) -> int:
+    """
+    Reserva até `units` no contador, sem journal (ex.: jobs em lote, que
+    gravam o uso no banco junto do checkpoint). Se não couberem todas,
+    reduz ao saldo restante. O chamador devolve a sobra com `adjust`.
+
+    Returns:
+        Unidades reservadas (0 se a cota do mês acabou)
+
+    Raises:
+        redis.RedisError: o chamador decide o fallback.
+    """
+    while units > 0:
+        allowed, used = consume(client, organization_id, usage_month, monthly_limit, units, [], seed)
+        if allowed:
+            return units
+        units = min(units, monthly_limit - used)
+    return 0
@@ -3,13 +3,22 @@ Rate Limiter com Redis para endpoints públicos e autenticados.
 ==============================================================
 Implementa rate limits por organização (autenticados) e por IP (público).
 
-- Lookup (/{gtin}, /batch): req/min por plano
+- Lookup (/{gtin}, /batch): req/min por plano (GCRA ou janela deslizante,
+  escolhido por plano via RATE_LIMIT_GCRA_PLANS); planos de alto volume
+  podem usar leases locais de tokens (RATE_LIMIT_LEASE_PLANS)
 - Search (/search): cooldown em segundos por plano
-- Público: 20 req/dia por IP + cooldown entre requisições
+- Público: 20 req/dia por IP + cooldown entre requisições (um script Lua,
+  uma ida ao Redis)
+
+Clientes e circuit breaker em app.core.redis_client; as dependencies async
+usam o cliente asyncio.
 """
 
+import math
+import threading
 import time
 import logging
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from typing import Optional, Tuple
@@ -18,6 +27,7 @@ import redis
 from fastapi import Depends, HTTPException, Request, status
 
 from app.core.config import settings
+from app.core.redis_client import get_async_redis_client, get_redis_client  # noqa: F401 (reexportado)
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +45,31 @@ LOOKUP_RATE_LIMITS = {
     "enterprise": 120,
 }
 
+# Planos cujo lookup usa GCRA (um timestamp por chave) em vez da janela
+# deslizante em ZSET; "*" = todos
+def _parse_plan_set(value: str) -> frozenset[str]:
+    return frozenset(p.strip().lower() for p in value.split(",") if p.strip())
+
+
+LOOKUP_GCRA_PLANS = _parse_plan_set(settings.RATE_LIMIT_GCRA_PLANS)
+
+
+# Planos (com GCRA) cujo lookup usa leases locais de tokens; "*" = todos
+LOOKUP_LEASE_PLANS = _parse_plan_set(settings.RATE_LIMIT_LEASE_PLANS)
+
+
+def lookup_algorithm(plan: str) -> str:
+    """
+    Algoritmo do rate limit de lookup do plano: "gcra_lease", "gcra" ou
+    "sliding_window".
+    """
+    if "*" in LOOKUP_GCRA_PLANS or plan in LOOKUP_GCRA_PLANS:
+        if "*" in LOOKUP_LEASE_PLANS or plan in LOOKUP_LEASE_PLANS:
+            return "gcra_lease"
+        return "gcra"
+    return "sliding_window"
+
+
 # Search endpoint: /search (cooldown em segundos entre requests)
 SEARCH_COOLDOWNS = {
     "basic": 6,       # 1 req a cada 6s (~10 req/min)
@@ -49,41 +84,6 @@ PUBLIC_DAILY_LIMIT = 20  # até o final do dia (America/Sao_Paulo)
 PUBLIC_COOLDOWN_SECONDS = 5  # delay entre chamadas para desincentivar scraping
 
 
-# =============================================================================
-# Redis connection singleton
-# =============================================================================
-
-_redis_client: Optional[redis.Redis] = None
-
-
-def get_redis_client() -> Optional[redis.Redis]:
-    """
-    Retorna uma conexão Redis singleton.
-    Retorna None se Redis não estiver habilitado ou não conseguir conectar.
-    """
-    global _redis_client
-    
-    if not settings.REDIS_ENABLED:
-        return None
-    
-    if _redis_client is None:
-        try:
-            _redis_client = redis.from_url(
-                settings.REDIS_URL,
-                decode_responses=True,
-                socket_connect_timeout=2,
-                socket_timeout=2,
-            )
-            # Testar conexão
-            _redis_client.ping()
-            logger.info("Redis conectado com sucesso: %s", settings.REDIS_URL.split("@")[-1])
-        except redis.RedisError as e:
-            logger.warning("Não foi possível conectar ao Redis: %s. Rate limiting desabilitado.", e)
-            _redis_client = None
-    
-    return _redis_client
-
-
 # =============================================================================
 # Funções de fuso horário (reset diário em America/Sao_Paulo)
 # =============================================================================
@@ -96,12 +96,9 @@ def _get_sao_paulo_tz() -> timezone:
         return timezone(timedelta(hours=-3))
 
 
-def _seconds_until_midnight_sao_paulo() -> int:
-    tz = _get_sao_paulo_tz()
-    now_local = datetime.now(tz)
-    tomorrow = (now_local + timedelta(days=1)).date()
-    midnight = datetime.combine(tomorrow, datetime.min.time(), tzinfo=tz)
-    return max(int((midnight - now_local).total_seconds()), 1)
+def _utc_offset_seconds_sao_paulo() -> int:
+    """Deslocamento atual de America/Sao_Paulo em relação a UTC (ex.: -10800)."""
+    return int(datetime.now(_get_sao_paulo_tz()).utcoffset().total_seconds())
 
 
 # =============================================================================
@@ -139,10 +136,122 @@ end
 """
 
 
+# GCRA (generic cell rate algorithm): guarda só o TAT (theoretical arrival
+# time, em ms) por chave. Cada requisição avança o TAT em period/limit; é
+# aceita enquanto TAT - now <= period, o que permite rajada de `limit`
+# requisições e depois 1 a cada period/limit. Memória O(1) por chave e
+# trabalho constante por chamada.
+GCRA_SCRIPT = """
+local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local emission = period / limit
+
+local tat = tonumber(redis.call('GET', key))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + emission
+local diff = now - (new_tat - period)
+if diff < 0 then
+    -- blocked: próxima liberação quando o TAT recuar um intervalo de emissão
+    return {0, 0, math.ceil(-diff / 1000)}
+end
+
+-- string.format: tostring() de números grandes perde precisão (%.14g)
+redis.call('SET', key, string.format('%.3f', new_tat), 'PX', math.ceil(new_tat - now))
+return {1, math.floor(diff / emission), 0}  -- allowed, remaining, retry_after
+"""
+
+
+# GCRA com lease: retira até `want` tokens de uma vez (avança o TAT em
+# emission por token) e devolve as sobras de um lease expirado na mesma
+# chamada. Mesmo estado (chave) e regra de GCRA_SCRIPT.
+# ARGV: limit, period (ms), now (ms), want, returned
+# Retorna {granted, remaining, retry_after_ms}
+GCRA_LEASE_SCRIPT = """
+local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local want = tonumber(ARGV[4])
+local returned = tonumber(ARGV[5])
+local emission = period / limit
+
+local tat = tonumber(redis.call('GET', key))
+if not tat or tat < now then
+    tat = now
+end
+if returned > 0 then
+    tat = math.max(tat - returned * emission, now)
+end
+
+-- Tokens disponíveis agora: cada um avança o TAT em emission até TAT - now = period
+local available = math.floor((now + period - tat) / emission)
+local granted = math.min(want, available)
+if granted > 0 then
+    tat = tat + granted * emission
+end
+if tat > now then
+    redis.call('SET', key, string.format('%.3f', tat), 'PX', math.ceil(tat - now))
+end
+if granted <= 0 then
+    return {0, 0, math.ceil(tat + emission - period - now)}
+end
+return {granted, math.floor((now + period - tat) / emission), 0}
+"""
+
+
+# Cooldown + limite diário por IP em uma única chamada. A expiração do
+# contador diário (meia-noite local) é calculada com o relógio do Redis.
+# KEYS[1]=cooldown, KEYS[2]=contador diário
+# ARGV: cooldown (s), limite diário, deslocamento UTC do fuso (s)
+# Retorna {bloqueio (0=ok, 1=cooldown, 2=diário), limit, remaining, retry_after}
+COOLDOWN_DAILY_SCRIPT = """
+redis.replicate_commands()
+local cooldown = tonumber(ARGV[1])
+local daily_limit = tonumber(ARGV[2])
+local offset = tonumber(ARGV[3])
+
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', cooldown) then
+    local ttl = redis.call('TTL', KEYS[1])
+    if ttl < 1 then ttl = cooldown end
+    return {1, 1, 0, ttl}
+end
+
+local now = tonumber(redis.call('TIME')[1])
+local until_midnight = 86400 - ((now + offset) % 86400)
+
+local count = redis.call('INCR', KEYS[2])
+local ttl = redis.call('TTL', KEYS[2])
+if ttl < 0 then
+    redis.call('EXPIRE', KEYS[2], until_midnight)
+    ttl = until_midnight
+end
+
+if count <= daily_limit then
+    return {0, daily_limit, daily_limit - count, 0}
+end
+return {2, daily_limit, 0, math.max(ttl, 1)}
+"""
+
+
 # =============================================================================
 # RedisRateLimiter class
 # =============================================================================
 
+@dataclass
+class _TokenLease:
+    """Tokens retirados do GCRA por este worker para uma chave."""
+
+    tokens: int             # ainda não usados
+    remaining: int          # tokens livres no Redis no momento do lease
+    expires_at: float       # time.monotonic()
+    blocked_until: float = 0.0
+
+
 class RedisRateLimiter:
     """
     Rate limiter usando Redis como backend.
@@ -150,13 +259,84 @@ class RedisRateLimiter:
     """
     
     def __init__(self):
-        self._sliding_window_sha: Optional[str] = None
+        self._script_shas: dict[str, str] = {}
+        self._leases: dict[str, _TokenLease] = {}
+        self._leases_lock = threading.Lock()
     
-    def _get_script_sha(self, client: redis.Redis) -> str:
-        """Carrega e cacheia o script Lua."""
-        if self._sliding_window_sha is None:
-            self._sliding_window_sha = client.script_load(SLIDING_WINDOW_SCRIPT)
-        return self._sliding_window_sha
+    def _eval_script(self, client: redis.Redis, script: str, keys: list, args: list):
+        """Executa um script Lua por SHA (carrega e cacheia; recarrega após restart do Redis)."""
+        sha = self._script_shas.get(script)
+        if sha is None:
+            sha = self._script_shas[script] = client.script_load(script)
+        try:
+            return client.evalsha(sha, len(keys), *keys, *args)
+        except redis.exceptions.NoScriptError:
+            self._script_shas[script] = client.script_load(script)
+            return client.evalsha(self._script_shas[script], len(keys), *keys, *args)
+
+    async def _eval_script_async(self, client, script: str, keys: list, args: list):
+        """`_eval_script` para o cliente asyncio (os SHAs são os mesmos)."""
+        sha = self._script_shas.get(script)
+        if sha is None:
+            sha = self._script_shas[script] = await client.script_load(script)
+        try:
+            return await client.evalsha(sha, len(keys), *keys, *args)
+        except redis.exceptions.NoScriptError:
+            self._script_shas[script] = await client.script_load(script)
+            return await client.evalsha(self._script_shas[script], len(keys), *keys, *args)
+
+    @staticmethod
+    def _sliding_window_result(result) -> Tuple[bool, int, int]:
+        return bool(result[0]), int(result[1]), int(result[2])
+
+    @staticmethod
+    def _gcra_result(result) -> Tuple[bool, int, int]:
+        allowed = bool(result[0])
+        retry_after = max(int(result[2]), 1) if not allowed else 0
+        return allowed, int(result[1]), retry_after
+
+    def _take_lease(self, key: str) -> Tuple[Optional[Tuple[bool, int, int]], int]:
+        """
+        Tenta atender pelo lease local da chave.
+
+        Returns:
+            (resultado local ou None se é preciso ir ao Redis, tokens de um
+            lease expirado a devolver)
+        """
+        now = time.monotonic()
+        with self._leases_lock:
+            lease = self._leases.get(key)
+            if lease is None:
+                return None, 0
+            if lease.blocked_until > now:
+                return (False, 0, max(math.ceil(lease.blocked_until - now), 1)), 0
+            if lease.expires_at > now and lease.tokens > 0:
+                lease.tokens -= 1
+                return (True, lease.remaining + lease.tokens, 0), 0
+            if lease.expires_at <= now:
+                returned, lease.tokens = lease.tokens, 0
+                return None, returned
+            return None, 0
+
+    def _gcra_lease_args(self, limit: int, period_seconds: int, returned: int) -> list:
+        want = max(int(limit * settings.RATE_LIMIT_LEASE_FRACTION), 1)
+        return [limit, period_seconds * 1000, int(time.time() * 1000), want, returned]
+
+    def _store_lease(self, key: str, result) -> Tuple[bool, int, int]:
+        """Guarda o lease (ou o bloqueio) retornado por GCRA_LEASE_SCRIPT e consome um token."""
+        granted, remaining, retry_after_ms = (int(v) for v in result)
+        now = time.monotonic()
+        with self._leases_lock:
+            if granted <= 0:
+                blocked_until = now + retry_after_ms / 1000
+                self._leases[key] = _TokenLease(0, 0, blocked_until, blocked_until)
+                return False, 0, max(math.ceil(retry_after_ms / 1000), 1)
+            self._leases[key] = _TokenLease(
+                tokens=granted - 1,
+                remaining=remaining,
+                expires_at=now + settings.RATE_LIMIT_LEASE_SECONDS,
+            )
+            return True, remaining + granted - 1, 0
     
     def check_sliding_window(
         self,
@@ -182,24 +362,138 @@ class RedisRateLimiter:
         
         try:
             now = time.time()
-            script_sha = self._get_script_sha(client)
-            result = client.evalsha(
-                script_sha,
-                1,  # número de keys
-                key,
-                limit,
-                window_seconds,
-                now,
-            )
-            allowed = bool(result[0])
-            remaining = int(result[1])
-            retry_after = int(result[2])
-            return allowed, remaining, retry_after
+            result = self._eval_script(client, SLIDING_WINDOW_SCRIPT, [key], [limit, window_seconds, now])
+            return self._sliding_window_result(result)
         except redis.RedisError as e:
             logger.warning("Redis error em sliding_window: %s", e)
             # Fail-open: permite request se Redis falhar
             return True, limit, 0
     
+    def check_gcra(
+        self,
+        key: str,
+        limit: int,
+        period_seconds: int = 60,
+    ) -> Tuple[bool, int, int]:
+        """
+        Verifica rate limit usando GCRA (mesmo contrato de check_sliding_window).
+        
+        Args:
+            key: Chave Redis para o rate limit
+            limit: Número máximo de requests no período (também a rajada máxima)
+            period_seconds: Período em segundos
+        
+        Returns:
+            (allowed, remaining, retry_after_seconds)
+        """
+        client = get_redis_client()
+        if client is None:
+            return True, limit, 0
+        
+        try:
+            now_ms = int(time.time() * 1000)
+            result = self._eval_script(client, GCRA_SCRIPT, [key], [limit, period_seconds * 1000, now_ms])
+            return self._gcra_result(result)
+        except redis.RedisError as e:
+            logger.warning("Redis error em gcra: %s", e)
+            return True, limit, 0
+
+    def check_gcra_leased(
+        self,
+        key: str,
+        limit: int,
+        period_seconds: int = 60,
+    ) -> Tuple[bool, int, int]:
+        """
+        GCRA com lease local de tokens (mesmo contrato de check_gcra).
+        
+        O worker retira RATE_LIMIT_LEASE_FRACTION do limite de uma vez e
+        atende localmente até o lease acabar ou expirar
+        (RATE_LIMIT_LEASE_SECONDS); sobras de um lease expirado voltam ao
+        Redis no próximo pedido. Bloqueios também ficam em cache local até
+        o horário de liberação.
+        
+        Erro limitado: tokens nunca são usados sem terem sido retirados do
+        GCRA global (sem excesso sobre o limite); no pior caso, cada worker
+        segura até um lease sem uso por RATE_LIMIT_LEASE_SECONDS (bloqueio
+        antecipado de no máximo workers x lease tokens). `remaining` é o
+        valor do último lease menos o uso local.
+        
+        Returns:
+            (allowed, remaining, retry_after_seconds)
+        """
+        local, returned = self._take_lease(key)
+        if local is not None:
+            return local
+        
+        client = get_redis_client()
+        if client is None:
+            return True, limit, 0
+        
+        try:
+            result = self._eval_script(
+                client, GCRA_LEASE_SCRIPT, [key], self._gcra_lease_args(limit, period_seconds, returned)
+            )
+        except redis.RedisError as e:
+            logger.warning("Redis error em gcra_lease: %s", e)
+            return True, limit, 0
+        return self._store_lease(key, result)
+
+    def check_lookup_limit(self, org_id: int, plan: str) -> Tuple[bool, int, int, int]:
+        """
+        Rate limit de lookup por organização com o algoritmo do plano.
+        
+        Returns:
+            (allowed, remaining, retry_after_seconds, limit)
+        """
+        limit = LOOKUP_RATE_LIMITS.get(plan, LOOKUP_RATE_LIMITS["starter"])
+        algorithm = lookup_algorithm(plan)
+        # Chave própria: não colide com o ZSET ao trocar o algoritmo do plano
+        if algorithm == "gcra_lease":
+            allowed, remaining, retry_after = self.check_gcra_leased(f"rl:org:{org_id}:lookup:gcra", limit, 60)
+        elif algorithm == "gcra":
+            allowed, remaining, retry_after = self.check_gcra(f"rl:org:{org_id}:lookup:gcra", limit, 60)
+        else:
+            allowed, remaining, retry_after = self.check_sliding_window(f"rl:org:{org_id}:lookup", limit, 60)
+        return allowed, remaining, retry_after, limit
+
+    async def check_lookup_limit_async(self, org_id: int, plan: str) -> Tuple[bool, int, int, int]:
+        """
+        `check_lookup_limit` pelo cliente asyncio (sem bloquear o event loop).
+        
+        Returns:
+            (allowed, remaining, retry_after_seconds, limit)
+        """
+        limit = LOOKUP_RATE_LIMITS.get(plan, LOOKUP_RATE_LIMITS["starter"])
+        algorithm = lookup_algorithm(plan)
+        if algorithm == "sliding_window":
+            key = f"rl:org:{org_id}:lookup"
+            script, args = SLIDING_WINDOW_SCRIPT, [limit, 60, time.time()]
+        else:
+            key = f"rl:org:{org_id}:lookup:gcra"
+            if algorithm == "gcra_lease":
+                local, returned = self._take_lease(key)
+                if local is not None:
+                    return (*local, limit)
+                script, args = GCRA_LEASE_SCRIPT, self._gcra_lease_args(limit, 60, returned)
+            else:
+                script, args = GCRA_SCRIPT, [limit, 60 * 1000, int(time.time() * 1000)]
+
+        client = get_async_redis_client()
+        if client is None:
+            return True, limit, 0, limit
+        try:
+            result = await self._eval_script_async(client, script, [key], args)
+        except redis.RedisError as e:
+            logger.warning("Redis error em %s: %s", algorithm, e)
+            return True, limit, 0, limit
+
+        if algorithm == "gcra_lease":
+            return (*self._store_lease(key, result), limit)
+        if algorithm == "gcra":
+            return (*self._gcra_result(result), limit)
+        return (*self._sliding_window_result(result), limit)
+
     def check_cooldown(
         self,
         key: str,
@@ -236,40 +530,53 @@ class RedisRateLimiter:
             logger.warning("Redis error em cooldown: %s", e)
             return True, 0
 
-    def check_daily_limit_until_midnight(
+    async def check_cooldown_async(self, key: str, cooldown_seconds: int) -> Tuple[bool, int]:
+        """`check_cooldown` pelo cliente asyncio."""
+        client = get_async_redis_client()
+        if client is None:
+            return True, 0
+
+        try:
+            if await client.set(key, "1", nx=True, ex=cooldown_seconds):
+                return True, 0
+            ttl = await client.ttl(key)
+            return False, (max(ttl, 1) if ttl > 0 else cooldown_seconds)
+        except redis.RedisError as e:
+            logger.warning("Redis error em cooldown: %s", e)
+            return True, 0
+
+    def check_cooldown_and_daily_limit(
         self,
-        key: str,
+        cooldown_key: str,
+        cooldown_seconds: int,
+        daily_key: str,
         daily_limit: int,
-    ) -> Tuple[bool, int, int]:
+    ) -> Tuple[Optional[str], int, int, int]:
         """
-        Limite diário com reset na meia-noite de São Paulo.
+        Cooldown + limite diário com reset na meia-noite de São Paulo, em
+        uma única ida ao Redis. O contador diário só é incrementado se o
+        cooldown permitir.
 
         Returns:
-            (allowed, remaining, retry_after_seconds)
+            (bloqueio, limit, remaining, retry_after_seconds); bloqueio é
+            None (permitido), "cooldown" ou "daily"
         """
         client = get_redis_client()
         if client is None:
-            return True, daily_limit, 0
+            return None, daily_limit, daily_limit, 0
 
         try:
-            count = client.incr(key)
-            if count == 1:
-                client.expire(key, _seconds_until_midnight_sao_paulo())
-
-            if count <= daily_limit:
-                remaining = max(daily_limit - int(count), 0)
-                return True, remaining, 0
-
-            ttl = client.ttl(key)
-            retry_after = (
-                max(int(ttl), 1)
-                if ttl and ttl > 0
-                else _seconds_until_midnight_sao_paulo()
+            blocked, limit, remaining, retry_after = self._eval_script(
+                client,
+                COOLDOWN_DAILY_SCRIPT,
+                [cooldown_key, daily_key],
+                [cooldown_seconds, daily_limit, _utc_offset_seconds_sao_paulo()],
             )
-            return False, 0, retry_after
+            reason = {1: "cooldown", 2: "daily"}.get(int(blocked))
+            return reason, int(limit), int(remaining), int(retry_after)
         except redis.RedisError as e:
-            logger.warning("Redis error em daily_limit: %s", e)
-            return True, daily_limit, 0
+            logger.warning("Redis error em cooldown/daily_limit: %s", e)
+            return None, daily_limit, daily_limit, 0
 
 
 # Singleton do rate limiter
@@ -326,30 +633,23 @@ def check_public_rate_limit(request: Request) -> str:
     """
     ip = get_client_ip(request)
 
-    # 1) Cooldown (delay) por IP
-    cooldown_key = f"rl:ip:{ip}:public:cooldown"
-    allowed, retry_after = redis_rate_limiter.check_cooldown(
-        key=cooldown_key,
+    # Cooldown (delay) + limite diário até a meia-noite (America/Sao_Paulo)
+    blocked, limit, remaining, retry_after = redis_rate_limiter.check_cooldown_and_daily_limit(
+        cooldown_key=f"rl:ip:{ip}:public:cooldown",
         cooldown_seconds=PUBLIC_COOLDOWN_SECONDS,
+        daily_key=f"rl:ip:{ip}:public:daily",
+        daily_limit=PUBLIC_DAILY_LIMIT,
     )
-    if not allowed:
+    if blocked == "cooldown":
         _raise_rate_limit_exceeded(
-            limit=1,
-            remaining=0,
+            limit=limit,
+            remaining=remaining,
             retry_after=retry_after,
             message="Acesso público é limitado. Aguarde alguns segundos ou crie uma conta para acesso completo.",
         )
-
-    # 2) Limite diário até a meia-noite (America/Sao_Paulo)
-    daily_key = f"rl:ip:{ip}:public:daily"
-    allowed, remaining, retry_after = redis_rate_limiter.check_daily_limit_until_midnight(
-        key=daily_key,
-        daily_limit=PUBLIC_DAILY_LIMIT,
-    )
-
-    if not allowed:
+    if blocked == "daily":
         _raise_rate_limit_exceeded(
-            limit=PUBLIC_DAILY_LIMIT,
+            limit=limit,
             remaining=remaining,
             retry_after=retry_after,
             message="Você atingiu o limite diário do endpoint público. Assine um plano para acesso completo à API.",
@@ -391,15 +691,8 @@ def check_org_rate_limit_lookup(request: Request) -> None:
     
     org = auth.organization
     plan = org.plan
-    limit = LOOKUP_RATE_LIMITS.get(plan, LOOKUP_RATE_LIMITS["starter"])
-    
-    key = f"rl:org:{org.id}:lookup"
     
-    allowed, remaining, retry_after = redis_rate_limiter.check_sliding_window(
-        key=key,
-        limit=limit,
-        window_seconds=60,
-    )
+    allowed, remaining, retry_after, limit = redis_rate_limiter.check_lookup_limit(org.id, plan)
     
     if not allowed:
         _raise_rate_limit_exceeded(
@@ -472,15 +765,8 @@ def get_rate_limit_lookup_dependency():
         
         org = auth.organization
         plan = org.plan
-        limit = LOOKUP_RATE_LIMITS.get(plan, LOOKUP_RATE_LIMITS["starter"])
-        
-        key = f"rl:org:{org.id}:lookup"
         
-        allowed, remaining, retry_after = redis_rate_limiter.check_sliding_window(
-            key=key,
-            limit=limit,
-            window_seconds=60,
-        )
+        allowed, remaining, retry_after, limit = await redis_rate_limiter.check_lookup_limit_async(org.id, plan)
         
         if not allowed:
             _raise_rate_limit_exceeded(
@@ -516,7 +802,7 @@ def get_rate_limit_search_dependency():
         
         key = f"rl:org:{org.id}:search"
         
-        allowed, retry_after = redis_rate_limiter.check_cooldown(
+        allowed, retry_after = await redis_rate_limiter.check_cooldown_async(
             key=key,
             cooldown_seconds=cooldown,
         )
@@ -0,0 +1,288 @@
+"""
+Clientes Redis (sync e asyncio) com pool e circuit breaker.
+===========================================================
+- Um pool de conexões por processo para cada cliente, limitado por
+  REDIS_MAX_CONNECTIONS; pool esgotado falha na hora (sem fila), e o
+  chamador segue o caminho fail-open. Pool esgotado é sobrecarga local, não
+  falha do Redis: não conta para o circuit breaker.
+- Conexões ociosas são verificadas (PING) a cada REDIS_HEALTH_CHECK_SECONDS
+  antes do uso; conexões quebradas são descartadas e recriadas pelo pool.
+- Circuit breaker compartilhado pelos dois clientes: após
+  REDIS_BREAKER_FAILURE_THRESHOLD falhas de conexão/timeout seguidas ele
+  abre, e `get_redis_client`/`get_async_redis_client` retornam None (todos
+  os usos já tratam None como Redis indisponível) sem esperar timeouts.
+  Depois de REDIS_BREAKER_RESET_SECONDS, uma chamada de teste decide se
+  fecha de novo. Comandos avulsos e pipelines alimentam o breaker.
+- O cliente asyncio é o usado nas dependencies `async def` (rate limit), que
+  não podem bloquear o event loop.
+
+Métricas em `redis_stats()` (exposto em /health/redis).
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de três estados (closed → open → half_open → closed).
+
+    Só falhas de conexão/timeout contam; erros de comando (ResponseError,
+    NOSCRIPT) indicam um Redis saudável.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_started_at = 0.0
+        self._failures = 0
+        self._opens = 0
+        self._short_circuited = 0
+        self._pool_exhausted = 0
+
+    def allow(self) -> bool:
+        """True se uma chamada ao Redis pode ser feita agora."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if self.state == "open" and now - self._opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._trial_started_at = now
+                return True
+            if self.state == "half_open" and now - self._trial_started_at >= self.reset_seconds:
+                # Chamada de teste anterior não reportou resultado
+                self._trial_started_at = now
+                return True
+            self._short_circuited += 1
+            return False
+
+    def record_success(self) -> None:
+        if self.state == "closed" and not self._consecutive_failures:
+            return
+        with self._lock:
+            if self.state != "closed":
+                logger.info("Redis circuit breaker fechado")
+            self.state = "closed"
+            self._consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._consecutive_failures += 1
+            if self.state == "half_open" or (
+                self.state == "closed" and self._consecutive_failures >= self.failure_threshold
+            ):
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._opens += 1
+                logger.warning(
+                    "Redis circuit breaker aberto após %d falha(s); fail-open por %ss",
+                    self._consecutive_failures,
+                    self.reset_seconds,
+                )
+
+    def record_pool_exhausted(self) -> None:
+        """Pool local sem conexão livre: só métrica, não abre o breaker."""
+        with self._lock:
+            self._pool_exhausted += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._consecutive_failures,
+                "failures": self._failures,
+                "opens": self._opens,
+                "short_circuited": self._short_circuited,
+                "pool_exhausted": self._pool_exhausted,
+            }
+
+
+redis_breaker = CircuitBreaker(
+    failure_threshold=settings.REDIS_BREAKER_FAILURE_THRESHOLD,
+    reset_seconds=settings.REDIS_BREAKER_RESET_SECONDS,
+)
+
+_CONNECTION_ERRORS = (redis.ConnectionError, redis.TimeoutError)
+# Mensagem do ConnectionError dos pools (sync e asyncio) sem conexão livre
+_POOL_EXHAUSTED_MESSAGE = "Too many connections"
+
+
+def _record_error(exc: Exception) -> None:
+    if isinstance(exc, redis.ConnectionError) and str(exc) == _POOL_EXHAUSTED_MESSAGE:
+        redis_breaker.record_pool_exhausted()
+    else:
+        redis_breaker.record_failure()
+
+
+class _BreakerPipeline(redis.client.Pipeline):
+    """Pipeline síncrono que reporta o resultado do execute ao breaker."""
+
+    def execute(self, raise_on_error: bool = True):
+        try:
+            result = super().execute(raise_on_error)
+        except _CONNECTION_ERRORS as e:
+            _record_error(e)
+            raise
+        redis_breaker.record_success()
+        return result
+
+
+class _BreakerAsyncPipeline(aioredis.client.Pipeline):
+    """Pipeline asyncio que reporta o resultado do execute ao breaker."""
+
+    async def execute(self, raise_on_error: bool = True):
+        try:
+            result = await super().execute(raise_on_error)
+        except _CONNECTION_ERRORS as e:
+            _record_error(e)
+            raise
+        redis_breaker.record_success()
+        return result
+
+
+class _BreakerRedis(redis.Redis):
+    """redis.Redis que reporta o resultado de cada comando e pipeline ao breaker."""
+
+    def execute_command(self, *args, **options):
+        try:
+            result = super().execute_command(*args, **options)
+        except _CONNECTION_ERRORS as e:
+            _record_error(e)
+            raise
+        redis_breaker.record_success()
+        return result
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> _BreakerPipeline:
+        return _BreakerPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class _BreakerAsyncRedis(aioredis.Redis):
+    """redis.asyncio.Redis que reporta o resultado de cada comando e pipeline ao breaker."""
+
+    async def execute_command(self, *args, **options):
+        try:
+            result = await super().execute_command(*args, **options)
+        except _CONNECTION_ERRORS as e:
+            _record_error(e)
+            raise
+        redis_breaker.record_success()
+        return result
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> _BreakerAsyncPipeline:
+        return _BreakerAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def _pool_kwargs() -> dict:
+    return {
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "decode_responses": True,
+        "socket_connect_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_SECONDS,
+    }
+
+
+# =============================================================================
+# Cliente síncrono (threads: workers, flushers, dependencies sync)
+# =============================================================================
+
+_redis_client: Optional[redis.Redis] = None
+_redis_client_lock = threading.Lock()
+
+
+def get_redis_client() -> Optional[redis.Redis]:
+    """
+    Retorna o cliente Redis síncrono do processo.
+    Retorna None se Redis estiver desabilitado ou com o circuit breaker aberto.
+    """
+    global _redis_client
+
+    if not settings.REDIS_ENABLED or not redis_breaker.allow():
+        return None
+
+    if _redis_client is None:
+        with _redis_client_lock:
+            if _redis_client is None:
+                pool = redis.ConnectionPool.from_url(settings.REDIS_URL, **_pool_kwargs())
+                _redis_client = _BreakerRedis(connection_pool=pool)
+                logger.info("Redis configurado: %s", settings.REDIS_URL.split("@")[-1])
+    return _redis_client
+
+
+# =============================================================================
+# Cliente asyncio (event loop)
+# =============================================================================
+
+_async_client: Optional[aioredis.Redis] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_async_redis_client() -> Optional[aioredis.Redis]:
+    """
+    Retorna o cliente Redis asyncio do event loop atual (um pool por loop).
+    Retorna None se Redis estiver desabilitado ou com o circuit breaker aberto.
+    """
+    global _async_client, _async_client_loop
+
+    if not settings.REDIS_ENABLED or not redis_breaker.allow():
+        return None
+
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        pool = aioredis.ConnectionPool.from_url(settings.REDIS_URL, **_pool_kwargs())
+        _async_client = _BreakerAsyncRedis(connection_pool=pool)
+        _async_client_loop = loop
+    return _async_client
+
+
+async def close_async_redis_client() -> None:
+    """Fecha o pool asyncio (shutdown)."""
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        try:
+            await _async_client.aclose()
+        except Exception as e:
+            logger.warning("Erro ao fechar cliente Redis asyncio: %s", e)
+    _async_client = None
+    _async_client_loop = None
+
+
+def _pool_stats(client) -> Optional[dict]:
+    if client is None:
+        return None
+    pool = client.connection_pool
+    in_use = len(getattr(pool, "_in_use_connections", ()))
+    idle = len(getattr(pool, "_available_connections", ()))
+    max_connections = pool.max_connections
+    return {
+        "max_connections": max_connections,
+        "in_use": in_use,
+        "idle": idle,
+        "saturation": round(in_use / max_connections, 4) if max_connections else None,
+    }
+
+
+def redis_stats() -> dict:
+    """Estado do breaker e ocupação dos pools deste processo."""
+    return {
+        "enabled": settings.REDIS_ENABLED,
+        "breaker": redis_breaker.stats(),
+        "sync_pool": _pool_stats(_redis_client),
+        "async_pool": _pool_stats(_async_client),
+    }
@@ -0,0 +1,73 @@
+"""
+Cursor opaco e assinado da busca de produtos.
+=============================================
+GET /v1/gtins/search pagina por keyset: cada página termina em um cursor
+com a posição da última linha (`gtin` em postgres/pgfts; similaridade e
+`gtin` em trgm), e a próxima consulta filtra a partir dela em vez de pular
+linhas com OFFSET. Em postgres/pgfts o keyset é servido por índice e o
+custo por página não cresce com a profundidade. Em trgm a similaridade é
+calculada na consulta: toda página ranqueia e ordena todos os resultados
+do filtro, e o cursor só evita devolver as linhas já vistas.
+
+O cursor é `base64url(json).base64url(hmac)`: o cliente não consegue
+forjar posições, e o resumo dos filtros embutido impede reaproveitar um
+cursor com outros filtros ou outro backend.
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+
+from app.core.config import settings
+
+
+class InvalidCursor(ValueError):
+    """Cursor malformado, com assinatura inválida ou de outra busca."""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _signature(body: bytes) -> bytes:
+    key = (settings.SEARCH_CURSOR_SECRET or settings.JWT_SECRET_KEY).encode()
+    return hmac.new(key, body, hashlib.sha256).digest()[:16]
+
+
+def search_fingerprint(backend: str, *filters: str | None) -> str:
+    """Resumo curto do backend e dos filtros normalizados da busca."""
+    raw = json.dumps([backend, *filters], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def encode_cursor(fingerprint: str, position: dict) -> str:
+    """Serializa e assina a posição (`{"g": gtin}`, `{"r": rank, "g": gtin}` ou `{"o": offset}`)."""
+    body = json.dumps({"f": fingerprint, **position}, separators=(",", ":")).encode()
+    return f"{_b64encode(body)}.{_b64encode(_signature(body))}"
+
+
+def decode_cursor(cursor: str, fingerprint: str) -> dict:
+    """
+    Valida e decodifica um cursor gerado por `encode_cursor`.
+
+    Raises:
+        InvalidCursor: formato, assinatura ou filtros não conferem
+    """
+    try:
+        body_b64, signature_b64 = cursor.split(".", 1)
+        body = _b64decode(body_b64)
+        signature = _b64decode(signature_b64)
+    except (ValueError, binascii.Error):
+        raise InvalidCursor("Cursor inválido.")
+    if not hmac.compare_digest(signature, _signature(body)):
+        raise InvalidCursor("Cursor inválido.")
+    position = json.loads(body)
+    if position.pop("f", None) != fingerprint:
+        raise InvalidCursor("Cursor não corresponde aos filtros desta busca.")
+    return position
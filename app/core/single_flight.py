@@ -0,0 +1,200 @@
+"""
+Single-flight (coalescência de requisições) por chave.
+======================================================
+Quando várias requisições do mesmo worker pedem a mesma chave ao mesmo
+tempo (produto viral, tempestade de retries de uma integração), só a
+primeira (líder) executa a carga; as demais aguardam o resultado dela.
+
+Funciona por chave dentro de lotes: uma requisição carrega, em uma única
+chamada, apenas as chaves que ninguém está carregando e aguarda as outras.
+
+- `load_many`: threads (rotas `def`, workers em background).
+- `load_many_async`: corrotinas do event loop (rotas `async def`).
+
+Se o líder falhar (erro, cancelamento) ou demorar mais que `wait_timeout`,
+quem aguardava carrega por conta própria: a coalescência nunca transforma
+a falha de uma requisição em falha das outras.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, wait
+from typing import Any, Awaitable, Callable, Hashable, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalescência por chave com contadores (ver `stats`)."""
+
+    def __init__(self, wait_timeout: float):
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._inflight: dict[Hashable, Future] = {}
+        self._inflight_async: dict[Hashable, asyncio.Future] = {}
+        self.leader_keys = 0
+        self.coalesced_keys = 0
+        self.fallback_keys = 0
+        self.max_waiters = 0
+        self._waiters: dict[Hashable, int] = {}
+
+    def _count(self, leaders: int = 0, coalesced: int = 0, fallback: int = 0) -> None:
+        with self._lock:
+            self.leader_keys += leaders
+            self.coalesced_keys += coalesced
+            self.fallback_keys += fallback
+
+    def _add_waiters(self, keys: Iterable[Hashable]) -> None:
+        with self._lock:
+            for key in keys:
+                waiters = self._waiters.get(key, 0) + 1
+                self._waiters[key] = waiters
+                self.max_waiters = max(self.max_waiters, waiters)
+
+    def _drop_waiters(self, keys: Iterable[Hashable]) -> None:
+        with self._lock:
+            for key in keys:
+                waiters = self._waiters.get(key, 0) - 1
+                if waiters > 0:
+                    self._waiters[key] = waiters
+                else:
+                    self._waiters.pop(key, None)
+
+    # -------------------------------------------------------------------------
+    # Threads
+    # -------------------------------------------------------------------------
+
+    def load_many(
+        self,
+        keys: list[Hashable],
+        loader: Callable[[list[Hashable]], dict[Hashable, Any]],
+    ) -> dict[Hashable, Any]:
+        """
+        Carrega `keys` com `loader`, coalescendo com cargas em andamento
+        das mesmas chaves.
+
+        Args:
+            loader: Recebe as chaves a carregar; retorna apenas as encontradas
+
+        Returns:
+            Mapa chave -> valor (somente encontradas), como o `loader`.
+        """
+        own: dict[Hashable, Future] = {}
+        waiting: dict[Hashable, Future] = {}
+        with self._lock:
+            for key in keys:
+                future = self._inflight.get(key)
+                if future is None:
+                    own[key] = self._inflight[key] = Future()
+                else:
+                    waiting[key] = future
+        self._count(leaders=len(own), coalesced=len(waiting))
+
+        found: dict[Hashable, Any] = {}
+        if own:
+            try:
+                found = loader(list(own))
+            except BaseException as exc:
+                # set_exception acorda quem espera (cancel() não acorda wait())
+                for future in own.values():
+                    future.set_exception(exc)
+                raise
+            else:
+                for key, future in own.items():
+                    future.set_result(found.get(key))
+            finally:
+                with self._lock:
+                    for key, future in own.items():
+                        if self._inflight.get(key) is future:
+                            del self._inflight[key]
+
+        if waiting:
+            self._add_waiters(waiting)
+            try:
+                wait(waiting.values(), timeout=self.wait_timeout)
+            finally:
+                self._drop_waiters(waiting)
+            retry = []
+            for key, future in waiting.items():
+                if future.done() and future.exception() is None:
+                    value = future.result()
+                    if value is not None:
+                        found[key] = value
+                else:
+                    retry.append(key)
+            if retry:
+                self._count(fallback=len(retry))
+                found.update(loader(retry))
+        return found
+
+    # -------------------------------------------------------------------------
+    # asyncio
+    # -------------------------------------------------------------------------
+
+    async def load_many_async(
+        self,
+        keys: list[Hashable],
+        loader: Callable[[list[Hashable]], Awaitable[dict[Hashable, Any]]],
+    ) -> dict[Hashable, Any]:
+        """`load_many` para corrotinas (`loader` é uma corrotina)."""
+        loop = asyncio.get_running_loop()
+        own: dict[Hashable, asyncio.Future] = {}
+        waiting: dict[Hashable, asyncio.Future] = {}
+        for key in keys:
+            future = self._inflight_async.get(key)
+            if future is None or future.get_loop() is not loop:
+                own[key] = self._inflight_async[key] = loop.create_future()
+            else:
+                waiting[key] = future
+        self._count(leaders=len(own), coalesced=len(waiting))
+
+        found: dict[Hashable, Any] = {}
+        if own:
+            try:
+                found = await loader(list(own))
+            except BaseException:
+                for future in own.values():
+                    future.cancel()
+                raise
+            else:
+                for key, future in own.items():
+                    future.set_result(found.get(key))
+            finally:
+                for key, future in own.items():
+                    if self._inflight_async.get(key) is future:
+                        del self._inflight_async[key]
+
+        if waiting:
+            self._add_waiters(waiting)
+            try:
+                # asyncio.wait não propaga erro/cancelamento do líder (só o nosso)
+                await asyncio.wait(set(waiting.values()), timeout=self.wait_timeout)
+            finally:
+                self._drop_waiters(waiting)
+            retry = []
+            for key, future in waiting.items():
+                if future.done() and not future.cancelled():
+                    value = future.result()
+                    if value is not None:
+                        found[key] = value
+                else:
+                    retry.append(key)
+            if retry:
+                self._count(fallback=len(retry))
+                found.update(await loader(retry))
+        return found
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.leader_keys + self.coalesced_keys
+            return {
+                "wait_timeout": self.wait_timeout,
+                "inflight": len(self._inflight) + len(self._inflight_async),
+                "leader_keys": self.leader_keys,
+                "coalesced_keys": self.coalesced_keys,
+                "coalesced_ratio": round(self.coalesced_keys / total, 4) if total else None,
+                "fallback_keys": self.fallback_keys,
+                "waiting_now": sum(self._waiters.values()),
+                "max_waiters_per_key": self.max_waiters,
+            }
@@ -2,16 +2,40 @@
 Serviço de registro de uso de API Keys.
 =======================================
 Registra chamadas de API por dia com contagem de sucesso/erro.
+
+Com USAGE_WRITE_BEHIND_ENABLED, `record_api_usage` e
+`record_org_usage_monthly` só incrementam o buffer de app.core.usage_buffer
+(gravado em lote periodicamente) e não usam a sessão. As variantes `_batch`
+continuam gravando na transação do chamador (ex.: checkpoint de jobs em lote).
+
+Endpoints consomem cota por reserva (`reserve_usage`): N unidades são
+reservadas atomicamente no contador do Redis (app.core.quota) antes da
+consulta e, ao final, `commit` registra o uso efetivo e devolve o que
+sobrou. Sem Redis, a reserva vira a verificação pelo banco (sem proteção
+contra requisições concorrentes).
+
+Rotas `async def` usam `reserve_usage_async` e os métodos `_async` da
+reserva (AsyncSession e cliente Redis asyncio).
 """
 
+from dataclasses import dataclass
 from datetime import date, datetime
+import logging
 import pytz
 
+import redis
+
 from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from fastapi import HTTPException, status
 
+from app.core.config import settings
+from app.core import quota, usage_buffer
+
+logger = logging.getLogger(__name__)
+
 
 # Fuso horário de São Paulo
 SAO_PAULO_TZ = pytz.timezone("America/Sao_Paulo")
@@ -53,6 +77,10 @@ def record_api_usage(
     """
     today = get_today_sao_paulo()
     is_success = 200 <= status_code < 300
+
+    if settings.USAGE_WRITE_BEHIND_ENABLED:
+        usage_buffer.add_usage("key", api_key_id, today, int(is_success), int(not is_success))
+        return
     
     # Usar upsert com ON CONFLICT para garantir atomicidade
     if is_success:
@@ -73,6 +101,32 @@ def record_api_usage(
     db.execute(query, {"api_key_id": api_key_id, "usage_date": today})
 
 
+_API_USAGE_BATCH_UPSERT = text("""
+    INSERT INTO api_key_usage_daily (api_key_id, usage_date, success_count, error_count)
+    VALUES (:api_key_id, :usage_date, :success_count, :error_count)
+    ON CONFLICT (api_key_id, usage_date)
+    DO UPDATE SET 
+        success_count = api_key_usage_daily.success_count + :success_count,
+        error_count = api_key_usage_daily.error_count + :error_count
+""")
+
+_ORG_USAGE_MONTHLY_BATCH_UPSERT = text("""
+    INSERT INTO organization_usage_monthly (organization_id, usage_month, success_count, error_count)
+    VALUES (:organization_id, :usage_month, :success_count, :error_count)
+    ON CONFLICT (organization_id, usage_month)
+    DO UPDATE SET
+        success_count = organization_usage_monthly.success_count + :success_count,
+        error_count = organization_usage_monthly.error_count + :error_count
+""")
+
+_ORG_MONTHLY_USAGE_QUERY = text("""
+    SELECT COALESCE(success_count, 0) AS total
+    FROM organization_usage_monthly
+    WHERE organization_id = :org_id
+      AND usage_month = :usage_month
+""")
+
+
 def record_api_usage_batch(
     db: Session,
     api_key_id: int,
@@ -86,16 +140,7 @@ def record_api_usage_batch(
     """
     today = get_today_sao_paulo()
     
-    query = text("""
-        INSERT INTO api_key_usage_daily (api_key_id, usage_date, success_count, error_count)
-        VALUES (:api_key_id, :usage_date, :success_count, :error_count)
-        ON CONFLICT (api_key_id, usage_date)
-        DO UPDATE SET 
-            success_count = api_key_usage_daily.success_count + :success_count,
-            error_count = api_key_usage_daily.error_count + :error_count
-    """)
-    
-    db.execute(query, {
+    db.execute(_API_USAGE_BATCH_UPSERT, {
         "api_key_id": api_key_id,
         "usage_date": today,
         "success_count": success_count,
@@ -140,6 +185,10 @@ def record_org_usage_monthly(
     success_inc = 1 if is_success else 0
     error_inc = 0 if is_success else 1
 
+    if settings.USAGE_WRITE_BEHIND_ENABLED:
+        usage_buffer.add_usage("org", organization_id, usage_month, success_inc, error_inc)
+        return
+
     query = text("""
         INSERT INTO organization_usage_monthly (organization_id, usage_month, success_count, error_count)
         VALUES (:organization_id, :usage_month, :success_inc, :error_inc)
@@ -172,16 +221,7 @@ def record_org_usage_monthly_batch(
 
     usage_month = get_current_month_start_sao_paulo()
 
-    query = text("""
-        INSERT INTO organization_usage_monthly (organization_id, usage_month, success_count, error_count)
-        VALUES (:organization_id, :usage_month, :success_count, :error_count)
-        ON CONFLICT (organization_id, usage_month)
-        DO UPDATE SET
-            success_count = organization_usage_monthly.success_count + :success_count,
-            error_count = organization_usage_monthly.error_count + :error_count
-    """)
-
-    db.execute(query, {
+    db.execute(_ORG_USAGE_MONTHLY_BATCH_UPSERT, {
         "organization_id": organization_id,
         "usage_month": usage_month,
         "success_count": success_count,
@@ -192,14 +232,274 @@ def record_org_usage_monthly_batch(
 def get_organization_monthly_usage(db: Session, organization_id: int) -> int:
     """
     Retorna o total de chamadas de sucesso da organização no mês corrente (America/Sao_Paulo).
-    Apenas sucessos são contados para limites de uso.
+    Apenas sucessos são contados para limites de uso. Inclui os incrementos
+    ainda não gravados pelo write-behind.
     """
     usage_month = get_current_month_start_sao_paulo()
-    query = text("""
-        SELECT COALESCE(success_count, 0) AS total
-        FROM organization_usage_monthly
-        WHERE organization_id = :org_id
-          AND usage_month = :usage_month
-    """)
-    total = db.execute(query, {"org_id": organization_id, "usage_month": usage_month}).scalar()
-    return int(total or 0)
\ No newline at end of file
+    params = {"org_id": organization_id, "usage_month": usage_month}
+    total = int(db.execute(_ORG_MONTHLY_USAGE_QUERY, params).scalar() or 0)
+    if settings.USAGE_WRITE_BEHIND_ENABLED:
+        total += usage_buffer.pending_org_success(organization_id, usage_month)
+    return total
+
+
+async def get_organization_monthly_usage_async(db: AsyncSession, organization_id: int) -> int:
+    """`get_organization_monthly_usage` com AsyncSession."""
+    usage_month = get_current_month_start_sao_paulo()
+    params = {"org_id": organization_id, "usage_month": usage_month}
+    total = int((await db.execute(_ORG_MONTHLY_USAGE_QUERY, params)).scalar() or 0)
+    if settings.USAGE_WRITE_BEHIND_ENABLED:
+        total += await usage_buffer.pending_org_success_async(organization_id, usage_month)
+    return total
+
+
+# =============================================================================
+# Reservas de cota mensal
+# =============================================================================
+
+
+def _record_usage(
+    db: Session,
+    organization_id: int,
+    api_key_id: int,
+    success_count: int,
+    error_count: int,
+) -> None:
+    """Registra uso de org e key (buffer do write-behind ou upsert direto)."""
+    if not success_count and not error_count:
+        return
+    if settings.USAGE_WRITE_BEHIND_ENABLED:
+        usage_buffer.add_usage("org", organization_id, get_current_month_start_sao_paulo(), success_count, error_count)
+        usage_buffer.add_usage("key", api_key_id, get_today_sao_paulo(), success_count, error_count)
+        return
+    record_org_usage_monthly_batch(db, organization_id, success_count, error_count)
+    record_api_usage_batch(db, api_key_id, success_count, error_count)
+
+
+async def _record_usage_async(
+    db: AsyncSession,
+    organization_id: int,
+    api_key_id: int,
+    success_count: int,
+    error_count: int,
+) -> None:
+    """`_record_usage` com AsyncSession e cliente Redis asyncio."""
+    if not success_count and not error_count:
+        return
+    usage_month, usage_date = get_current_month_start_sao_paulo(), get_today_sao_paulo()
+    if settings.USAGE_WRITE_BEHIND_ENABLED:
+        await usage_buffer.add_usage_async("org", organization_id, usage_month, success_count, error_count)
+        await usage_buffer.add_usage_async("key", api_key_id, usage_date, success_count, error_count)
+        return
+    counts = {"success_count": success_count, "error_count": error_count}
+    await db.execute(
+        _ORG_USAGE_MONTHLY_BATCH_UPSERT,
+        {"organization_id": organization_id, "usage_month": usage_month, **counts},
+    )
+    await db.execute(_API_USAGE_BATCH_UPSERT, {"api_key_id": api_key_id, "usage_date": usage_date, **counts})
+
+
+@dataclass
+class UsageReservation:
+    """
+    Unidades de cota reservadas por uma requisição. Liquidada uma única vez
+    com `commit` (uso efetivo), `settle` (uma unidade, pelo status HTTP) ou
+    `release` (nada é contabilizado).
+    """
+
+    organization_id: int
+    api_key_id: int
+    units: int
+    usage_month: date
+    usage_date: date
+    counted: bool = False    # unidades somadas ao contador do Redis
+    journaled: bool = False  # unidades já registradas como sucesso no journal
+    settled: bool = False
+
+    def _journal_fields(self, is_success: bool) -> list[str]:
+        return [
+            usage_buffer.journal_field("org", self.organization_id, self.usage_month, is_success),
+            usage_buffer.journal_field("key", self.api_key_id, self.usage_date, is_success),
+        ]
+
+    def _plan_commit(
+        self, success_count: int, error_count: int
+    ) -> tuple[int, list[tuple[str, int]], int, int]:
+        """
+        Marca a reserva como liquidada e calcula os efeitos do commit.
+
+        Returns:
+            (delta do contador, deltas do journal, sucessos e erros a
+            registrar pelo write-behind/banco)
+        """
+        self.settled = True
+        success_count = min(success_count, self.units)
+        refund = self.units - success_count
+
+        if self.journaled:
+            # O script já registrou `units` sucessos: uma chamada corrige a diferença
+            journal = [(f, -refund) for f in self._journal_fields(True)] if refund else []
+            if error_count:
+                journal += [(f, error_count) for f in self._journal_fields(False)]
+            return -refund, journal, 0, 0
+
+        counter_delta = -refund if self.counted else 0
+        return counter_delta, [], success_count, error_count
+
+    def _plan_release(self) -> tuple[int, list[tuple[str, int]]]:
+        self.settled = True
+        if self.journaled:
+            return -self.units, [(f, -self.units) for f in self._journal_fields(True)]
+        return (-self.units if self.counted else 0), []
+
+    def commit(self, db: Session, success_count: int, error_count: int = 0) -> None:
+        """
+        Registra o uso efetivo: `success_count` unidades (até o reservado)
+        consomem cota; o restante é devolvido. Erros só entram nas métricas.
+        """
+        if self.settled:
+            return
+        counter_delta, journal, success_count, error_count = self._plan_commit(success_count, error_count)
+        quota.adjust(self.organization_id, self.usage_month, counter_delta, journal)
+        _record_usage(db, self.organization_id, self.api_key_id, success_count, error_count)
+
+    async def commit_async(self, db: AsyncSession, success_count: int, error_count: int = 0) -> None:
+        """`commit` com AsyncSession e cliente Redis asyncio."""
+        if self.settled:
+            return
+        counter_delta, journal, success_count, error_count = self._plan_commit(success_count, error_count)
+        await quota.adjust_async(self.organization_id, self.usage_month, counter_delta, journal)
+        await _record_usage_async(db, self.organization_id, self.api_key_id, success_count, error_count)
+
+    def settle(self, db: Session, status_code: int) -> None:
+        """Liquida uma reserva de uma unidade: 2xx consome, outros contam como erro."""
+        if 200 <= status_code < 300:
+            self.commit(db, success_count=1)
+        else:
+            self.commit(db, success_count=0, error_count=1)
+
+    async def settle_async(self, db: AsyncSession, status_code: int) -> None:
+        """`settle` com AsyncSession."""
+        if 200 <= status_code < 300:
+            await self.commit_async(db, success_count=1)
+        else:
+            await self.commit_async(db, success_count=0, error_count=1)
+
+    def release(self) -> None:
+        """Devolve toda a reserva sem registrar uso (requisição não contabilizada)."""
+        if self.settled:
+            return
+        quota.adjust(self.organization_id, self.usage_month, *self._plan_release())
+
+    async def release_async(self) -> None:
+        """`release` pelo cliente Redis asyncio."""
+        if self.settled:
+            return
+        await quota.adjust_async(self.organization_id, self.usage_month, *self._plan_release())
+
+
+def _raise_monthly_limit_exceeded(monthly_limit: int, used_month: int, units: int) -> None:
+    remaining = max(monthly_limit - used_month, 0)
+    if units == 1:
+        detail = f"Limite mensal excedido. Restam {remaining} de {monthly_limit} chamadas para este mês."
+    else:
+        detail = (
+            f"Limite mensal excedido. Esta requisição precisa de {units} consultas, "
+            f"mas restam apenas {remaining} de {monthly_limit} para este mês."
+        )
+    raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=detail)
+
+
+def _new_reservation(organization, api_key_id: int, units: int) -> UsageReservation:
+    return UsageReservation(
+        organization_id=organization.id,
+        api_key_id=api_key_id,
+        units=max(units, 0),
+        usage_month=get_current_month_start_sao_paulo(),
+        usage_date=get_today_sao_paulo(),
+    )
+
+
+def reserve_usage(db: Session, organization, api_key_id: int, units: int = 1) -> UsageReservation:
+    """
+    Reserva `units` da cota mensal da organização (America/Sao_Paulo).
+
+    Com Redis, verificação e reserva são atômicas (uma chamada de rede, que
+    também registra o uso no journal do write-behind); requisições
+    concorrentes não ultrapassam o limite.
+
+    Args:
+        db: Sessão do banco (semeia o contador no miss)
+        organization: Organização (ou snapshot) com `id` e `monthly_limit`
+        api_key_id: API key a que o uso é atribuído
+        units: Máximo de unidades que a requisição pode consumir
+
+    Raises:
+        HTTPException 429 se a reserva não couber no limite mensal.
+    """
+    reservation = _new_reservation(organization, api_key_id, units)
+    monthly_limit = organization.monthly_limit
+    if units <= 0:
+        return reservation
+
+    client = quota.quota_client()
+    if client is not None:
+        journaled = usage_buffer.journal_client() is not None
+        try:
+            allowed, used = quota.consume(
+                client,
+                organization.id,
+                reservation.usage_month,
+                monthly_limit,
+                units,
+                reservation._journal_fields(True) if journaled else [],
+                seed=lambda: get_organization_monthly_usage(db, organization.id),
+            )
+        except redis.RedisError as e:
+            logger.warning("Redis error na reserva de cota (usando o banco): %s", e)
+        else:
+            if not allowed:
+                _raise_monthly_limit_exceeded(monthly_limit, used, units)
+            reservation.counted = True
+            reservation.journaled = journaled
+            return reservation
+
+    used_month = get_organization_monthly_usage(db, organization.id)
+    if monthly_limit > 0 and used_month + units > monthly_limit:
+        _raise_monthly_limit_exceeded(monthly_limit, used_month, units)
+    return reservation
+
+
+async def reserve_usage_async(db: AsyncSession, organization, api_key_id: int, units: int = 1) -> UsageReservation:
+    """`reserve_usage` com AsyncSession e cliente Redis asyncio (mesmo contrato)."""
+    reservation = _new_reservation(organization, api_key_id, units)
+    monthly_limit = organization.monthly_limit
+    if units <= 0:
+        return reservation
+
+    client = quota.quota_async_client()
+    if client is not None:
+        journaled = usage_buffer.journal_async_client() is not None
+        try:
+            allowed, used = await quota.consume_async(
+                client,
+                organization.id,
+                reservation.usage_month,
+                monthly_limit,
+                units,
+                reservation._journal_fields(True) if journaled else [],
+                seed=lambda: get_organization_monthly_usage_async(db, organization.id),
+            )
+        except redis.RedisError as e:
+            logger.warning("Redis error na reserva de cota (usando o banco): %s", e)
+        else:
+            if not allowed:
+                _raise_monthly_limit_exceeded(monthly_limit, used, units)
+            reservation.counted = True
+            reservation.journaled = journaled
+            return reservation
+
+    used_month = await get_organization_monthly_usage_async(db, organization.id)
+    if monthly_limit > 0 and used_month + units > monthly_limit:
+        _raise_monthly_limit_exceeded(monthly_limit, used_month, units)
+    return reservation
@@ -0,0 +1,444 @@
+"""
+Contadores de uso write-behind.
+===============================
+As consultas não fazem upsert em organization_usage_monthly e
+api_key_usage_daily por requisição: os incrementos vão para um buffer e uma
+thread por processo grava os deltas a cada USAGE_FLUSH_SECONDS, com um
+único upsert multi-linha por tabela.
+
+Dois backends (USAGE_BUFFER_BACKEND):
+
+- redis: HINCRBY em `usage:pending` (journal compartilhado, sobrevive à
+  queda do processo). No flush, um script Lua renomeia o hash para um lote
+  `usage:batch:<id>` e o registra em `usage:batches`; o lote só sai do Redis
+  depois do commit no banco. O id do lote é gravado em usage_flush_batches
+  na mesma transação dos upserts, então um lote reprocessado (queda entre o
+  commit e o DEL, ou dois processos no mesmo lote) não é somado duas vezes.
+- memory: dict por processo. Em caso de queda perde-se no máximo o que foi
+  registrado desde o último flush (janela configurável via
+  USAGE_FLUSH_SECONDS; USAGE_FLUSH_MAX_PENDING antecipa o flush).
+
+Com Redis indisponível, o backend redis cai para memória a cada incremento.
+Leituras de cota somam os pendentes (`pending_org_success`): o journal e os
+lotes já fechados que ainda não saíram do Redis.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from datetime import date
+from typing import Optional
+
+import redis
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+USAGE_PENDING_KEY = "usage:pending"
+USAGE_BATCHES_KEY = "usage:batches"
+USAGE_BATCH_KEY_PREFIX = "usage:batch:"
+
+# Linhas por INSERT multi-linha
+_UPSERT_CHUNK_SIZE = 1000
+# Ids de lotes já aplicados ficam no banco por este período
+_LEDGER_RETENTION_DAYS = 7
+_LEDGER_CLEANUP_SECONDS = 3600
+
+# Fecha o hash pendente como um lote (RENAME + SADD atômicos)
+_SEAL_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('RENAME', KEYS[1], KEYS[3])
+redis.call('SADD', KEYS[2], KEYS[3])
+return 1
+"""
+
+# Sucessos pendentes de um campo: journal + lotes fechados ainda não gravados.
+# Atômico com o _SEAL_SCRIPT (um lote não some entre as duas leituras); lê as
+# chaves dos lotes listadas em KEYS[2], então requer Redis sem cluster.
+# KEYS[1]=journal, KEYS[2]=conjunto de lotes; ARGV[1]=campo
+_PENDING_SCRIPT = """
+local total = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+for _, key in ipairs(redis.call('SMEMBERS', KEYS[2])) do
+    total = total + tonumber(redis.call('HGET', key, ARGV[1]) or '0')
+end
+return total
+"""
+
+# Chave do contador: ("org", organization_id, usage_month) ou
+# ("key", api_key_id, usage_date); valor: [sucessos, erros]
+CounterKey = tuple[str, int, date]
+
+_lock = threading.Lock()
+_pending: dict[CounterKey, list[int]] = {}
+_seal_script = None
+_pending_script = None
+_pending_async_script = None
+_last_ledger_cleanup = 0.0
+
+
+def journal_field(kind: str, entity_id: int, day: date, is_success: bool) -> str:
+    """Campo do contador no journal `usage:pending` (ver `add_usage`)."""
+    return f"{kind}:{entity_id}:{day.isoformat()}:{'s' if is_success else 'e'}"
+
+
+def _parse_field(field: str) -> tuple[CounterKey, bool]:
+    kind, entity_id, day, outcome = field.split(":")
+    return (kind, int(entity_id), date.fromisoformat(day)), outcome == "s"
+
+
+def journal_client() -> Optional[redis.Redis]:
+    """Cliente Redis do journal, ou None se o backend em uso for memória."""
+    if not settings.USAGE_WRITE_BEHIND_ENABLED or settings.USAGE_BUFFER_BACKEND != "redis":
+        return None
+    from app.core.rate_limit import get_redis_client
+
+    return get_redis_client()
+
+
+def journal_async_client():
+    """Cliente Redis asyncio do journal, ou None (ver `journal_client`)."""
+    if not settings.USAGE_WRITE_BEHIND_ENABLED or settings.USAGE_BUFFER_BACKEND != "redis":
+        return None
+    from app.core.redis_client import get_async_redis_client
+
+    return get_async_redis_client()
+
+
+def _add_local(key: CounterKey, success: int, error: int) -> None:
+    with _lock:
+        counts = _pending.setdefault(key, [0, 0])
+        counts[0] += success
+        counts[1] += error
+        size = len(_pending)
+    if size >= settings.USAGE_FLUSH_MAX_PENDING:
+        _wake_event.set()
+
+
+def add_usage(kind: str, entity_id: int, day: date, success: int, error: int) -> None:
+    """
+    Registra um incremento de uso no buffer.
+
+    Args:
+        kind: "org" (uso mensal, `day` = primeiro dia do mês) ou "key" (uso diário)
+        entity_id: ID da organização ou da API key
+        day: Mês/dia de referência (America/Sao_Paulo)
+        success: Chamadas com sucesso
+        error: Chamadas com erro
+    """
+    if not success and not error:
+        return
+    client = journal_client()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            if success:
+                pipe.hincrby(USAGE_PENDING_KEY, journal_field(kind, entity_id, day, True), success)
+            if error:
+                pipe.hincrby(USAGE_PENDING_KEY, journal_field(kind, entity_id, day, False), error)
+            pipe.execute()
+            return
+        except redis.RedisError as e:
+            logger.warning("Redis error ao registrar uso (mantido em memória): %s", e)
+    _add_local((kind, entity_id, day), success, error)
+
+
+async def add_usage_async(kind: str, entity_id: int, day: date, success: int, error: int) -> None:
+    """`add_usage` pelo cliente Redis asyncio."""
+    if not success and not error:
+        return
+    client = journal_async_client()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            if success:
+                pipe.hincrby(USAGE_PENDING_KEY, journal_field(kind, entity_id, day, True), success)
+            if error:
+                pipe.hincrby(USAGE_PENDING_KEY, journal_field(kind, entity_id, day, False), error)
+            await pipe.execute()
+            return
+        except redis.RedisError as e:
+            logger.warning("Redis error ao registrar uso (mantido em memória): %s", e)
+    _add_local((kind, entity_id, day), success, error)
+
+
+def _local_org_success(organization_id: int, usage_month: date) -> int:
+    with _lock:
+        counts = _pending.get(("org", organization_id, usage_month))
+        return counts[0] if counts else 0
+
+
+def pending_org_success(organization_id: int, usage_month: date) -> int:
+    """
+    Sucessos ainda não gravados no banco: journal e lotes fechados no Redis
+    mais o buffer deste processo. Um lote já gravado mas ainda não removido
+    é contado duas vezes por alguns milissegundos (erra para o lado seguro).
+    """
+    global _pending_script
+    total = _local_org_success(organization_id, usage_month)
+    client = journal_client()
+    if client is not None:
+        try:
+            if _pending_script is None:
+                _pending_script = client.register_script(_PENDING_SCRIPT)
+            value = _pending_script(
+                keys=[USAGE_PENDING_KEY, USAGE_BATCHES_KEY],
+                args=[journal_field("org", organization_id, usage_month, True)],
+            )
+            total += int(value or 0)
+        except redis.RedisError as e:
+            logger.warning("Redis error ao ler uso pendente: %s", e)
+    return total
+
+
+async def pending_org_success_async(organization_id: int, usage_month: date) -> int:
+    """`pending_org_success` pelo cliente Redis asyncio."""
+    global _pending_async_script
+    total = _local_org_success(organization_id, usage_month)
+    client = journal_async_client()
+    if client is not None:
+        try:
+            # O cliente asyncio muda com o event loop: passe `client=` na chamada
+            if _pending_async_script is None:
+                _pending_async_script = client.register_script(_PENDING_SCRIPT)
+            value = await _pending_async_script(
+                keys=[USAGE_PENDING_KEY, USAGE_BATCHES_KEY],
+                args=[journal_field("org", organization_id, usage_month, True)],
+                client=client,
+            )
+            total += int(value or 0)
+        except redis.RedisError as e:
+            logger.warning("Redis error ao ler uso pendente: %s", e)
+    return total
+
+
+# =============================================================================
+# Flush
+# =============================================================================
+
+
+def _chunks(rows: list, size: int = _UPSERT_CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _upsert_org_usage(db, rows: list[tuple[int, date, int, int]]) -> None:
+    for chunk in _chunks(rows):
+        values = ", ".join(
+            f"(CAST(:id_{i} AS INTEGER), CAST(:d_{i} AS DATE), CAST(:s_{i} AS INTEGER), CAST(:e_{i} AS INTEGER))"
+            for i in range(len(chunk))
+        )
+        params: dict = {}
+        for i, (org_id, usage_month, success, error) in enumerate(chunk):
+            params.update({f"id_{i}": org_id, f"d_{i}": usage_month, f"s_{i}": success, f"e_{i}": error})
+        # JOIN descarta organizações removidas desde o registro
+        db.execute(
+            text(f"""
+                INSERT INTO organization_usage_monthly (organization_id, usage_month, success_count, error_count)
+                SELECT v.id, v.usage_month, v.success_count, v.error_count
+                FROM (VALUES {values}) AS v(id, usage_month, success_count, error_count)
+                JOIN organizations o ON o.id = v.id
+                ON CONFLICT (organization_id, usage_month)
+                DO UPDATE SET
+                    success_count = organization_usage_monthly.success_count + EXCLUDED.success_count,
+                    error_count = organization_usage_monthly.error_count + EXCLUDED.error_count
+            """),
+            params,
+        )
+
+
+def _upsert_api_key_usage(db, rows: list[tuple[int, date, int, int]]) -> None:
+    for chunk in _chunks(rows):
+        values = ", ".join(
+            f"(CAST(:id_{i} AS INTEGER), CAST(:d_{i} AS DATE), CAST(:s_{i} AS INTEGER), CAST(:e_{i} AS INTEGER))"
+            for i in range(len(chunk))
+        )
+        params: dict = {}
+        for i, (key_id, usage_date, success, error) in enumerate(chunk):
+            params.update({f"id_{i}": key_id, f"d_{i}": usage_date, f"s_{i}": success, f"e_{i}": error})
+        db.execute(
+            text(f"""
+                INSERT INTO api_key_usage_daily (api_key_id, usage_date, success_count, error_count)
+                SELECT v.id, v.usage_date, v.success_count, v.error_count
+                FROM (VALUES {values}) AS v(id, usage_date, success_count, error_count)
+                JOIN api_keys k ON k.id = v.id
+                ON CONFLICT (api_key_id, usage_date)
+                DO UPDATE SET
+                    success_count = api_key_usage_daily.success_count + EXCLUDED.success_count,
+                    error_count = api_key_usage_daily.error_count + EXCLUDED.error_count
+            """),
+            params,
+        )
+
+
+def _apply(counters: dict[CounterKey, list[int]], batch_id: Optional[str] = None) -> bool:
+    """
+    Grava os deltas em uma transação. Com `batch_id`, registra o lote em
+    usage_flush_batches e não aplica nada se ele já tiver sido aplicado.
+
+    Returns:
+        False se o lote já constava como aplicado.
+    """
+    # Ordem fixa de linhas: flushes concorrentes não entram em deadlock
+    org_rows = sorted(
+        (entity_id, day, s, e) for (kind, entity_id, day), (s, e) in counters.items() if kind == "org"
+    )
+    key_rows = sorted(
+        (entity_id, day, s, e) for (kind, entity_id, day), (s, e) in counters.items() if kind == "key"
+    )
+
+    db = SessionLocal()
+    try:
+        if batch_id is not None:
+            inserted = db.execute(
+                text("""
+                    INSERT INTO usage_flush_batches (batch_id, flushed_at)
+                    VALUES (:batch_id, CURRENT_TIMESTAMP)
+                    ON CONFLICT (batch_id) DO NOTHING
+                """),
+                {"batch_id": batch_id},
+            ).rowcount
+            if not inserted:
+                db.rollback()
+                return False
+        if org_rows:
+            _upsert_org_usage(db, org_rows)
+        if key_rows:
+            _upsert_api_key_usage(db, key_rows)
+        db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _flush_local() -> int:
+    global _pending
+    with _lock:
+        if not _pending:
+            return 0
+        batch, _pending = _pending, {}
+    try:
+        _apply(batch)
+    except Exception:
+        # Devolver ao buffer para o próximo ciclo
+        for key, (success, error) in batch.items():
+            _add_local(key, success, error)
+        raise
+    return len(batch)
+
+
+def _flush_redis(client: redis.Redis) -> int:
+    global _seal_script
+    if _seal_script is None:
+        _seal_script = client.register_script(_SEAL_SCRIPT)
+    batch_key = f"{USAGE_BATCH_KEY_PREFIX}{uuid.uuid4().hex}"
+    _seal_script(keys=[USAGE_PENDING_KEY, USAGE_BATCHES_KEY, batch_key])
+
+    # Inclui lotes deixados por flushes interrompidos (deste ou de outro processo)
+    flushed = 0
+    for key in client.smembers(USAGE_BATCHES_KEY):
+        counters: dict[CounterKey, list[int]] = {}
+        for field, value in client.hgetall(key).items():
+            counter_key, is_success = _parse_field(field)
+            counts = counters.setdefault(counter_key, [0, 0])
+            counts[0 if is_success else 1] += int(value)
+        if counters and _apply(counters, batch_id=key[len(USAGE_BATCH_KEY_PREFIX):]):
+            flushed += len(counters)
+        client.delete(key)
+        client.srem(USAGE_BATCHES_KEY, key)
+    return flushed
+
+
+def _cleanup_ledger() -> None:
+    global _last_ledger_cleanup
+    now = time.monotonic()
+    if now - _last_ledger_cleanup < _LEDGER_CLEANUP_SECONDS:
+        return
+    _last_ledger_cleanup = now
+    db = SessionLocal()
+    try:
+        db.execute(
+            text("""
+                DELETE FROM usage_flush_batches
+                WHERE flushed_at < CURRENT_TIMESTAMP - make_interval(days => :days)
+            """),
+            {"days": _LEDGER_RETENTION_DAYS},
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def flush_usage() -> int:
+    """
+    Grava no banco os contadores pendentes (memória deste processo e
+    lotes do Redis).
+
+    Returns:
+        Quantidade de linhas (org/mês e key/dia) enviadas.
+    """
+    flushed = _flush_local()
+    client = journal_client()
+    if client is not None:
+        try:
+            flushed += _flush_redis(client)
+            _cleanup_ledger()
+        except redis.RedisError as e:
+            logger.warning("Redis error no flush de uso: %s", e)
+    return flushed
+
+
+# =============================================================================
+# Thread de flush (uma por processo)
+# =============================================================================
+
+_stop_event = threading.Event()
+_wake_event = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+def _flush_loop() -> None:
+    while not _stop_event.is_set():
+        _wake_event.wait(settings.USAGE_FLUSH_SECONDS)
+        _wake_event.clear()
+        if _stop_event.is_set():
+            break
+        try:
+            flush_usage()
+        except Exception as e:
+            logger.warning("Erro ao gravar contadores de uso: %s", e)
+
+
+def start_usage_flusher() -> None:
+    """Inicia a thread que grava os contadores periodicamente."""
+    global _thread
+    if not settings.USAGE_WRITE_BEHIND_ENABLED or _thread is not None:
+        return
+    _stop_event.clear()
+    _thread = threading.Thread(target=_flush_loop, name="usage-flusher", daemon=True)
+    _thread.start()
+
+
+def stop_usage_flusher(timeout: float = 10.0) -> None:
+    """Para a thread e faz o flush final dos contadores."""
+    global _thread
+    _stop_event.set()
+    _wake_event.set()
+    if _thread is not None:
+        _thread.join(timeout=timeout)
+        _thread = None
+    try:
+        flush_usage()
+    except Exception as e:
+        logger.warning("Erro no flush final dos contadores de uso: %s", e)
@@ -0,0 +1,15 @@
+-- Migration 008: Chave canônica GTIN-14 em products
+-- UPC-A (12), EAN-13 e GTIN-8 são completados com zeros à esquerda, então
+-- variantes do mesmo item resolvem na mesma chave.
+-- O dígito verificador é conferido na API e no ETL (app.core.gtin).
+-- Idempotente: usa IF NOT EXISTS
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS gtin14 CHAR(14);
+
+UPDATE products
+SET gtin14 = lpad(gtin, 14, '0')
+WHERE gtin14 IS NULL
+  AND gtin ~ '^[0-9]+$'
+  AND length(gtin) IN (8, 12, 13, 14);
+
+CREATE INDEX IF NOT EXISTS idx_products_gtin14 ON products(gtin14);
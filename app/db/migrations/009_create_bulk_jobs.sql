@@ -0,0 +1,28 @@
+-- Migration 009: Tabela de jobs de consulta em lote assíncronos
+-- Idempotente: usa IF NOT EXISTS
+
+CREATE TABLE IF NOT EXISTS bulk_jobs (
+    id VARCHAR(32) PRIMARY KEY,
+    organization_id INTEGER NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    api_key_id INTEGER NULL REFERENCES api_keys(id) ON DELETE SET NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    output_format VARCHAR(10) NOT NULL DEFAULT 'ndjson',
+    total_gtins INTEGER NOT NULL DEFAULT 0,
+    processed_gtins INTEGER NOT NULL DEFAULT 0,
+    found_gtins INTEGER NOT NULL DEFAULT 0,
+    invalid_gtins INTEGER NOT NULL DEFAULT 0,
+    input_offset BIGINT NOT NULL DEFAULT 0,
+    output_bytes BIGINT NOT NULL DEFAULT 0,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    error TEXT NULL,
+    worker_id VARCHAR(64) NULL,
+    heartbeat_at TIMESTAMP NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    finished_at TIMESTAMP NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_bulk_jobs_organization_id ON bulk_jobs(organization_id);
+CREATE INDEX IF NOT EXISTS ix_bulk_jobs_api_key_id ON bulk_jobs(api_key_id);
+CREATE INDEX IF NOT EXISTS ix_bulk_jobs_status ON bulk_jobs(status);
+CREATE INDEX IF NOT EXISTS ix_bulk_jobs_created_at ON bulk_jobs(created_at);
@@ -0,0 +1,7 @@
+-- Migration 010: JSON pré-computado da resposta em products
+-- Texto (e não jsonb) para preservar a ordem das chaves e a formatação de
+-- Decimal como string; preenchido pelo ETL ou por
+-- scripts/check_payload_json.py --fix.
+-- Idempotente: usa IF NOT EXISTS
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS payload_json TEXT;
@@ -0,0 +1,24 @@
+-- Migration 011: Validadores HTTP em products (ETag / Last-Modified)
+-- content_hash: md5 do JSON da resposta (mesma expressão de PAYLOAD_JSON_SQL
+-- em app.core.products); content_updated_at: quando o conteúdo mudou.
+-- Mantidos pelo ETL: linhas alteradas fora dele devem ter content_hash
+-- zerado (NULL) para serem recalculadas na próxima carga.
+-- Idempotente: usa IF NOT EXISTS
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE products ADD COLUMN IF NOT EXISTS content_updated_at TIMESTAMPTZ;
+
+UPDATE products
+SET content_hash = md5(json_build_object(
+        'gtin', gtin,
+        'gtin_type', gtin_type,
+        'brand', brand,
+        'product_name', product_name,
+        'origin_country', origin_country,
+        'ncm', ncm,
+        'cest', cest,
+        'gross_weight_value', gross_weight_value::text,
+        'gross_weight_unit', gross_weight_unit
+    )::text),
+    content_updated_at = now()
+WHERE content_hash IS NULL;
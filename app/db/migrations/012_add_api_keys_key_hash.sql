@@ -0,0 +1,13 @@
+-- Migration 012: Digest SHA-256 da API key em api_keys
+-- A autenticação busca por key_hash (índice único, tamanho fixo) em uma
+-- única query com organizations, em vez da key em texto simples.
+-- Mesmo digest de ApiKey.hash_key (app/db/models.py). Requer PostgreSQL 11+.
+-- Idempotente: usa IF NOT EXISTS
+
+ALTER TABLE api_keys ADD COLUMN IF NOT EXISTS key_hash CHAR(64);
+
+UPDATE api_keys
+SET key_hash = encode(sha256(convert_to(key, 'UTF8')), 'hex')
+WHERE key_hash IS NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ix_api_keys_key_hash ON api_keys(key_hash);
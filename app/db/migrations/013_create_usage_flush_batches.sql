@@ -0,0 +1,13 @@
+-- Migration 013: Lotes de contadores de uso já aplicados
+-- O flush write-behind (app/core/usage_buffer.py) grava o id do lote do
+-- Redis na mesma transação dos upserts de uso; um lote reprocessado após
+-- falha não é somado duas vezes. Linhas com mais de 7 dias são apagadas
+-- pelo próprio flush.
+-- Idempotente: usa IF NOT EXISTS
+
+CREATE TABLE IF NOT EXISTS usage_flush_batches (
+    batch_id VARCHAR(32) PRIMARY KEY,
+    flushed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_usage_flush_batches_flushed_at ON usage_flush_batches(flushed_at);
@@ -4,13 +4,14 @@ Modelos SQLAlchemy para Organizations, Users e API Keys.
 Define as tabelas para autenticação e controle de acesso.
 """
 
+import hashlib
 import secrets
 from datetime import datetime, date
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, Date, DateTime, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import CHAR, BigInteger, Boolean, Column, Date, DateTime, ForeignKey, Integer, String, Text, UniqueConstraint
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship, DeclarativeBase
+from sqlalchemy.orm import relationship, validates, DeclarativeBase
 
 
 class Base(DeclarativeBase):
@@ -29,6 +30,10 @@ ALL_PLANS = PUBLIC_PLANS + PRIVATE_PLANS
 # Teto técnico de GTINs por requisição em lote, independente do plano.
 MAX_BATCH_SIZE = 100
 
+# Teto técnico do lote em streaming (NDJSON); o limite efetivo é o batch_limit
+# da organização (ex.: batch_limit_override de planos enterprise).
+MAX_STREAM_BATCH_SIZE = 100_000
+
 
 class Organization(Base):
     """
@@ -116,6 +121,22 @@ class Organization(Base):
         """Propriedade de conveniência para limite de API keys ativas."""
         return self.get_api_key_active_limit_by_plan()
 
+    def get_bulk_job_limit_by_plan(self) -> int:
+        """Jobs em lote assíncronos simultâneos (na fila ou rodando) por plano."""
+        limits = {
+            "basic": 0,       # jobs desabilitados
+            "starter": 0,
+            "pro": 0,
+            "advanced": 1,
+            "enterprise": 2,
+        }
+        return limits.get(self.plan, 0)
+
+    @property
+    def bulk_job_limit(self) -> int:
+        """Propriedade de conveniência para limite de jobs em lote simultâneos."""
+        return self.get_bulk_job_limit_by_plan()
+
 
 class User(Base):
     """
@@ -175,6 +196,7 @@ class ApiKey(Base):
     organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
     name = Column(String(100), nullable=True, default="Nova chave", comment="Nome/descricao da API key")
     key = Column(String(64), nullable=False, unique=True, index=True, comment="API Key em texto simples")
+    key_hash = Column(CHAR(64), nullable=True, unique=True, index=True, comment="SHA-256 (hex) da API key, usado na autenticação")
     is_active = Column(Boolean, nullable=False, default=True, comment="Se a key esta ativa")
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     last_used_at = Column(DateTime, nullable=True, comment="Ultima vez que a key foi usada")
@@ -195,6 +217,22 @@ class ApiKey(Base):
         """
         return f"sk_live_{secrets.token_hex(16)}"
     
+    @staticmethod
+    def hash_key(key: str) -> str:
+        """
+        Digest da API key usado no lookup da autenticação.
+        
+        Returns:
+            SHA-256 em hexadecimal (64 chars).
+        """
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+    
+    @validates("key")
+    def _sync_key_hash(self, _field: str, value: str) -> str:
+        """Mantém key_hash sincronizado com a key."""
+        self.key_hash = self.hash_key(value)
+        return value
+    
     def get_masked_key(self) -> str:
         """
         Retorna a key mascarada para exibicao segura.
@@ -251,3 +289,55 @@ class OrganizationUsageMonthly(Base):
     def __repr__(self) -> str:
         return f"<OrganizationUsageMonthly(org_id={self.organization_id}, month={self.usage_month}, success={self.success_count}, error={self.error_count})>"
 
+
+class UsageFlushBatch(Base):
+    """
+    Lotes de contadores de uso (journal no Redis) já aplicados.
+
+    Gravado na mesma transação dos upserts de uso: um lote reprocessado
+    após falha não é somado duas vezes.
+    """
+    __tablename__ = "usage_flush_batches"
+
+    batch_id = Column(String(32), primary_key=True, comment="Identificador do lote no Redis (uuid4 hex)")
+    flushed_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self) -> str:
+        return f"<UsageFlushBatch(batch_id='{self.batch_id}', flushed_at={self.flushed_at})>"
+
+
+# Estados de um job em lote assíncrono
+BULK_JOB_ACTIVE_STATUSES = ("queued", "running")
+BULK_JOB_FINAL_STATUSES = ("completed", "failed", "canceled")
+
+
+class BulkJob(Base):
+    """
+    Job de consulta em lote assíncrona (arquivos com milhões de GTINs).
+
+    Entrada e resultado ficam em disco local (BULK_JOBS_DIR); a tabela guarda
+    estado, progresso e o checkpoint para retomar após queda do worker.
+    """
+    __tablename__ = "bulk_jobs"
+
+    id = Column(String(32), primary_key=True, comment="Identificador público (uuid4 hex)")
+    organization_id = Column(Integer, ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False, index=True)
+    api_key_id = Column(Integer, ForeignKey("api_keys.id", ondelete="SET NULL"), nullable=True, index=True)
+    status = Column(String(20), nullable=False, default="queued", index=True, comment="queued, running, completed, failed, canceled")
+    output_format = Column(String(10), nullable=False, default="ndjson", comment="ndjson ou csv (gzip)")
+    total_gtins = Column(Integer, nullable=False, default=0, comment="Linhas com GTIN no arquivo enviado")
+    processed_gtins = Column(Integer, nullable=False, default=0)
+    found_gtins = Column(Integer, nullable=False, default=0)
+    invalid_gtins = Column(Integer, nullable=False, default=0)
+    input_offset = Column(BigInteger, nullable=False, default=0, comment="Checkpoint: byte do arquivo de entrada já processado")
+    output_bytes = Column(BigInteger, nullable=False, default=0, comment="Checkpoint: bytes válidos do arquivo de resultado")
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    error = Column(Text, nullable=True)
+    worker_id = Column(String(64), nullable=True, comment="Worker que detém o job")
+    heartbeat_at = Column(DateTime, nullable=True, comment="Último checkpoint do worker (lease)")
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<BulkJob(id='{self.id}', org_id={self.organization_id}, status='{self.status}')>"
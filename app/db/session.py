@@ -2,15 +2,41 @@
 Módulo de conexão com o banco de dados PostgreSQL.
 ===================================================
 Configura o SQLAlchemy engine e sessões para acesso ao banco.
+
+Além do engine síncrono (psycopg2), há um engine asyncio (asyncpg) para as
+rotas `async def` de consulta: a ida ao banco não bloqueia o event loop, e
+um worker sobrepõe várias consultas.
+
+Pools separados por papel (tamanhos em DB_<PAPEL>_POOL_SIZE /
+DB_<PAPEL>_MAX_OVERFLOW), para um papel não esgotar as conexões do outro:
+
+- write: primário; padrão de todas as sessões (uso, billing, auth, jobs).
+- read: leituras de `products`; aponta para a réplica em DATABASE_READ_URL
+  (sem ela, outro pool no primário). As consultas de app.core.products
+  são roteadas para ele com `READ_BIND` / `ASYNC_READ_BIND`, mesmo dentro
+  de uma sessão do pool write.
+- admin: pool pequeno para o painel administrativo.
+
+Cada processo abre até 2 * (write + read) + admin conexões (os engines
+asyncio repetem os tamanhos de write e read); `pool_stats()` informa esse
+total em `max_connections` e as métricas por pool (exposto em
+/health/db/pools).
 """
 
 import os
-from typing import Generator
+import threading
+import time
+from typing import AsyncGenerator, Generator
 
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
+from app.core.config import settings
 # Importar Base para permitir create_all
 from app.db.models import Base
 
@@ -38,34 +64,181 @@ def get_database_url() -> str:
     return f"postgresql+psycopg2://{pg_user}:{pg_password}@{pg_host}:{pg_port}/{pg_db}"
 
 
+def get_read_database_url() -> str:
+    """URL do pool de leitura: DATABASE_READ_URL (réplica) ou a do primário."""
+    return os.getenv("DATABASE_READ_URL") or get_database_url()
+
+
+def to_async_url(database_url: str) -> str:
+    """URL síncrona com o driver trocado para asyncpg (`sslmode` vira o parâmetro `ssl` do asyncpg)."""
+    url = make_url(database_url).set(drivername="postgresql+asyncpg")
+    query = dict(url.query)
+    if "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    return url.set(query=query).render_as_string(hide_password=False)
+
+
+def get_async_database_url() -> str:
+    """URL do engine asyncio: ASYNC_DATABASE_URL ou a URL síncrona convertida."""
+    return os.getenv("ASYNC_DATABASE_URL") or to_async_url(get_database_url())
+
+
+def get_async_read_database_url() -> str:
+    """URL do engine asyncio de leitura: ASYNC_DATABASE_READ_URL ou a de leitura convertida."""
+    return os.getenv("ASYNC_DATABASE_READ_URL") or to_async_url(get_read_database_url())
+
+
 # Obter URL de conexão do banco de dados
 DATABASE_URL = get_database_url()
+DATABASE_READ_URL = get_read_database_url()
+ASYNC_DATABASE_URL = get_async_database_url()
+ASYNC_DATABASE_READ_URL = get_async_read_database_url()
 
-# Criar engine SQLAlchemy
-'''
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,  # Verifica conexão antes de usar
-    pool_size=5,         # Tamanho do pool de conexões
-    max_overflow=10,     # Conexões extras permitidas
-)
-'''
-# para testes somente
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=5,
-    max_overflow=5,
-    pool_timeout=30,
-    pool_pre_ping=True,
-)
 
+# =============================================================================
+# Pools com métricas de espera
+# =============================================================================
+
+class _PoolWaitStats:
+    """Tempo gasto esperando uma conexão livre (checkout) e timeouts do pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+    def record(self, elapsed: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_seconds += elapsed
+            self.max_wait_seconds = max(self.max_wait_seconds, elapsed)
 
-# Criar factory de sessões
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "avg_wait_ms": round(self.wait_seconds / self.checkouts * 1000, 3) if self.checkouts else None,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+                "timeouts": self.timeouts,
+            }
+
+
+class _TimedPoolMixin:
+    """Mede `_do_get` (retirada de uma conexão do pool, incluindo a espera na fila)."""
+
+    wait_stats: _PoolWaitStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = _PoolWaitStats()
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = _PoolWaitStats()
+
+
+def _pool_options(role: str) -> dict:
+    """Parâmetros do pool do papel (write, read ou admin) a partir de settings."""
+    return {
+        "pool_size": getattr(settings, f"DB_{role.upper()}_POOL_SIZE"),
+        "max_overflow": getattr(settings, f"DB_{role.upper()}_MAX_OVERFLOW"),
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": True,
+    }
+
+
+# Criar engines SQLAlchemy (um pool por papel)
+engine = create_engine(DATABASE_URL, poolclass=TimedQueuePool, **_pool_options("write"))
+read_engine = create_engine(DATABASE_READ_URL, poolclass=TimedQueuePool, **_pool_options("read"))
+admin_engine = create_engine(DATABASE_URL, poolclass=TimedQueuePool, **_pool_options("admin"))
+
+
+# Criar factories de sessões
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
     bind=engine
 )
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AdminSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=admin_engine)
+
+
+# Engines asyncio (asyncpg) para as rotas async de consulta
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, poolclass=TimedAsyncAdaptedQueuePool, **_pool_options("write")
+)
+async_read_engine = create_async_engine(
+    ASYNC_DATABASE_READ_URL, poolclass=TimedAsyncAdaptedQueuePool, **_pool_options("read")
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+# Roteamento: `db.execute(stmt, params, bind_arguments=READ_BIND)` executa no
+# pool de leitura dentro de qualquer sessão (Session / AsyncSession)
+READ_BIND = {"bind": read_engine}
+ASYNC_READ_BIND = {"bind": async_read_engine.sync_engine}
+
+ENGINES = {
+    "write": engine,
+    "read": read_engine,
+    "admin": admin_engine,
+    "async_write": async_engine.sync_engine,
+    "async_read": async_read_engine.sync_engine,
+}
+
+
+def pool_stats() -> dict:
+    """Ocupação e espera de cada pool deste processo, com os totais."""
+    stats = {}
+    max_connections = checked_out = 0
+    for name, pool_engine in ENGINES.items():
+        pool = pool_engine.pool
+        stats[name] = {
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            **pool.wait_stats.stats(),
+        }
+        max_connections += pool.size() + pool._max_overflow
+        checked_out += pool.checkedout()
+    return {
+        "read_replica": DATABASE_READ_URL != DATABASE_URL,
+        "max_connections": max_connections,
+        "checked_out": checked_out,
+        "pools": stats,
+    }
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -85,6 +258,37 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+def get_read_db() -> Generator[Session, None, None]:
+    """Dependency com uma sessão do pool de leitura (réplica, se configurada)."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_admin_db() -> Generator[Session, None, None]:
+    """Dependency com uma sessão do pool administrativo."""
+    db = AdminSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency que fornece uma sessão asyncio do banco de dados.
+
+    Uso:
+        @app.get("/items")
+        async def get_items(db: AsyncSession = Depends(get_async_db)):
+            ...
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def test_db_connection() -> bool:
     """
     Testa a conexão com o banco de dados executando SELECT 1.
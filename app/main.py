@@ -20,6 +20,7 @@ from app.api.v1.metrics import router as metrics_router
 from app.api.v1.public import router as public_router
 from app.api.v1.billing import router as billing_router
 from app.api.v1.admin import router as admin_router
+from app.api.v1.jobs import router as jobs_router
 from app.core.config import settings
 
 
@@ -30,6 +31,7 @@ def run_migrations():
     """
     from sqlalchemy import text
     from app.db.session import engine
+    from app.core.products import CONTENT_HASH_SQL
     
     try:
         with engine.connect() as conn:
@@ -384,6 +386,150 @@ def run_migrations():
             else:
                 print("[MIGRATION] Campos de recuperação de senha ja existem.")
 
+            # Migração 13: Chave canônica GTIN-14 em products (lookup por variante UPC-A/EAN-13)
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name = 'products' AND column_name = 'gtin14'
+            """))
+            if not result.fetchone():
+                print("[MIGRATION] Adicionando coluna 'gtin14' na tabela products...")
+                conn.execute(text("ALTER TABLE products ADD COLUMN gtin14 CHAR(14)"))
+                conn.execute(text("""
+                    UPDATE products
+                    SET gtin14 = lpad(gtin, 14, '0')
+                    WHERE gtin ~ '^[0-9]+$' AND length(gtin) IN (8, 12, 13, 14)
+                """))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS idx_products_gtin14 ON products(gtin14)"
+                ))
+                conn.commit()
+                print("[MIGRATION] Coluna 'gtin14' adicionada e preenchida.")
+            else:
+                print("[MIGRATION] Coluna 'gtin14' ja existe.")
+
+            # Migração 14: Criar tabela bulk_jobs (consultas em lote assíncronas)
+            result = conn.execute(text("""
+                SELECT table_name
+                FROM information_schema.tables
+                WHERE table_name = 'bulk_jobs'
+            """))
+            if not result.fetchone():
+                print("[MIGRATION] Criando tabela 'bulk_jobs'...")
+                conn.execute(text("""
+                    CREATE TABLE bulk_jobs (
+                        id VARCHAR(32) PRIMARY KEY,
+                        organization_id INTEGER NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+                        api_key_id INTEGER NULL REFERENCES api_keys(id) ON DELETE SET NULL,
+                        status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                        output_format VARCHAR(10) NOT NULL DEFAULT 'ndjson',
+                        total_gtins INTEGER NOT NULL DEFAULT 0,
+                        processed_gtins INTEGER NOT NULL DEFAULT 0,
+                        found_gtins INTEGER NOT NULL DEFAULT 0,
+                        invalid_gtins INTEGER NOT NULL DEFAULT 0,
+                        input_offset BIGINT NOT NULL DEFAULT 0,
+                        output_bytes BIGINT NOT NULL DEFAULT 0,
+                        cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+                        error TEXT NULL,
+                        worker_id VARCHAR(64) NULL,
+                        heartbeat_at TIMESTAMP NULL,
+                        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                        started_at TIMESTAMP NULL,
+                        finished_at TIMESTAMP NULL
+                    )
+                """))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_bulk_jobs_organization_id ON bulk_jobs(organization_id)"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_bulk_jobs_api_key_id ON bulk_jobs(api_key_id)"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_bulk_jobs_status ON bulk_jobs(status)"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_bulk_jobs_created_at ON bulk_jobs(created_at)"))
+                conn.commit()
+                print("[MIGRATION] Tabela 'bulk_jobs' criada com sucesso!")
+            else:
+                print("[MIGRATION] Tabela 'bulk_jobs' ja existe.")
+
+            # Migração 15: Coluna payload_json em products (JSON pré-computado pelo ETL)
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name = 'products' AND column_name = 'payload_json'
+            """))
+            if not result.fetchone():
+                print("[MIGRATION] Adicionando coluna 'payload_json' na tabela products...")
+                conn.execute(text("ALTER TABLE products ADD COLUMN payload_json TEXT"))
+                conn.commit()
+                print("[MIGRATION] Coluna 'payload_json' adicionada. Rode scripts/check_payload_json.py --fix para preencher.")
+            else:
+                print("[MIGRATION] Coluna 'payload_json' ja existe.")
+
+            # Migração 16: Validadores HTTP em products (ETag / Last-Modified)
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name = 'products' AND column_name = 'content_hash'
+            """))
+            if not result.fetchone():
+                print("[MIGRATION] Adicionando colunas 'content_hash' e 'content_updated_at' na tabela products...")
+                conn.execute(text("ALTER TABLE products ADD COLUMN content_hash TEXT"))
+                conn.execute(text("ALTER TABLE products ADD COLUMN content_updated_at TIMESTAMPTZ"))
+                conn.execute(text(f"""
+                    UPDATE products
+                    SET content_hash = {CONTENT_HASH_SQL},
+                        content_updated_at = now()
+                """))
+                conn.commit()
+                print("[MIGRATION] Colunas 'content_hash' e 'content_updated_at' adicionadas e preenchidas.")
+            else:
+                print("[MIGRATION] Coluna 'content_hash' ja existe.")
+
+            # Migração 17: Digest da API key (lookup da autenticação por índice único)
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name = 'api_keys' AND column_name = 'key_hash'
+            """))
+            if not result.fetchone():
+                print("[MIGRATION] Adicionando coluna 'key_hash' na tabela api_keys...")
+                conn.execute(text("ALTER TABLE api_keys ADD COLUMN key_hash CHAR(64)"))
+                conn.commit()
+                print("[MIGRATION] Coluna 'key_hash' adicionada.")
+            else:
+                print("[MIGRATION] Coluna 'key_hash' ja existe.")
+
+            # Backfill sempre: keys criadas por versões anteriores durante o deploy
+            result = conn.execute(text("""
+                UPDATE api_keys
+                SET key_hash = encode(sha256(convert_to(key, 'UTF8')), 'hex')
+                WHERE key_hash IS NULL
+            """))
+            if result.rowcount:
+                print(f"[MIGRATION] key_hash preenchido para {result.rowcount} API keys.")
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_api_keys_key_hash ON api_keys(key_hash)"
+            ))
+            conn.commit()
+
+            # Migração 18: Tabela usage_flush_batches (lotes de uso write-behind já aplicados)
+            result = conn.execute(text("""
+                SELECT table_name
+                FROM information_schema.tables
+                WHERE table_name = 'usage_flush_batches'
+            """))
+            if not result.fetchone():
+                print("[MIGRATION] Criando tabela 'usage_flush_batches'...")
+                conn.execute(text("""
+                    CREATE TABLE usage_flush_batches (
+                        batch_id VARCHAR(32) PRIMARY KEY,
+                        flushed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )
+                """))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_usage_flush_batches_flushed_at ON usage_flush_batches(flushed_at)"
+                ))
+                conn.commit()
+                print("[MIGRATION] Tabela 'usage_flush_batches' criada com sucesso!")
+            else:
+                print("[MIGRATION] Tabela 'usage_flush_batches' ja existe.")
+
     except Exception as e:
         print(f"[MIGRATION] Erro ao executar migracoes: {e}")
 
@@ -412,10 +558,48 @@ async def lifespan(app: FastAPI):
             db.close()
         print("[STARTUP] Seed concluido!")
     
+    # Filtro de Bloom de GTINs (construído em background; fail-open até ficar pronto)
+    from app.core.gtin_filter import gtin_filter
+
+    gtin_filter.rebuild_in_background()
+
+    # Workers de jobs em lote assíncronos (BULK_JOBS_WORKERS=0 desativa neste processo)
+    from app.services.bulk_jobs import start_bulk_job_workers, stop_bulk_job_workers
+
+    start_bulk_job_workers()
+
+    # Invalidações do cache de autenticação publicadas por outros workers
+    from app.core.auth_cache import start_auth_invalidation_listener, stop_auth_invalidation_listener
+
+    start_auth_invalidation_listener()
+
+    # Gravação em lote do last_used_at das API keys
+    from app.core.last_used import start_last_used_flusher, stop_last_used_flusher
+
+    start_last_used_flusher()
+
+    # Gravação em lote dos contadores de uso (write-behind)
+    from app.core.usage_buffer import start_usage_flusher, stop_usage_flusher
+
+    start_usage_flusher()
+
     yield  # Aplicação rodando
     
     # Shutdown: cleanup se necessário
     print("[SHUTDOWN] Encerrando aplicacao...")
+    stop_bulk_job_workers()
+    stop_auth_invalidation_listener()
+    stop_last_used_flusher()
+    stop_usage_flusher()
+
+    from app.core.redis_client import close_async_redis_client
+
+    await close_async_redis_client()
+
+    from app.db.session import async_engine, async_read_engine
+
+    await async_engine.dispose()
+    await async_read_engine.dispose()
 
 # Criar aplicação FastAPI
 app = FastAPI(
@@ -471,11 +655,25 @@ def health_check_db():
         return {"status": "error", "database": "disconnected"}
 
 
+@app.get("/health/db/pools", tags=["Health"])
+def health_check_db_pools():
+    """
+    Pools de conexão por papel (write, read, admin e os asyncio) deste
+    worker: conexões em uso, overflow, espera média/máxima no checkout e
+    timeouts, mais o máximo de conexões que o processo pode abrir.
+    """
+    from app.db.session import pool_stats
+
+    return {"status": "ok", **pool_stats()}
+
+
 @app.get("/health/search", tags=["Health"])
 def health_check_search():
     """
     Verifica o estado do backend de busca configurado.
     Para pgfts: checa coluna search_vector, índice GIN e cobertura.
+    Para trgm: checa a extensão pg_trgm e os índices trigram de brand e
+    product_name.
     """
     from sqlalchemy import text as sa_text
     from app.db.session import engine
@@ -512,12 +710,77 @@ def health_check_search():
         except Exception as exc:
             info["status"] = "error"
             info["detail"] = str(exc)
+    elif settings.SEARCH_BACKEND == "trgm":
+        try:
+            with engine.connect() as conn:
+                ext = conn.execute(sa_text(
+                    "SELECT extversion FROM pg_extension WHERE extname = 'pg_trgm'"
+                )).fetchone()
+                info["pg_trgm_version"] = ext.extversion if ext else None
+
+                rows = conn.execute(sa_text("""
+                    SELECT i.indexname, x.indisvalid
+                    FROM pg_indexes i
+                    JOIN pg_class c ON c.relname = i.indexname
+                    JOIN pg_index x ON x.indexrelid = c.oid
+                    WHERE i.tablename = 'products'
+                """)).fetchall()
+                valid = {row.indexname: row.indisvalid for row in rows}
+                info["indexes"] = {
+                    name: ("valid" if valid[name] else "invalid") if name in valid else "missing"
+                    for name in ("idx_products_brand_trgm", "idx_products_name_trgm")
+                }
+
+            ready = ext is not None and all(v == "valid" for v in info["indexes"].values())
+            info["status"] = "ok" if ready else "degraded"
+        except Exception as exc:
+            info["status"] = "error"
+            info["detail"] = str(exc)
     else:
         info["status"] = "ok"
 
     return info
 
 
+@app.get("/health/cache", tags=["Health"])
+def health_check_cache():
+    """
+    Métricas do cache de produtos deste worker (hits, misses, evictions, bytes),
+    do nível compartilhado no Redis, do cache negativo, do filtro de GTINs,
+    da coalescência de misses (single-flight) e do cache de autenticação por
+    API key.
+    """
+    from app.core.auth_cache import auth_cache
+    from app.core.gtin_filter import gtin_filter
+    from app.core.product_cache import negative_cache, product_cache, redis_product_cache
+    from app.core.products import product_flight
+
+    return {
+        "status": "ok",
+        "enabled": settings.PRODUCT_CACHE_ENABLED,
+        "product_cache": product_cache.stats(),
+        "redis_enabled": settings.PRODUCT_REDIS_CACHE_ENABLED,
+        "redis_product_cache": redis_product_cache.stats(),
+        "negative_cache": negative_cache.stats(),
+        "gtin_filter": gtin_filter.stats(),
+        "single_flight_enabled": settings.PRODUCT_SINGLE_FLIGHT_ENABLED,
+        "single_flight": product_flight.stats(),
+        "auth_cache_enabled": settings.AUTH_CACHE_ENABLED,
+        "auth_cache": auth_cache.stats(),
+    }
+
+
+@app.get("/health/redis", tags=["Health"])
+def health_check_redis():
+    """
+    Estado do circuit breaker do Redis e ocupação dos pools de conexão
+    (sync e asyncio) deste worker.
+    """
+    from app.core.redis_client import redis_stats
+
+    return {"status": "ok", **redis_stats()}
+
+
 # Incluir routers da API v1
 app.include_router(public_router)  # Público (sem auth)
 app.include_router(gtins_router)
@@ -527,4 +790,5 @@ app.include_router(dashboard_router)
 app.include_router(metrics_router)
 app.include_router(billing_router)
 app.include_router(admin_router)
+app.include_router(jobs_router)
 
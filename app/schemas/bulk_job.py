@@ -0,0 +1,34 @@
+"""
+Schemas Pydantic para jobs de consulta em lote assíncronos.
+===========================================================
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class BulkJobResponse(BaseModel):
+    """Estado e progresso de um job em lote."""
+
+    id: str = Field(..., description="Identificador do job")
+    status: str = Field(..., description="queued, running, completed, failed ou canceled")
+    format: str = Field(..., description="Formato do resultado: ndjson ou csv (gzip)")
+    total_gtins: int = Field(..., description="GTINs no arquivo enviado")
+    processed_gtins: int = Field(..., description="GTINs já processados")
+    found_gtins: int = Field(..., description="GTINs encontrados (consomem cota)")
+    invalid_gtins: int = Field(..., description="GTINs rejeitados na validação")
+    progress: float = Field(..., description="Fração processada (0 a 1)")
+    cancel_requested: bool = Field(..., description="Cancelamento solicitado")
+    error: Optional[str] = Field(None, description="Motivo da falha, se houver")
+    result_url: Optional[str] = Field(None, description="URL de download do resultado (quando concluído)")
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class BulkJobListResponse(BaseModel):
+    """Lista dos jobs mais recentes da organização."""
+
+    jobs: list[BulkJobResponse]
@@ -47,12 +47,26 @@ class BatchRequest(BaseModel):
     )
 
 
+class StreamBatchRequest(BaseModel):
+    """Schema de requisição para consulta em lote com resposta em streaming."""
+    
+    gtins: list[str] = Field(
+        ...,
+        description="Lista de GTINs para consultar (limite definido pelo batch_limit do plano)",
+        min_length=1,
+    )
+
+
 class BatchResponseItem(BaseModel):
     """Item da resposta de consulta em lote."""
     
     gtin: str = Field(..., description="GTIN consultado")
     found: bool = Field(..., description="Indica se o produto foi encontrado")
     product: Optional[ProductResponse] = Field(None, description="Dados do produto, se encontrado")
+    error: Optional[str] = Field(
+        None,
+        description="Motivo da rejeição do GTIN (empty, invalid_length, invalid_check_digit)",
+    )
 
 
 class BatchResponse(BaseModel):
@@ -70,8 +84,12 @@ class SearchResponse(BaseModel):
         None,
         description="Total de registros que atendem aos filtros (desativado para evitar consultas caras)",
     )
-    offset: int = Field(..., description="Offset atual da paginação")
+    offset: int = Field(..., description="Offset atual da paginação (0 quando paginado por cursor)")
     limit: int = Field(..., description="Limite de itens por página (fixo em 10)")
     returned: int = Field(..., description="Quantidade de itens retornados nesta página")
     has_more: bool = Field(..., description="Indica se existe próxima página")
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Cursor opaco da próxima página (parâmetro `cursor`); null na última página",
+    )
     items: list[ProductResponse] = Field(..., description="Itens da página")
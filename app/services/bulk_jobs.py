@@ -0,0 +1,493 @@
+"""
+Serviço de jobs de consulta em lote assíncronos.
+================================================
+Processa arquivos com milhões de GTINs fora do ciclo de requisição.
+
+- Entrada: um GTIN por linha (texto ou CSV; vale a primeira coluna), salva
+  em BULK_JOBS_DIR/<job_id>/input.txt. Linhas sem dígitos (cabeçalho,
+  linhas vazias) são ignoradas.
+- Pool de threads por processo: cada worker reivindica um job com
+  FOR UPDATE SKIP LOCKED, então vários processos/containers dividem a fila.
+- BULK_JOBS_DIR precisa ser um volume compartilhado (NFS, EFS, volume do
+  orquestrador) montado no mesmo caminho em todos os containers da API e
+  dos workers: o upload, o processamento e o download do resultado podem
+  cair em containers diferentes. Sem isso, o worker falha o job ao não
+  encontrar a entrada e o download responde 410.
+- Processamento em chunks de BULK_JOBS_CHUNK_SIZE com uma única query por
+  chunk (query_products_by_gtin14, parâmetro array).
+- Resultado em gzip (NDJSON ou CSV), um membro gzip por chunk. O checkpoint
+  (offset da entrada, bytes válidos da saída, contadores e uso da cota) é
+  gravado na mesma transação: após uma queda, o job volta para a fila e
+  continua do último chunk confirmado, sem duplicar linhas nem cobrança.
+- Cota: apenas GTINs encontrados consomem a cota mensal (como no lote do
+  dashboard). Antes de cada chunk, o worker reserva as unidades no mesmo
+  contador do Redis das consultas online (app.core.quota) e devolve a sobra
+  após o checkpoint: jobs e tráfego online não gastam o mesmo saldo. Sem
+  Redis, o chunk é limitado ao saldo restante no banco.
+"""
+
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import anyio
+import redis
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from app.core import quota
+from app.core.config import settings
+from app.core.gtin import canonicalize_gtins
+from app.core.products import query_products_by_gtin14
+from app.core.usage import (
+    get_current_month_start_sao_paulo,
+    get_organization_monthly_usage,
+    record_api_usage_batch,
+    record_org_usage_monthly_batch,
+)
+from app.db.models import BulkJob, Organization
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+OUTPUT_FORMATS = ("ndjson", "csv")
+
+CSV_COLUMNS = [
+    "gtin",
+    "found",
+    "error",
+    "product_gtin",
+    "gtin_type",
+    "brand",
+    "product_name",
+    "origin_country",
+    "ncm",
+    "cest",
+    "gross_weight_value",
+    "gross_weight_unit",
+]
+
+
+class BulkJobInputError(Exception):
+    """Arquivo de entrada rejeitado (vazio ou acima do limite)."""
+
+
+# =============================================================================
+# Armazenamento em disco
+# =============================================================================
+
+
+def job_dir(job_id: str) -> Path:
+    return Path(settings.BULK_JOBS_DIR) / job_id
+
+
+def input_path(job_id: str) -> Path:
+    return job_dir(job_id) / "input.txt"
+
+
+def result_path(job: BulkJob) -> Path:
+    return job_dir(job.id) / f"result.{job.output_format}.gz"
+
+
+def _has_digit(line: bytes) -> bool:
+    return any(48 <= b <= 57 for b in line)
+
+
+async def store_upload(job_id: str, stream: AsyncIterator[bytes], gzip_encoded: bool = False) -> int:
+    """
+    Grava o corpo da requisição em disco (descompactando gzip, se for o caso)
+    e retorna a quantidade de linhas com GTIN. A escrita roda em threads
+    (anyio), sem bloquear o event loop.
+
+    Raises:
+        BulkJobInputError: arquivo sem GTINs ou acima de BULK_JOBS_MAX_GTINS.
+    """
+    path = input_path(job_id)
+    await run_in_threadpool(path.parent.mkdir, parents=True, exist_ok=True)
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzip_encoded else None
+
+    total = 0
+    pending = b""
+    last_byte = b"\n"
+    try:
+        async with await anyio.open_file(path, "wb") as f:
+            async for chunk in stream:
+                if decompressor is not None:
+                    chunk = decompressor.decompress(chunk)
+                if not chunk:
+                    continue
+                await f.write(chunk)
+                last_byte = chunk[-1:]
+
+                # Conta linhas completas; a última (parcial) segue para o próximo chunk
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                total += sum(1 for line in lines if _has_digit(line))
+                if total > settings.BULK_JOBS_MAX_GTINS:
+                    raise BulkJobInputError(
+                        f"Máximo de {settings.BULK_JOBS_MAX_GTINS} GTINs por job."
+                    )
+
+            if decompressor is not None:
+                tail = decompressor.flush()
+                if tail:
+                    await f.write(tail)
+                    last_byte = tail[-1:]
+                    pending += tail
+            # Garante quebra de linha final (o checkpoint avança por linhas inteiras)
+            if last_byte != b"\n":
+                await f.write(b"\n")
+    except zlib.error:
+        await run_in_threadpool(discard_job_files, job_id)
+        raise BulkJobInputError("Corpo gzip inválido.")
+    except BulkJobInputError:
+        await run_in_threadpool(discard_job_files, job_id)
+        raise
+
+    for line in pending.split(b"\n"):
+        if _has_digit(line):
+            total += 1
+
+    if total == 0:
+        await run_in_threadpool(discard_job_files, job_id)
+        raise BulkJobInputError("Nenhum GTIN encontrado no arquivo enviado.")
+    if total > settings.BULK_JOBS_MAX_GTINS:
+        await run_in_threadpool(discard_job_files, job_id)
+        raise BulkJobInputError(f"Máximo de {settings.BULK_JOBS_MAX_GTINS} GTINs por job.")
+    return total
+
+
+def discard_job_files(job_id: str) -> None:
+    shutil.rmtree(job_dir(job_id), ignore_errors=True)
+
+
+# =============================================================================
+# Formatação do resultado
+# =============================================================================
+
+
+def _parse_line(line: bytes) -> str:
+    """Extrai o GTIN (primeira coluna) de uma linha de texto/CSV."""
+    value = line.decode("utf-8", errors="replace").strip()
+    for sep in (",", ";", "\t"):
+        if sep in value:
+            value = value.split(sep, 1)[0]
+    return value.strip().strip('"').strip()
+
+
+def _encode_ndjson(items: list[dict]) -> bytes:
+    lines = [json.dumps(item, default=str, ensure_ascii=False, separators=(",", ":")) for item in items]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _encode_csv(items: list[dict], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    for item in items:
+        product = item["product"] or {}
+        writer.writerow([
+            item["gtin"],
+            "true" if item["found"] else "false",
+            item["error"] or "",
+            product.get("gtin", ""),
+            product.get("gtin_type") if product.get("gtin_type") is not None else "",
+            product.get("brand") or "",
+            product.get("product_name") or "",
+            product.get("origin_country") or "",
+            product.get("ncm") or "",
+            "|".join(product.get("cest") or []),
+            product.get("gross_weight_value") if product.get("gross_weight_value") is not None else "",
+            product.get("gross_weight_unit") or "",
+        ])
+    return buffer.getvalue().encode("utf-8")
+
+
+# =============================================================================
+# Worker
+# =============================================================================
+
+
+def claim_next_job(worker_id: str) -> Optional[str]:
+    """
+    Reivindica o próximo job da fila (ou um job "running" cujo worker parou
+    de dar sinal há mais de BULK_JOBS_STALE_SECONDS). Seguro entre processos.
+    """
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        job_id = db.execute(text("""
+            UPDATE bulk_jobs
+            SET status = 'running',
+                worker_id = :worker_id,
+                heartbeat_at = :now,
+                started_at = COALESCE(started_at, :now)
+            WHERE id = (
+                SELECT id FROM bulk_jobs
+                WHERE status = 'queued'
+                   OR (status = 'running' AND heartbeat_at < :stale_before)
+                ORDER BY created_at
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id
+        """), {
+            "worker_id": worker_id,
+            "now": now,
+            "stale_before": now - timedelta(seconds=settings.BULK_JOBS_STALE_SECONDS),
+        }).scalar()
+        db.commit()
+        return job_id
+    finally:
+        db.close()
+
+
+def _finish(db, job: BulkJob, status: str, error: Optional[str] = None) -> None:
+    job.status = status
+    job.error = error
+    job.finished_at = datetime.utcnow()
+    job.worker_id = None
+    db.commit()
+
+
+def _read_chunk(f, limit: int) -> list[str]:
+    """Lê até `limit` GTINs a partir da posição atual do arquivo."""
+    raws: list[str] = []
+    while len(raws) < limit:
+        line = f.readline()
+        if not line:
+            break
+        if _has_digit(line):
+            raws.append(_parse_line(line))
+    return raws
+
+
+def _hold_quota(db, org: Organization, usage_month, units: int) -> tuple[int, bool]:
+    """
+    Reserva até `units` da cota mensal para o próximo chunk.
+
+    Returns:
+        (unidades reservadas, se foram somadas ao contador do Redis)
+    """
+    client = quota.quota_client()
+    if client is not None:
+        try:
+            held = quota.hold(
+                client,
+                org.id,
+                usage_month,
+                org.monthly_limit,
+                units,
+                seed=lambda: get_organization_monthly_usage(db, org.id),
+            )
+            return held, True
+        except redis.RedisError as e:
+            logger.warning("Redis error na reserva de cota do job (usando o banco): %s", e)
+
+    if org.monthly_limit > 0:
+        units = min(units, org.monthly_limit - get_organization_monthly_usage(db, org.id))
+    return max(units, 0), False
+
+
+def process_job(job_id: str, worker_id: str, stop_event: threading.Event) -> None:
+    """Processa um job reivindicado até concluir, ser cancelado ou perder o lease."""
+    db = SessionLocal()
+    try:
+        job = db.get(BulkJob, job_id)
+        if job is None or job.worker_id != worker_id:
+            return
+        org = db.get(Organization, job.organization_id)
+        out_path = result_path(job)
+
+        if job.output_bytes > 0 and not out_path.exists():
+            _finish(db, job, "failed", "Arquivo de resultado parcial não encontrado para retomar o job.")
+            return
+
+        if not input_path(job_id).exists():
+            _finish(
+                db, job, "failed",
+                "Arquivo de entrada não encontrado (BULK_JOBS_DIR precisa ser compartilhado entre containers).",
+            )
+            return
+
+        with open(input_path(job_id), "rb") as f_in, open(out_path, "r+b" if out_path.exists() else "wb") as f_out:
+            # Descarta qualquer escrita posterior ao último checkpoint
+            f_out.truncate(job.output_bytes)
+            f_out.seek(job.output_bytes)
+            f_in.seek(job.input_offset)
+
+            while True:
+                db.refresh(job)
+                if job.worker_id != worker_id or job.status != "running":
+                    return  # lease perdido para outro worker
+                if job.cancel_requested:
+                    _finish(db, job, "canceled")
+                    return
+                if stop_event.is_set():
+                    # Shutdown: devolve o job para a fila, retomável por outro worker
+                    job.status = "queued"
+                    job.worker_id = None
+                    db.commit()
+                    return
+
+                usage_month = get_current_month_start_sao_paulo()
+                held, counted = _hold_quota(db, org, usage_month, settings.BULK_JOBS_CHUNK_SIZE)
+                if held <= 0:
+                    _finish(db, job, "failed", f"Limite mensal excedido ({org.monthly_limit} consultas).")
+                    return
+
+                charged = 0
+                try:
+                    raws = _read_chunk(f_in, held)
+                    header = job.output_format == "csv" and job.output_bytes == 0
+                    if not raws:
+                        if header:
+                            data = gzip.compress(_encode_csv([], header=True))
+                            f_out.write(data)
+                            job.output_bytes += len(data)
+                        _finish(db, job, "completed")
+                        return
+
+                    checks = canonicalize_gtins(raws)
+                    found = query_products_by_gtin14(db, list({c.gtin14 for c in checks if c.valid}))
+
+                    items = []
+                    found_count = 0
+                    for check in checks:
+                        product = found.get(check.gtin14) if check.valid else None
+                        if product is not None:
+                            found_count += 1
+                        items.append({
+                            "gtin": check.raw,
+                            "found": product is not None,
+                            "product": product,
+                            "error": check.reason,
+                        })
+                    invalid_count = sum(1 for c in checks if not c.valid)
+
+                    payload = _encode_csv(items, header) if job.output_format == "csv" else _encode_ndjson(items)
+                    data = gzip.compress(payload)
+                    f_out.write(data)
+                    f_out.flush()
+                    os.fsync(f_out.fileno())
+
+                    # Checkpoint + cobrança na mesma transação (condicionado ao lease)
+                    result = db.execute(text("""
+                        UPDATE bulk_jobs
+                        SET input_offset = :input_offset,
+                            output_bytes = output_bytes + :written,
+                            processed_gtins = processed_gtins + :processed,
+                            found_gtins = found_gtins + :found,
+                            invalid_gtins = invalid_gtins + :invalid,
+                            heartbeat_at = :now
+                        WHERE id = :id AND worker_id = :worker_id AND status = 'running'
+                    """), {
+                        "input_offset": f_in.tell(),
+                        "written": len(data),
+                        "processed": len(checks),
+                        "found": found_count,
+                        "invalid": invalid_count,
+                        "now": datetime.utcnow(),
+                        "id": job_id,
+                        "worker_id": worker_id,
+                    })
+                    if result.rowcount != 1:
+                        db.rollback()
+                        return
+                    not_found = len(checks) - found_count
+                    record_org_usage_monthly_batch(db, org.id, success_count=found_count, error_count=not_found)
+                    if job.api_key_id is not None:
+                        record_api_usage_batch(db, job.api_key_id, success_count=found_count, error_count=not_found)
+                    db.commit()
+                    charged = found_count
+                finally:
+                    if counted:
+                        # Devolve ao contador o que foi reservado e não consumido
+                        quota.adjust(org.id, usage_month, charged - held)
+    except Exception as e:
+        logger.exception("Falha ao processar job em lote %s", job_id)
+        db.rollback()
+        job = db.get(BulkJob, job_id)
+        if job is not None and job.worker_id == worker_id:
+            _finish(db, job, "failed", f"Erro interno ao processar o job: {e}")
+    finally:
+        db.close()
+
+
+def purge_expired_results() -> None:
+    """Remove arquivos de jobs finalizados há mais de BULK_JOBS_RETENTION_DAYS."""
+    cutoff = datetime.utcnow() - timedelta(days=settings.BULK_JOBS_RETENTION_DAYS)
+    db = SessionLocal()
+    try:
+        rows = db.execute(text("""
+            SELECT id FROM bulk_jobs
+            WHERE status IN ('completed', 'failed', 'canceled') AND finished_at < :cutoff
+        """), {"cutoff": cutoff}).fetchall()
+    finally:
+        db.close()
+    for (job_id,) in rows:
+        if job_dir(job_id).exists():
+            discard_job_files(job_id)
+
+
+_PURGE_INTERVAL_SECONDS = 3600
+_stop_event = threading.Event()
+_threads: list[threading.Thread] = []
+
+
+def _worker_loop(worker_id: str) -> None:
+    next_purge = 0.0
+    while not _stop_event.is_set():
+        try:
+            if worker_id.endswith(":0") and time.monotonic() >= next_purge:
+                next_purge = time.monotonic() + _PURGE_INTERVAL_SECONDS
+                purge_expired_results()
+
+            job_id = claim_next_job(worker_id)
+            if job_id is None:
+                _stop_event.wait(settings.BULK_JOBS_POLL_SECONDS)
+                continue
+            logger.info("Worker %s processando job em lote %s", worker_id, job_id)
+            process_job(job_id, worker_id, _stop_event)
+        except Exception as e:
+            logger.warning("Erro no worker de jobs em lote %s: %s", worker_id, e)
+            _stop_event.wait(settings.BULK_JOBS_POLL_SECONDS)
+
+
+def start_bulk_job_workers() -> None:
+    """Inicia BULK_JOBS_WORKERS threads de processamento neste processo."""
+    if settings.BULK_JOBS_WORKERS <= 0 or _threads:
+        return
+    Path(settings.BULK_JOBS_DIR).mkdir(parents=True, exist_ok=True)
+    _stop_event.clear()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    for i in range(settings.BULK_JOBS_WORKERS):
+        thread = threading.Thread(
+            target=_worker_loop,
+            args=(f"{prefix}:{i}",),
+            name=f"bulk-job-worker-{i}",
+            daemon=True,
+        )
+        thread.start()
+        _threads.append(thread)
+
+
+def stop_bulk_job_workers(timeout: float = 10.0) -> None:
+    """Sinaliza parada; jobs em andamento voltam para a fila no próximo chunk."""
+    _stop_event.set()
+    for thread in _threads:
+        thread.join(timeout=timeout)
+    _threads.clear()
@@ -1,9 +1,13 @@
 import csv
 import os
+from collections import Counter
 from dotenv import load_dotenv
 import psycopg2
 from io import StringIO
 
+from app.core.gtin import canonicalize_gtin
+from app.core.products import CONTENT_HASH_SQL, PAYLOAD_JSON_SQL
+
 load_dotenv()
 
 PG_HOST = os.getenv("PG_HOST", "localhost")
@@ -47,12 +51,6 @@ def parse_weight(value: str) -> float | None:
     except ValueError:
         return None
 
-def normalize_gtin(raw: str) -> str | None:
-    if not raw:
-        return None
-    digits = "".join(ch for ch in raw if ch.isdigit())
-    return digits or None
-
 def main():
     conn = psycopg2.connect(
         host=PG_HOST,
@@ -70,6 +68,7 @@ def main():
     # Ordem das colunas deve bater com COPY
     columns = [
         "gtin",
+        "gtin14",
         "gtin_type",
         "brand",
         "product_name",
@@ -81,12 +80,17 @@ def main():
         "gross_weight_unit",
     ]
 
+    # GTINs rejeitados pela validação GS1, por motivo
+    rejected = Counter()
+
     with open(CSV_PATH, "r", encoding="latin-1") as f:
         reader = csv.DictReader(f, delimiter=";")
         for row in reader:
-            gtin = normalize_gtin(row.get("GTIN"))
-            if not gtin:
-                continue  # pula registros sem GTIN
+            check = canonicalize_gtin(row.get("GTIN") or "")
+            if not check.valid:
+                rejected[check.reason] += 1
+                continue  # pula registros sem GTIN ou com GTIN inválido
+            gtin = check.digits
 
             # TPGTIN -> smallint
             gtin_type_raw = (row.get("TPGTIN") or "").strip()
@@ -111,6 +115,7 @@ def main():
 
             writer.writerow([
                 gtin,
+                check.gtin14,
                 gtin_type,
                 brand,
                 product_name,
@@ -123,22 +128,72 @@ def main():
             ])
 
 
+    if rejected:
+        print(f"GTINs rejeitados na validação: {dict(rejected)}")
+
     buffer.seek(0)
 
     with conn.cursor() as cur:
         # você pode limpar antes se for um load inicial:
         # cur.execute("TRUNCATE TABLE products;")
 
+        # Carga via tabela temporária: as linhas desta carga ficam
+        # identificáveis para recalcular payload_json / content_hash abaixo
+        cur.execute("CREATE TEMP TABLE products_load (LIKE products INCLUDING DEFAULTS) ON COMMIT DROP")
+
         copy_sql = f"""
-            COPY products ({", ".join(columns)})
+            COPY products_load ({", ".join(columns)})
             FROM STDIN WITH (FORMAT csv, DELIMITER ';', NULL '');
         """
 
         cur.copy_expert(copy_sql, buffer)
 
+        cur.execute(f"""
+            INSERT INTO products ({", ".join(columns)})
+            SELECT {", ".join(columns)} FROM products_load
+        """)
+
+        # JSON pré-computado da resposta (products.payload_json), se a coluna existir
+        cur.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'products' AND column_name = 'payload_json'
+        """)
+        if cur.fetchone():
+            # Todas as linhas tocadas pela carga (o JSON antigo pode estar
+            # desatualizado) e as que ainda não têm JSON
+            cur.execute(f"""
+                UPDATE products
+                SET payload_json = {PAYLOAD_JSON_SQL}
+                WHERE gtin IN (SELECT gtin FROM products_load)
+                   OR payload_json IS NULL
+            """)
+            print(f"payload_json gerado para {cur.rowcount} produtos.")
+
+        # Validadores HTTP (ETag / Last-Modified) das linhas tocadas pela carga;
+        # Last-Modified só avança quando o conteúdo de fato mudou
+        cur.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'products' AND column_name = 'content_hash'
+        """)
+        if cur.fetchone():
+            cur.execute(f"""
+                UPDATE products
+                SET content_hash = {CONTENT_HASH_SQL},
+                    content_updated_at = now()
+                WHERE (gtin IN (SELECT gtin FROM products_load) OR content_hash IS NULL)
+                  AND content_hash IS DISTINCT FROM {CONTENT_HASH_SQL}
+            """)
+            print(f"content_hash gerado para {cur.rowcount} produtos.")
+
     conn.commit()
     conn.close()
     print("Carga concluída com sucesso.")
 
+    # Produtos mudaram: invalidar o cache de produtos dos workers da API
+    from app.core.product_cache import invalidate_product_cache
+
+    invalidate_product_cache()
+    print("Cache de produtos invalidado.")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: lookups por worker com sessão síncrona vs AsyncSession.
+==================================================================
+
+Simula um worker (um event loop) atendendo BENCH_REQUESTS lookups de GTIN
+com até N requisições simultâneas, como as rotas `async def` de
+app.api.v1.gtins, e reporta req/s para:
+
+- sync:        Session (psycopg2) chamada dentro do event loop, como as
+               rotas faziam antes (cada ida ao banco bloqueia o loop);
+- threadpool:  Session em run_in_threadpool (o que o FastAPI faz com rotas
+               `def`; limitado pelo threadpool e pelo GIL);
+- async:       AsyncSession (asyncpg), como as rotas fazem agora.
+
+Mede só o Postgres: os caches de produto são ignorados. GTINs sorteados
+da tabela products (metade inexistentes, prefixo 200).
+
+Uso:
+    python scripts/bench_async_lookup.py
+
+Variáveis úteis:
+    BENCH_REQUESTS=2000        (lookups por medição)
+    BENCH_CONCURRENCY=1,10,50  (requisições simultâneas no worker)
+    BENCH_BATCH=1              (GTINs por lookup; 1 = /v1/gtins/{gtin})
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.core.gtin import compute_check_digit  # noqa: E402
+from app.core.products import query_products_by_gtin14, query_products_by_gtin14_async  # noqa: E402
+from app.db.session import AsyncSessionLocal, SessionLocal, async_engine  # noqa: E402
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "2000"))
+CONCURRENCY = [int(c) for c in os.getenv("BENCH_CONCURRENCY", "1,10,50").split(",") if c.strip()]
+BATCH = int(os.getenv("BENCH_BATCH", "1"))
+
+
+def sample_gtins() -> list[str]:
+    """GTIN-14 existentes (até 5000) mais o mesmo número de inexistentes."""
+    db = SessionLocal()
+    try:
+        existing = [
+            row.gtin14
+            for row in db.execute(text("SELECT gtin14 FROM products WHERE gtin14 IS NOT NULL LIMIT 5000"))
+        ]
+    finally:
+        db.close()
+    absent = []
+    for i in range(max(len(existing), 100)):
+        body = f"0200{i:09d}"
+        absent.append(body + str(compute_check_digit(body)))
+    return existing + absent
+
+
+def lookup_sync(gtins: list[str]) -> None:
+    db = SessionLocal()
+    try:
+        query_products_by_gtin14(db, gtins)
+    finally:
+        db.close()
+
+
+async def handler_sync(gtins: list[str]) -> None:
+    lookup_sync(gtins)
+
+
+async def handler_threadpool(gtins: list[str]) -> None:
+    await run_in_threadpool(lookup_sync, gtins)
+
+
+async def handler_async(gtins: list[str]) -> None:
+    async with AsyncSessionLocal() as db:
+        await query_products_by_gtin14_async(db, gtins)
+
+
+HANDLERS = {
+    "sync": handler_sync,
+    "threadpool": handler_threadpool,
+    "async": handler_async,
+}
+
+
+async def run(handler, pool: list[str], concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            await handler(random.sample(pool, BATCH))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(REQUESTS)))
+    return REQUESTS / (time.perf_counter() - t0)
+
+
+async def main() -> None:
+    pool = sample_gtins()
+    print(f"[BENCH] {REQUESTS} lookups de {BATCH} GTIN(s), {len(pool)} GTINs sorteáveis")
+    try:
+        # Aquece os dois pools de conexões
+        for handler in HANDLERS.values():
+            await run(handler, pool, max(CONCURRENCY))
+
+        print(f"{'concorrência':>12} " + " ".join(f"{name:>12}" for name in HANDLERS))
+        for concurrency in CONCURRENCY:
+            results = [await run(handler, pool, concurrency) for handler in HANDLERS.values()]
+            print(f"{concurrency:>12} " + " ".join(f"{rps:>8.0f} r/s" for rps in results))
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""
+Benchmark: latência da autenticação por API key sob concorrência.
+=================================================================
+
+Mede a dependência get_api_key_auth como uma requisição a executa (sessão
+nova por chamada, devolvida ao pool ao final) em três cenários:
+
+- legado: duas queries ORM (api_keys pela key em texto simples e depois
+  organizations), como antes do key_hash;
+- join:   cache desligado, uma query api_keys JOIN organizations por key_hash;
+- cache:  cache de autenticação aquecido (sem ida ao banco).
+
+Cada cenário roda com N threads simultâneas; reporta p50/p95/p99 e vazão.
+Nada é persistido (rollback ao fim de cada chamada; o last_used_at fica
+no buffer em memória de app.core.last_used e não é gravado).
+
+Uso:
+    python scripts/bench_auth.py
+
+Variáveis úteis:
+    BENCH_API_KEY=sk_live_...   (padrão: primeira key ativa de plano pago)
+    BENCH_ITERATIONS=500        (chamadas por thread)
+    BENCH_CONCURRENCY=1,8,32    (threads simultâneas)
+"""
+
+from __future__ import annotations
+
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.api.deps import get_api_key_auth  # noqa: E402
+from app.core.auth_cache import auth_cache  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.db.models import ApiKey, Organization  # noqa: E402
+from app.db.session import SessionLocal  # noqa: E402
+
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "500"))
+CONCURRENCY = [int(c) for c in os.getenv("BENCH_CONCURRENCY", "1,8,32").split(",") if c.strip()]
+
+
+def pick_api_key() -> str:
+    key = os.getenv("BENCH_API_KEY")
+    if key:
+        return key
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(ApiKey.key)
+            .join(Organization, Organization.id == ApiKey.organization_id)
+            .filter(ApiKey.is_active.is_(True), Organization.plan != "basic")
+            .first()
+        )
+    finally:
+        db.close()
+    if row is None:
+        sys.exit("Nenhuma API key ativa de plano pago encontrada; defina BENCH_API_KEY.")
+    return row.key
+
+
+def legacy_auth(db, api_key: str) -> None:
+    """Formato anterior: key em texto simples + segunda query da organização."""
+    record = db.query(ApiKey).filter(ApiKey.key == api_key).first()
+    db.query(Organization).filter(Organization.id == record.organization_id).first()
+
+
+def dependency_auth(db, api_key: str) -> None:
+    get_api_key_auth(SimpleNamespace(state=SimpleNamespace()), api_key, db)
+
+
+def call(fn, api_key: str) -> float:
+    t0 = time.perf_counter()
+    db = SessionLocal()
+    try:
+        fn(db, api_key)
+    finally:
+        db.rollback()
+        db.close()
+    return (time.perf_counter() - t0) * 1000
+
+
+def run(fn, api_key: str, threads: int) -> tuple[list[float], float]:
+    timings: list[float] = []
+    lock = threading.Lock()
+
+    def worker() -> None:
+        local = [call(fn, api_key) for _ in range(ITERATIONS)]
+        with lock:
+            timings.extend(local)
+
+    for _ in range(10):
+        call(fn, api_key)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for _ in range(threads):
+            pool.submit(worker)
+    return timings, time.perf_counter() - t0
+
+
+def report(label: str, timings: list[float], elapsed: float) -> None:
+    timings = sorted(timings)
+
+    def pct(p: float) -> float:
+        return timings[max(int(len(timings) * p) - 1, 0)]
+
+    print(
+        f"  {label:<7} p50={statistics.median(timings):7.3f}ms  "
+        f"p95={pct(0.95):7.3f}ms  p99={pct(0.99):7.3f}ms  "
+        f"{len(timings) / elapsed:9.0f} auth/s"
+    )
+
+
+def main() -> None:
+    api_key = pick_api_key()
+    print(f"[BENCH] {ITERATIONS} chamadas por thread, key {api_key[:12]}...")
+
+    for threads in CONCURRENCY:
+        print(f"{threads} thread(s):")
+        report("legado", *run(legacy_auth, api_key, threads))
+
+        settings.AUTH_CACHE_ENABLED = False
+        report("join", *run(dependency_auth, api_key, threads))
+
+        settings.AUTH_CACHE_ENABLED = True
+        auth_cache.clear()
+        report("cache", *run(dependency_auth, api_key, threads))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Micro-benchmark: lookup em lote com IN (:gtin_0, ...) vs gtin14 = ANY(:gtin14s).
+================================================================================
+
+Compara o formato antigo (um placeholder por GTIN, SQL diferente para cada
+tamanho de lote) com o statement único de app.core.products, em lotes de
+1, 10 e 100 GTINs. Mede apenas o Postgres (sem caches).
+
+Se a tabela products tiver menos GTINs que o maior lote, insere GTINs
+sintéticos (prefixo 200, faixa GS1 de uso interno) dentro de uma transação
+que é desfeita ao final: nada é persistido.
+
+Uso:
+    python scripts/bench_batch_lookup.py
+
+Variáveis úteis:
+    BENCH_ITERATIONS=200   (execuções por tamanho e abordagem)
+    BENCH_SIZES=1,10,100   (tamanhos de lote)
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.core.gtin import compute_check_digit  # noqa: E402
+from app.core.products import PRODUCT_COLUMNS, query_products_by_gtin14  # noqa: E402
+from app.db.session import SessionLocal  # noqa: E402
+
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "200"))
+SIZES = [int(s) for s in os.getenv("BENCH_SIZES", "1,10,100").split(",") if s.strip()]
+
+
+def query_products_in_list(db, gtin14s: list[str]) -> dict[str, dict]:
+    """Formato anterior: IN com um placeholder por GTIN."""
+    placeholders = ", ".join([f":gtin_{i}" for i in range(len(gtin14s))])
+    query = text(f"""
+        SELECT DISTINCT ON (gtin14) gtin14, {PRODUCT_COLUMNS}
+        FROM products
+        WHERE gtin14 IN ({placeholders})
+        ORDER BY gtin14, gtin
+    """)
+    params = {f"gtin_{i}": g for i, g in enumerate(gtin14s)}
+    rows = db.execute(query, params).fetchall()
+    return {row.gtin14: row for row in rows}
+
+
+def seed_if_needed(db, needed: int) -> list[str]:
+    """Retorna GTIN-14 existentes, completando com sintéticos (não commitados)."""
+    gtin14s = [
+        row[0]
+        for row in db.execute(
+            text("SELECT gtin14 FROM products WHERE gtin14 IS NOT NULL LIMIT :n"),
+            {"n": needed * 10},
+        )
+    ]
+    missing = needed * 10 - len(gtin14s)
+    if missing <= 0:
+        return gtin14s
+
+    print(f"[SEED] Inserindo {missing} GTINs sintéticos (transação desfeita ao final)...")
+    synthetic = []
+    for i in range(missing):
+        body = f"200{i:09d}"
+        gtin = body + str(compute_check_digit(body))
+        synthetic.append({"gtin": gtin, "gtin14": gtin.rjust(14, "0")})
+    db.execute(
+        text("INSERT INTO products (gtin, gtin14) VALUES (:gtin, :gtin14) ON CONFLICT DO NOTHING"),
+        synthetic,
+    )
+    return gtin14s + [s["gtin14"] for s in synthetic]
+
+
+def run(fn, db, pool: list[str], size: int) -> list[float]:
+    # Aquecimento (conexão, catálogo, compilação do SQLAlchemy)
+    for _ in range(5):
+        fn(db, random.sample(pool, size))
+
+    timings = []
+    for _ in range(ITERATIONS):
+        batch = random.sample(pool, size)
+        t0 = time.perf_counter()
+        fn(db, batch)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return timings
+
+
+def report(label: str, size: int, timings: list[float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"  {label:<6} n={size:<4} "
+        f"média={statistics.mean(timings):7.3f}ms  "
+        f"p50={statistics.median(timings):7.3f}ms  "
+        f"p95={p95:7.3f}ms"
+    )
+
+
+def main() -> None:
+    db = SessionLocal()
+    try:
+        pool = seed_if_needed(db, max(SIZES))
+        print(f"[BENCH] {ITERATIONS} execuções por tamanho, amostra de {len(pool)} GTINs")
+        for size in SIZES:
+            print(f"Lote de {size} GTIN(s):")
+            report("IN", size, run(query_products_in_list, db, pool, size))
+            report("ANY", size, run(query_products_by_gtin14, db, pool, size))
+    finally:
+        db.rollback()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
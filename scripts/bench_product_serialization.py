@@ -0,0 +1,121 @@
+"""
+Benchmark: custo de CPU por produto na serialização das respostas.
+==================================================================
+
+Compara, sem banco e sem HTTP, o caminho anterior dos endpoints de consulta
+(dict → ProductResponse → validação contra o response_model → JSON, como o
+FastAPI faz em serialize_response) com o encoder direto de
+app.core.product_json. Mede o produto único e o lote de 100.
+
+Uso:
+    python scripts/bench_product_serialization.py
+
+Variáveis úteis:
+    BENCH_ITERATIONS=2000   (respostas serializadas por cenário)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from pydantic import TypeAdapter
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.core.product_json import encode_batch_item, encode_product  # noqa: E402
+from app.schemas.product import BatchResponse, BatchResponseItem, ProductResponse  # noqa: E402
+
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "2000"))
+BATCH_SIZE = 100
+
+
+def sample_product(i: int) -> dict:
+    return {
+        "gtin": f"789{i:010d}",
+        "gtin_type": 13,
+        "brand": "MARCA EXEMPLO",
+        "product_name": f"PRODUTO DE TESTE COM ACENTUAÇÃO {i}",
+        "origin_country": "BR",
+        "ncm": "22030000",
+        "cest": ["0302100", "0302200"],
+        "gross_weight_value": Decimal("1130.000"),
+        "gross_weight_unit": "GRM",
+    }
+
+
+product_adapter = TypeAdapter(ProductResponse)
+batch_adapter = TypeAdapter(BatchResponse)
+
+
+def pydantic_single(product: dict) -> bytes:
+    # Endpoint retorna o dict; o FastAPI valida contra o response_model e serializa
+    value = product_adapter.validate_python(product)
+    return json.dumps(product_adapter.dump_python(value, mode="json"), ensure_ascii=False).encode("utf-8")
+
+
+def fast_single(product: dict) -> bytes:
+    return encode_product(product).encode("utf-8")
+
+
+def pydantic_batch(products: list[dict]) -> bytes:
+    response = BatchResponse(
+        total_requested=len(products),
+        total_found=len(products),
+        results=[
+            BatchResponseItem(gtin=p["gtin"], found=True, product=ProductResponse(**p))
+            for p in products
+        ],
+    )
+    value = batch_adapter.validate_python(response)
+    return json.dumps(batch_adapter.dump_python(value, mode="json"), ensure_ascii=False).encode("utf-8")
+
+
+def fast_batch(products: list[dict]) -> bytes:
+    body = (
+        '{"total_requested":' + str(len(products))
+        + ',"total_found":' + str(len(products))
+        + ',"results":[' + ",".join(encode_batch_item(p["gtin"], p) for p in products) + "]}"
+    )
+    return body.encode("utf-8")
+
+
+def measure(fn, arg, products_per_call: int) -> float:
+    """Retorna microssegundos de CPU por produto."""
+    for _ in range(50):
+        fn(arg)
+    t0 = time.process_time()
+    for _ in range(ITERATIONS):
+        fn(arg)
+    elapsed = time.process_time() - t0
+    return elapsed / (ITERATIONS * products_per_call) * 1_000_000
+
+
+def main() -> None:
+    single = sample_product(0)
+    batch = [sample_product(i) for i in range(BATCH_SIZE)]
+
+    # Os dois caminhos precisam produzir o mesmo JSON
+    assert json.loads(pydantic_single(single)) == json.loads(fast_single(single))
+    assert json.loads(pydantic_batch(batch)) == json.loads(fast_batch(batch))
+
+    print(f"[BENCH] {ITERATIONS} respostas por cenário (CPU por produto)")
+    for label, slow, fast, arg, n in (
+        ("Produto único", pydantic_single, fast_single, single, 1),
+        (f"Lote de {BATCH_SIZE}", pydantic_batch, fast_batch, batch, BATCH_SIZE),
+    ):
+        before = measure(slow, arg, n)
+        after = measure(fast, arg, n)
+        print(f"{label}:")
+        print(f"  pydantic  {before:8.2f} µs/produto")
+        print(f"  direto    {after:8.2f} µs/produto  ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
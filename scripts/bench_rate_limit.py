@@ -0,0 +1,107 @@
+"""
+Benchmark: rate limit de lookup (janela deslizante em ZSET vs GCRA).
+====================================================================
+
+Executa os scripts Lua de app.core.rate_limit contra o Redis
+configurado (REDIS_URL), simulando N organizações no mesmo limite por
+minuto, e reporta para cada algoritmo:
+
+- vazão (checks/s) com as chamadas feitas em sequência e em N threads;
+- memória no Redis: MEMORY USAGE médio por chave e variação de
+  used_memory após preencher todas as chaves até o limite.
+
+As chaves usam o prefixo `bench:rl:` e são apagadas ao final.
+
+Uso:
+    python scripts/bench_rate_limit.py
+
+Variáveis úteis:
+    BENCH_ORGS=1000          (chaves/organizações simuladas)
+    BENCH_LIMIT=120          (req/min por chave; 120 = advanced/enterprise)
+    BENCH_CHECKS=20000       (checks por medição de vazão)
+    BENCH_CONCURRENCY=1,8    (threads simultâneas)
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.core.rate_limit import get_redis_client, redis_rate_limiter  # noqa: E402
+
+ORGS = int(os.getenv("BENCH_ORGS", "1000"))
+LIMIT = int(os.getenv("BENCH_LIMIT", "120"))
+CHECKS = int(os.getenv("BENCH_CHECKS", "20000"))
+CONCURRENCY = [int(c) for c in os.getenv("BENCH_CONCURRENCY", "1,8").split(",") if c.strip()]
+PREFIX = "bench:rl:"
+
+ALGORITHMS = {
+    "sliding_window": lambda key: redis_rate_limiter.check_sliding_window(key, LIMIT, 60),
+    "gcra": lambda key: redis_rate_limiter.check_gcra(key, LIMIT, 60),
+    # Lease local (RATE_LIMIT_LEASE_FRACTION do limite por chamada ao Redis)
+    "gcra_lease": lambda key: redis_rate_limiter.check_gcra_leased(key, LIMIT, 60),
+}
+
+
+def cleanup(client) -> None:
+    keys = list(client.scan_iter(f"{PREFIX}*", count=1000))
+    for start in range(0, len(keys), 1000):
+        client.delete(*keys[start:start + 1000])
+
+
+def throughput(check, name: str, threads: int) -> float:
+    per_thread = CHECKS // threads
+
+    def worker(offset: int) -> None:
+        for i in range(per_thread):
+            check(f"{PREFIX}{name}:tp:{(offset + i) % ORGS}")
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for t in range(threads):
+            pool.submit(worker, t * per_thread)
+    return per_thread * threads / (time.perf_counter() - t0)
+
+
+def memory(client, check, name: str) -> tuple[float, int]:
+    """Preenche ORGS chaves até o limite; retorna (bytes médios por chave, delta de used_memory)."""
+    before = int(client.info("memory")["used_memory"])
+    for org in range(ORGS):
+        key = f"{PREFIX}{name}:mem:{org}"
+        for _ in range(LIMIT):
+            check(key)
+    after = int(client.info("memory")["used_memory"])
+
+    sample = [f"{PREFIX}{name}:mem:{org}" for org in range(min(ORGS, 100))]
+    per_key = sum(client.memory_usage(key) or 0 for key in sample) / len(sample)
+    return per_key, after - before
+
+
+def main() -> None:
+    client = get_redis_client()
+    if client is None:
+        sys.exit("Redis indisponível (verifique REDIS_URL / REDIS_ENABLED).")
+
+    print(f"[BENCH] {ORGS} chaves, limite {LIMIT}/min, {CHECKS} checks por medição")
+    cleanup(client)
+    try:
+        for name, check in ALGORITHMS.items():
+            print(f"{name}:")
+            for threads in CONCURRENCY:
+                print(f"  {threads} thread(s): {throughput(check, name, threads):9.0f} checks/s")
+            per_key, delta = memory(client, check, name)
+            print(f"  memória: {per_key:8.0f} bytes/chave cheia, used_memory +{delta / 1024 / 1024:.1f} MiB")
+            cleanup(client)
+    finally:
+        cleanup(client)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmark: busca por substring sem índice vs com índices pg_trgm.
+=================================================================
+
+Cria uma tabela sintética `bench_trgm.products` (mesmas colunas da busca,
+BENCH_ROWS linhas com marcas/nomes combinados de listas de palavras) e
+executa a consulta do backend trgm (app.api.v1.gtins.build_trgm_search_query,
+primeira página e uma página por cursor) em duas fases:
+
+- seq scan:  sem índices trigram (como o backend postgres hoje);
+- trgm:      após criar os índices GIN gin_trgm_ops de brand e product_name.
+
+Reporta a mediana em ms por consulta e se o plano usou os índices.
+O schema `bench_trgm` é apagado ao final (BENCH_KEEP=true mantém).
+
+Uso:
+    python scripts/bench_trgm_search.py
+
+Variáveis úteis:
+    BENCH_ROWS=5000000   (linhas da tabela sintética)
+    BENCH_REPEAT=5       (execuções por consulta; reporta a mediana)
+    BENCH_KEEP=false     (manter o schema para inspeção manual)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.api.v1.gtins import SEARCH_LIMIT, build_trgm_search_query  # noqa: E402
+from app.db.session import engine  # noqa: E402
+
+ROWS = int(os.getenv("BENCH_ROWS", "5000000"))
+REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+KEEP = os.getenv("BENCH_KEEP", "false").lower() in ("true", "1", "yes")
+SCHEMA = "bench_trgm"
+
+BRANDS = [
+    "NESTLE", "AMBEV", "PERDIGAO", "SADIA", "YPE", "COLGATE", "UNILEVER", "PIRACANJUBA",
+    "ITAMBE", "TIROL", "BAUDUCCO", "GAROTO", "LACTA", "QUAKER", "CAMIL", "TIO JOAO",
+    "URBANO", "PILAO", "MELITTA", "TRES CORACOES", "ZEHN", "HEINEKEN", "BRAHMA", "SKOL",
+]
+NOUNS = [
+    "LEITE", "CHOCOLATE", "BISCOITO", "CERVEJA", "CAFE", "ARROZ", "FEIJAO", "DETERGENTE",
+    "SABONETE", "CREME DENTAL", "IOGURTE", "QUEIJO", "MANTEIGA", "REFRIGERANTE", "SUCO", "MACARRAO",
+]
+QUALIFIERS = [
+    "INTEGRAL", "DESNATADO", "ZERO", "TRADICIONAL", "EXTRA FORTE", "MORANGO", "BAUNILHA",
+    "LIMAO", "PILSEN", "GOURMET", "LIGHT", "ORIGINAL", "PREMIUM", "NATURAL", "FAMILIA", "MINI",
+]
+
+# (brand, product_name, ncm)
+QUERIES = [
+    ("NESTLE", None, None),
+    (None, "CHOCOLATE", None),
+    ("AMBEV", "CERVEJA", None),
+    (None, "LEITE INTEGRAL", "04012010"),
+    (None, "ABACAXI", None),  # sem resultado
+]
+
+
+def sql_array(words: list[str]) -> str:
+    return "ARRAY[" + ", ".join(f"'{w}'" for w in words) + "]"
+
+
+def create_table(conn) -> None:
+    print(f"[BENCH] Criando {SCHEMA}.products com {ROWS} linhas...")
+    t0 = time.perf_counter()
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    conn.execute(text(f"""
+        CREATE TABLE {SCHEMA}.products (
+            gtin VARCHAR(14) PRIMARY KEY,
+            gtin_type INTEGER,
+            brand TEXT,
+            product_name TEXT,
+            origin_country TEXT,
+            ncm TEXT,
+            cest TEXT,
+            gross_weight_value NUMERIC,
+            gross_weight_unit TEXT
+        )
+    """))
+    # Combinações pseudoaleatórias e determinísticas (hash do índice da linha)
+    conn.execute(text(f"""
+        INSERT INTO {SCHEMA}.products
+        SELECT
+            lpad((7890000000000 + i)::text, 13, '0'),
+            13,
+            b[1 + (hashint4(i) & 2147483647) % array_length(b, 1)],
+            n[1 + (hashint4(i + 1) & 2147483647) % array_length(n, 1)]
+                || ' ' || q[1 + (hashint4(i + 2) & 2147483647) % array_length(q, 1)]
+                || ' ' || (100 + (hashint4(i + 3) & 2147483647) % 900)::text || 'G',
+            'BR',
+            lpad(((hashint4(i + 4) & 2147483647) % 100)::text, 2, '0') || '012010',
+            NULL,
+            100 + (hashint4(i + 3) & 2147483647) % 900,
+            'GRM'
+        FROM generate_series(1, :rows) AS i,
+             LATERAL (SELECT {sql_array(BRANDS)} AS b, {sql_array(NOUNS)} AS n,
+                             {sql_array(QUALIFIERS)} AS q) AS words
+    """), {"rows": ROWS})
+    conn.execute(text(f"ANALYZE {SCHEMA}.products"))
+    conn.commit()
+    print(f"[BENCH] Tabela criada em {time.perf_counter() - t0:.1f}s")
+
+
+def create_indexes(conn) -> None:
+    t0 = time.perf_counter()
+    # Mesmos nomes de scripts/create_trgm_indexes.py (índices são por schema)
+    conn.execute(text(f"CREATE INDEX idx_products_brand_trgm ON {SCHEMA}.products USING GIN(brand gin_trgm_ops)"))
+    conn.execute(text(f"CREATE INDEX idx_products_name_trgm ON {SCHEMA}.products USING GIN(product_name gin_trgm_ops)"))
+    conn.execute(text(f"ANALYZE {SCHEMA}.products"))
+    conn.commit()
+    print(f"[BENCH] Índices trigram criados em {time.perf_counter() - t0:.1f}s")
+
+
+def uses_trgm_index(conn, query, params) -> bool:
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {query.text}"), params).scalar()
+    plan_text = plan if isinstance(plan, str) else json.dumps(plan)
+    return "_trgm" in plan_text
+
+
+def measure(conn, brand, product_name, ncm, after=None) -> tuple[float, dict | None, bool]:
+    """Mediana (ms) da consulta; retorna também a posição da última linha e o uso de índice."""
+    query, params = build_trgm_search_query(
+        brand_filter=brand,
+        product_name_filter=product_name,
+        ncm_filter=ncm,
+        offset=0,
+        after=after,
+    )
+    timings = []
+    rows = []
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        rows = conn.execute(query, params).fetchall()
+        timings.append((time.perf_counter() - t0) * 1000)
+    last = rows[SEARCH_LIMIT - 1] if len(rows) > SEARCH_LIMIT else None
+    position = {"r": float(last.rank), "g": last.gtin} if last else None
+    return statistics.median(timings), position, uses_trgm_index(conn, query, params)
+
+
+def run_phase(conn, label: str) -> None:
+    print(f"{label}:")
+    print(f"  {'consulta':<36} {'página 1':>12} {'cursor':>12}  índice")
+    for brand, product_name, ncm in QUERIES:
+        name = " ".join(f"{k}={v}" for k, v in (("brand", brand), ("name", product_name), ("ncm", ncm)) if v)
+        first_ms, position, indexed = measure(conn, brand, product_name, ncm)
+        next_ms = f"{measure(conn, brand, product_name, ncm, after=position)[0]:9.1f} ms" if position else f"{'-':>12}"
+        print(f"  {name:<36} {first_ms:9.1f} ms {next_ms}  {'sim' if indexed else 'não'}")
+
+
+def main() -> None:
+    with engine.connect() as conn:
+        create_table(conn)
+        try:
+            conn.execute(text(f"SET search_path TO {SCHEMA}, public"))
+            run_phase(conn, "seq scan (sem índices trigram)")
+            create_indexes(conn)
+            run_phase(conn, "trgm (GIN gin_trgm_ops)")
+        finally:
+            conn.rollback()
+            if not KEEP:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+                conn.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Verifica a consistência de products.payload_json com as colunas de origem.
+==========================================================================
+
+Percorre a tabela em lotes (keyset por gtin), reconstrói o JSON esperado a
+partir das colunas (mesmo encoder da API) e compara com o payload
+armazenado: campos, valores e ordem das chaves.
+
+Uso:
+    python scripts/check_payload_json.py          # apenas relatório
+    python scripts/check_payload_json.py --fix    # regrava ausentes/divergentes
+
+Variáveis úteis:
+    CHECK_BATCH_SIZE=10000   (linhas por lote)
+
+Código de saída 1 se houver divergências (sem --fix).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import String, bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.core.product_json import encode_product  # noqa: E402
+from app.core.products import PAYLOAD_JSON_SQL, PRODUCT_COLUMNS  # noqa: E402
+from app.db.session import engine  # noqa: E402
+
+BATCH_SIZE = int(os.getenv("CHECK_BATCH_SIZE", "10000"))
+MAX_SAMPLES = 10
+
+
+def expected_payload(row) -> dict:
+    """JSON que a API produziria a partir das colunas de origem."""
+    product = {
+        "gtin": row.gtin,
+        "gtin_type": row.gtin_type,
+        "brand": row.brand,
+        "product_name": row.product_name,
+        "origin_country": row.origin_country,
+        "ncm": row.ncm,
+        "cest": row.cest,
+        "gross_weight_value": row.gross_weight_value,
+        "gross_weight_unit": row.gross_weight_unit,
+    }
+    return json.loads(encode_product(product))
+
+
+def check_row(row) -> str | None:
+    """Retorna o motivo da divergência ou None se o payload estiver correto."""
+    if row.payload_json is None:
+        return "ausente"
+    try:
+        stored = json.loads(row.payload_json)
+    except ValueError:
+        return "JSON inválido"
+    expected = expected_payload(row)
+    if list(stored.keys()) != list(expected.keys()):
+        return f"chaves {list(stored.keys())}"
+    for key, value in expected.items():
+        if stored[key] != value:
+            return f"{key}: armazenado={stored[key]!r} esperado={value!r}"
+    return None
+
+
+def fix_rows(conn, gtins: list[str]) -> int:
+    result = conn.execute(
+        text(f"""
+            UPDATE products
+            SET payload_json = {PAYLOAD_JSON_SQL}
+            WHERE gtin = ANY(:gtins)
+        """).bindparams(bindparam("gtins", type_=ARRAY(String))),
+        {"gtins": gtins},
+    )
+    conn.commit()
+    return result.rowcount
+
+
+def main() -> None:
+    fix = "--fix" in sys.argv[1:]
+    checked = missing = mismatched = fixed = 0
+    samples: list[str] = []
+    last_gtin = ""
+    t0 = time.time()
+
+    with engine.connect() as conn:
+        while True:
+            rows = conn.execute(
+                text(f"""
+                    SELECT {PRODUCT_COLUMNS}, payload_json
+                    FROM products
+                    WHERE gtin > :last_gtin
+                    ORDER BY gtin
+                    LIMIT :batch_size
+                """),
+                {"last_gtin": last_gtin, "batch_size": BATCH_SIZE},
+            ).fetchall()
+            if not rows:
+                break
+            last_gtin = rows[-1].gtin
+
+            bad: list[str] = []
+            for row in rows:
+                reason = check_row(row)
+                if reason is None:
+                    continue
+                if row.payload_json is None:
+                    missing += 1
+                else:
+                    mismatched += 1
+                    if len(samples) < MAX_SAMPLES:
+                        samples.append(f"  {row.gtin}: {reason}")
+                bad.append(row.gtin)
+
+            checked += len(rows)
+            if fix and bad:
+                fixed += fix_rows(conn, bad)
+            else:
+                conn.rollback()
+            print(f"[CHECK] {checked} verificados | ausentes={missing} divergentes={mismatched}")
+
+    print(f"[DONE] {checked} produtos em {time.time() - t0:.1f}s")
+    print(f"  ausentes:    {missing}")
+    print(f"  divergentes: {mismatched}")
+    if samples:
+        print("Exemplos de divergência:")
+        print("\n".join(samples))
+    if fix:
+        print(f"  regravados:  {fixed}")
+    elif missing or mismatched:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,9 @@ Cria índices GIN funcionais para Full-Text Search por coluna.
 Cria índices sobre to_tsvector('simple', ...) em brand e product_name
 separadamente. Não precisa de coluna extra (search_vector).
 
+Também cria (ncm, gtin), usado pela paginação por keyset da busca filtrada
+por NCM (WHERE ncm = ... AND gtin > cursor ORDER BY gtin).
+
 Uso:
     python scripts/create_fts_indexes.py
 """
@@ -32,6 +35,11 @@ INDEXES = [
         "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_name_fts "
         "ON products USING GIN(to_tsvector('simple', coalesce(product_name, '')))",
     ),
+    (
+        "idx_products_ncm_gtin",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_ncm_gtin "
+        "ON products (ncm, gtin)",
+    ),
 ]
 
 
@@ -58,7 +66,7 @@ def main() -> None:
     for name, ddl in INDEXES:
         create_index(name, ddl)
 
-    print("[DONE] Índices FTS por coluna criados com sucesso.")
+    print("[DONE] Índices de busca criados com sucesso.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+"""
+Cria índices trigram (pg_trgm) para a busca por substring.
+==========================================================
+
+Habilita a extensão pg_trgm e cria índices GIN gin_trgm_ops em brand e
+product_name, usados pelo backend SEARCH_BACKEND=trgm: os filtros
+`coluna ILIKE '%termo%'` passam a ser resolvidos por Bitmap Index Scan em
+vez de varrer products. Índices criados com CONCURRENTLY (sem bloquear
+escritas); um índice que falhar no meio fica inválido e aparece assim em
+/health/search — basta rodar o script de novo.
+
+Uso:
+    python scripts/create_trgm_indexes.py
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.db.session import engine  # noqa: E402
+
+EXTENSION_DDL = "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+
+INDEXES = [
+    (
+        "idx_products_brand_trgm",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_brand_trgm "
+        "ON products USING GIN(brand gin_trgm_ops)",
+    ),
+    (
+        "idx_products_name_trgm",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_name_trgm "
+        "ON products USING GIN(product_name gin_trgm_ops)",
+    ),
+]
+
+
+def run_autocommit(ddl: str) -> None:
+    import psycopg2.extensions
+
+    raw_conn = engine.raw_connection()
+    try:
+        raw_conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        cursor = raw_conn.cursor()
+        cursor.execute(ddl)
+        cursor.close()
+    finally:
+        raw_conn.close()
+
+
+def drop_if_invalid(name: str) -> None:
+    """Remove sobra inválida de um CREATE INDEX CONCURRENTLY interrompido."""
+    with engine.connect() as conn:
+        invalid = conn.execute(
+            text("""
+                SELECT 1
+                FROM pg_index x
+                JOIN pg_class c ON c.oid = x.indexrelid
+                WHERE c.relname = :name AND NOT x.indisvalid
+            """),
+            {"name": name},
+        ).fetchone()
+    if invalid:
+        print(f"[INDEX] {name} inválido (criação interrompida); recriando...")
+        run_autocommit(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def create_index(name: str, ddl: str) -> None:
+    print(f"[INDEX] Criando {name} (pode levar vários minutos em tabelas grandes)...")
+    t0 = time.time()
+    drop_if_invalid(name)
+    run_autocommit(ddl)
+    elapsed = time.time() - t0
+    print(f"[INDEX] {name} criado em {elapsed:.1f}s")
+
+
+def main() -> None:
+    run_autocommit(EXTENSION_DDL)
+    print("[INDEX] Extensão pg_trgm habilitada")
+
+    for name, ddl in INDEXES:
+        create_index(name, ddl)
+
+    print("[DONE] Índices trigram criados com sucesso.")
+
+
+if __name__ == "__main__":
+    main()
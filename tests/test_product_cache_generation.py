@@ -0,0 +1,57 @@
+"""Testes da invalidação por geração (app.core.product_cache)."""
+
+import time
+
+import pytest
+
+from app.core import product_cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_generation(monkeypatch):
+    monkeypatch.setattr(product_cache, "_known_generation", None)
+    monkeypatch.setattr(product_cache, "_generation_read", False)
+
+
+def test_first_read_only_records_generation(monkeypatch):
+    resets = []
+    monkeypatch.setattr(product_cache, "_reset_local_caches", lambda: resets.append(1))
+
+    product_cache._apply_generation("3")
+    product_cache._apply_generation("3")
+
+    assert resets == []
+
+
+def test_first_etl_generation_resets_running_workers(monkeypatch):
+    resets = []
+    monkeypatch.setattr(product_cache, "_reset_local_caches", lambda: resets.append(1))
+
+    # Worker subiu antes de qualquer carga: chave ausente no Redis
+    product_cache._apply_generation(None)
+    assert resets == []
+
+    # Primeira carga do ETL publica "1"
+    product_cache._apply_generation("1")
+    assert resets == [1]
+
+    product_cache._apply_generation("2")
+    assert resets == [1, 1]
+
+
+def test_first_etl_generation_rebuilds_gtin_filter(monkeypatch):
+    from app.core.gtin_filter import gtin_filter
+
+    builds = []
+    monkeypatch.setattr(product_cache.settings, "GTIN_FILTER_ENABLED", True)
+    monkeypatch.setattr(gtin_filter, "_build", lambda: builds.append(1))
+
+    product_cache._apply_generation(None)
+    product_cache._apply_generation("1")
+
+    # A construção roda em thread de background
+    for _ in range(100):
+        if builds and not gtin_filter._building:
+            break
+        time.sleep(0.01)
+    assert builds == [1]
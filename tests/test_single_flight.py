@@ -0,0 +1,97 @@
+"""Testes de app.core.single_flight (coalescência e falha do líder)."""
+
+import asyncio
+import threading
+import time
+
+from app.core.single_flight import SingleFlight
+
+
+def _run_threads(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_load_many_coalesces_concurrent_callers():
+    flight = SingleFlight(wait_timeout=5)
+    calls = []
+    results = []
+
+    def loader(keys):
+        calls.append(list(keys))
+        time.sleep(0.2)
+        return {key: key.upper() for key in keys if key != "x"}
+
+    _run_threads(lambda: results.append(flight.load_many(["a", "b", "x"], loader)), 8)
+
+    assert calls == [["a", "b", "x"]]
+    assert all(result == {"a": "A", "b": "B"} for result in results)
+    assert flight.stats()["coalesced_keys"] == 7 * 3
+
+
+def test_load_many_waiters_fall_back_quickly_when_leader_fails():
+    flight = SingleFlight(wait_timeout=3)
+    attempts = []
+    outcomes = {}
+    leader_started = threading.Event()
+
+    def loader(keys):
+        attempts.append(list(keys))
+        if len(attempts) == 1:
+            leader_started.set()
+            time.sleep(0.2)
+            raise RuntimeError("falha do líder")
+        return {key: "ok" for key in keys}
+
+    def leader():
+        try:
+            flight.load_many(["k"], loader)
+        except RuntimeError:
+            outcomes["leader"] = "erro"
+
+    def waiter():
+        leader_started.wait()
+        t0 = time.monotonic()
+        outcomes["waiter"] = flight.load_many(["k"], loader)
+        outcomes["waiter_seconds"] = time.monotonic() - t0
+
+    threads = [threading.Thread(target=leader), threading.Thread(target=waiter)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes["leader"] == "erro"
+    assert outcomes["waiter"] == {"k": "ok"}
+    # Acordado pela falha do líder, não pelo wait_timeout
+    assert outcomes["waiter_seconds"] < 1
+    assert flight.stats()["fallback_keys"] == 1
+
+
+def test_load_many_async_waiters_fall_back_when_leader_fails():
+    flight = SingleFlight(wait_timeout=3)
+    attempts = []
+
+    async def loader(keys):
+        attempts.append(list(keys))
+        await asyncio.sleep(0.1)
+        if len(attempts) == 1:
+            raise RuntimeError("falha do líder")
+        return {key: "ok" for key in keys}
+
+    async def main():
+        t0 = time.monotonic()
+        results = await asyncio.gather(
+            *(flight.load_many_async(["k"], loader) for _ in range(4)),
+            return_exceptions=True,
+        )
+        return results, time.monotonic() - t0
+
+    results, elapsed = asyncio.run(main())
+
+    assert isinstance(results[0], RuntimeError)
+    assert results[1:] == [{"k": "ok"}] * 3
+    assert elapsed < 1